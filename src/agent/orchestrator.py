@@ -6,7 +6,7 @@ from typing import Any, Dict, Optional
 from src.agent.tools import tool_rag_query, format_non_tech_answer
 from src.agent.tools_revenue import get_revenue_events_summary
 from src.agent.tools_stats import stats_client
-from src.agent.tools_predict import predict_churn
+from src.agent.tools_predict import explain_churn, predict_churn
 
 
 @dataclass(frozen=True)
@@ -69,6 +69,12 @@ class CopilotAgent:
             except Exception as e:
                 debug["predict_churn_error"] = str(e)
 
+            # explication du score (artefact précalculé, optionnel)
+            try:
+                debug["explain_churn"] = explain_churn(cid)
+            except Exception as e:
+                debug["explain_churn_error"] = str(e)
+
         # 3) Synthèse non-tech (MVP basé RAG, puis on enrichira)
         answer_md = format_non_tech_answer(q, rag, confidence=confidence)
 
@@ -115,29 +115,52 @@ def predict_churn(client_id: str) -> ChurnPrediction:
     if not url.startswith("http"):
         raise RuntimeError("Invalid PREDICT_API_URL (must start with http/https)")
 
-    # Local dependency (keeps import graph clean)
+    # Local dependencies (keeps import graph clean)
     from src.agent.tools_stats import stats_client
-
-    st = stats_client(cid)
-
-    # Reference date T = max observed last_activity_date (robust for frozen datasets)
-    df = pd.read_csv("data/processed/report_oop.csv")
-    T = pd.to_datetime(df.get("last_activity_date"), errors="coerce").max()
-    if pd.isna(T):
-        T = pd.to_datetime(df.get("last_payment_date"), errors="coerce").max()
-    if pd.isna(T):
-        T = pd.Timestamp.today()
-    T_str = str(T.date())
-
-    payload = {
-        "paid_count_before_T": st.nb_paiements,
-        "paid_sum_before_T": st.ca_total,
-        "days_since_last_paid": _compute_days_since_last_paid(
-            st.last_payment_date, T_str
-        ),
-        "plan": st.plan,
-        "ville": st.ville,
-    }
+    from src.ml.build_ml_churn_ready import T
+    from src.ml.feature_store import get_online_features
+    from src.ml.predict import client_score
+    from src.ml.threshold_sweep import is_churn, resolve_threshold
+
+    # Nightly batch scores (python -m src.ml.predict churn): no model call
+    # as long as they come from the promoted version
+    scored = client_score("churn", cid)
+    if scored is not None:
+        p = float(scored["prediction"])
+        # Même seuil que l'API (CHURN_THRESHOLD, courbe de la version scorée)
+        churn_flag = is_churn(p, resolve_threshold(scored["model_version"]))
+        return ChurnPrediction(
+            client_id=cid,
+            churn_probability=p,
+            churn=churn_flag,
+            churn_risk=_bucket_churn_risk(p, churn_flag),
+            raw={"source": "batch_scores", **scored},
+        )
+
+    # Same reference date T and same feature definitions as training
+    # (point-in-time features served from the feature store, cached in-process)
+    feats = get_online_features(cid, as_of=T)
+
+    if feats is not None:
+        payload = {
+            "paid_count_before_T": int(feats["paid_count_before_T"]),
+            "paid_sum_before_T": float(feats["paid_sum_before_T"]),
+            "days_since_last_paid": int(feats["days_since_last_paid"]),
+            "plan": feats["plan"],
+            "ville": feats["ville"],
+        }
+    else:
+        # No payment before T: fall back on report stats, still relative to T
+        st = stats_client(cid)
+        payload = {
+            "paid_count_before_T": st.nb_paiements,
+            "paid_sum_before_T": st.ca_total,
+            "days_since_last_paid": _compute_days_since_last_paid(
+                st.last_payment_date, str(T.date())
+            ),
+            "plan": st.plan,
+            "ville": st.ville,
+        }
 
     resp = requests.post(url, json=payload, timeout=15)
     resp.raise_for_status()
@@ -167,3 +190,18 @@ def predict_churn(client_id: str) -> ChurnPrediction:
         churn_risk=churn_risk,
         raw=data,
     )
+
+
+def explain_churn(client_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Pourquoi ce score: top contributions précalculées au training
+    (contributions.parquet de la version promue), sans appel au modèle.
+    None si le modèle courant n'a pas d'explications (ex: RandomForest).
+    """
+    cid = (client_id or "").strip()
+    if not cid:
+        raise ValueError("client_id is empty")
+
+    from src.ml.explain import explain_client
+
+    return explain_client("churn", cid)
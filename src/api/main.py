@@ -1,15 +1,38 @@
 from __future__ import annotations
 
-from pathlib import Path
+import logging
+import os
 from typing import Literal
 
-import joblib
 import pandas as pd
 from fastapi import FastAPI
 from pydantic import BaseModel, Field
 
+from src.ml.drift import drift_reports, live_path, log_report, open_monitor
+from src.ml.encoders import pipeline_cat_encoding
+from src.ml.export_onnx import load_onnx
+from src.ml.fast_scorer import load_scorer
+from src.ml.forest_arrays import load_forest
+from src.ml.registry import current_version, load_current
+from src.ml.segments import SegmentRouter
+from src.ml.threshold_sweep import is_churn, resolve_threshold
 
-MODEL_PATH = Path("src/ml/models/churn_model_v1.joblib")
+
+# churn: modèle global (fallback: src/ml/models/churn_model_v1.joblib)
+# churn_segments: un modèle par plan (python -m src.ml.segments), routé sur payload.plan
+MODEL_NAME = (os.getenv("CHURN_MODEL_NAME") or "churn").strip()
+
+log = logging.getLogger("saas_api")
+
+# auto: scorer numpy (scorer.json) si exporté pour la version courante, sinon sklearn
+# onnx: onnxruntime sur model.onnx (python -m src.ml.export_onnx), sinon sklearn (warning loggé)
+# sklearn: toujours le pipeline joblib
+MODEL_BACKEND = (os.getenv("MODEL_BACKEND") or "auto").strip().lower()
+
+# Drift: histogrammes live des payloads /predict, persistés tous les N appels
+# (data/drift/churn/<version>/api.json). Compteurs par process: 1 worker uvicorn.
+DRIFT_SOURCE = "api"
+DRIFT_FLUSH_EVERY = int(os.getenv("DRIFT_FLUSH_EVERY", "100"))
 
 app = FastAPI(title="SaaS ML API", version="v1")
 
@@ -28,39 +51,116 @@ class PredictOut(BaseModel):
 
 
 _model = None
+_model_version = None
+_runtime = None  # scorer numpy, forêt memmap ou session ONNX (predict_proba_one)
+_drift = None  # DriftMonitor de la version servie (None sans drift_reference.json)
+_threshold = None  # seuil résolu pour la version servie (None: proba > 0.5)
 
 
 def get_model():
-    global _model
-    if _model is None:
-        if not MODEL_PATH.exists():
-            raise FileNotFoundError(f"Model not found at: {MODEL_PATH}")
-        _model = joblib.load(MODEL_PATH)
+    # Lecture du pointeur current à chaque appel (quelques octets);
+    # rechargement du joblib seulement si la version promue a changé
+    global _model, _model_version, _runtime, _drift, _threshold
+    version = current_version(MODEL_NAME)
+    if _model is None or version != _model_version:
+        flush_drift()
+        _model, _model_version = load_current(MODEL_NAME)
+        _runtime = load_runtime(_model_version)
+        _drift = open_monitor(MODEL_NAME, _model_version, DRIFT_SOURCE)
+        # CHURN_THRESHOLD (src.ml.threshold_sweep), même règle que l'agent
+        _threshold = resolve_threshold(_model_version)
     return _model
 
 
+def flush_drift() -> None:
+    if _drift is None or _drift.n_rows == 0:
+        return
+    _drift.save(live_path(MODEL_NAME, _model_version, DRIFT_SOURCE))
+    log_report(MODEL_NAME, _model_version, DRIFT_SOURCE, _drift.report())
+
+
+def track_drift(row: dict) -> None:
+    if _drift is None:
+        return
+    _drift.update_one(row)
+    if _drift.n_rows % DRIFT_FLUSH_EVERY == 0:
+        flush_drift()
+
+
+def load_runtime(version):
+    if isinstance(_model, SegmentRouter):
+        # Routeur: LinearScorer par segment construits au chargement (pas d'ONNX)
+        if MODEL_BACKEND == "onnx":
+            log.warning("MODEL_BACKEND=onnx non supporté pour %s@%s -> sklearn", MODEL_NAME, version)
+        return _model.to_scorers() if MODEL_BACKEND == "auto" else None
+    if MODEL_BACKEND == "auto":
+        # Linéaire: scorer numpy; RF: forêt à tableaux plats en memmap (forest/)
+        scorer = load_scorer(MODEL_NAME, version)
+        return scorer if scorer is not None else load_forest(MODEL_NAME, version)
+    if MODEL_BACKEND == "onnx":
+        runtime = load_onnx(MODEL_NAME, version)
+        if runtime is None:
+            # Disponibilité de l'API d'abord (le batch predict.py, lui, échoue)
+            log.warning(
+                "MODEL_BACKEND=onnx: pas de model.onnx pour %s@%s -> sklearn "
+                "(python -m src.ml.export_onnx)",
+                MODEL_NAME,
+                version,
+            )
+        return runtime
+    return None
+
+
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    # Encodage catégoriel du modèle servi (le hashing est porté par le pipeline)
+    if _model is None:
+        return {"status": "ok"}
+    if isinstance(_model, SegmentRouter):
+        # Segments servis par un modèle dédié (les autres: modèle global)
+        return {
+            "status": "ok",
+            "model_name": MODEL_NAME,
+            "model_version": _model_version,
+            "backend": "segments" + ("+scorer" if _runtime is not None else ""),
+            "segment_col": _model.column,
+            "segments": sorted(_model.models),
+            "churn_threshold": _threshold,
+        }
+    return {
+        "status": "ok",
+        "model_name": MODEL_NAME,
+        "model_version": _model_version,
+        "backend": type(_runtime).__name__ if _runtime is not None else "sklearn",
+        "cat_encoding": pipeline_cat_encoding(_model),
+        "churn_threshold": _threshold,
+    }
+
+
+@app.get("/drift")
+def drift():
+    # PSI / KS par feature et par source (api, batch) pour la version servie
+    get_model()
+    flush_drift()
+    return drift_reports(MODEL_NAME, _model_version)
 
 
 @app.post("/predict", response_model=PredictOut)
 def predict(payload: PredictIn):
     model = get_model()
+    row = payload.model_dump()
+    track_drift(row)
+
+    if _runtime is not None:
+        # Ni DataFrame ni ColumnTransformer (routeur: scorer du segment payload.plan)
+        # (parité: python -m src.ml.fast_scorer / python -m src.ml.export_onnx)
+        proba = _runtime.predict_proba_one(row)
+        pred = is_churn(proba, _threshold)
+        return {"churn_probability": proba, "churn": pred}
 
-    X = pd.DataFrame(
-        [
-            {
-                "paid_count_before_T": payload.paid_count_before_T,
-                "paid_sum_before_T": payload.paid_sum_before_T,
-                "days_since_last_paid": payload.days_since_last_paid,
-                "plan": payload.plan,
-                "ville": payload.ville,
-            }
-        ]
-    )
+    X = pd.DataFrame([row])
 
     proba = float(model.predict_proba(X)[0][1])
-    pred = bool(model.predict(X)[0])
+    pred = is_churn(proba, _threshold)
 
     return {"churn_probability": proba, "churn": pred}
@@ -1,25 +1,25 @@
 import streamlit as st
-import pandas as pd
-import joblib
+
+from src.ml.build_ml_ready import PATH_INFERENCE, load_inference_frame
+from src.ml.forest_arrays import load_serving
+from src.ml.registry import current_version
 
 st.title("Dashboard V2 — ML (client prediction)")
 
-MODEL_PATH = "src/ml/models/model_current_v1.joblib"
-REPORT_PATH = "data/processed/report_oop.csv"
+MODEL_NAME = "revenue"  # registre (fallback: src/ml/models/model_current_v1.joblib)
+REPORT_PATH = PATH_INFERENCE  # anciennete_jours / ref_date précalculées au build
 
 
 @st.cache_data
 def load_report():
-    df = pd.read_csv(REPORT_PATH)
-    df["last_activity_date"] = pd.to_datetime(df["last_activity_date"])
-    ref_date = df["last_activity_date"].max()
-    df["anciennete_jours"] = (ref_date - df["last_activity_date"]).dt.days
-    return df
+    return load_inference_frame()
 
 
 @st.cache_resource
-def load_model():
-    return joblib.load(MODEL_PATH)
+def load_model(version):
+    # Clé de cache = version promue: rechargement seulement si current change
+    # (RF: forêt à tableaux plats en memmap, pages partagées entre sessions / process)
+    return load_serving(MODEL_NAME)[0]
 
 
 report = load_report()
@@ -48,7 +48,7 @@ st.dataframe(ca_par_plan, use_container_width=True)
 st.subheader("Graphique — CA total par plan")
 st.bar_chart(ca_par_plan.set_index("plan")["ca_total"])
 
-model = load_model()
+model = load_model(current_version(MODEL_NAME))
 
 FEATURE_COLS = [
     "nb_paiements",
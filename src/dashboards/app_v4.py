@@ -1,15 +1,18 @@
 import streamlit as st
 import pandas as pd
-import joblib
+
+from src.ml.build_ml_ready import PATH_INFERENCE, load_inference_frame
+from src.ml.explain import load_explanations
+from src.ml.forest_arrays import load_serving
+from src.ml.registry import current_version, resolve
 
 
 st.title("Dashboard V4 — ML (client prediction, plus metrics, plus features)")
 
 METRICS_PATH = "data/ml_ready/metrics_v1.csv"
-MODEL_PATH = "src/ml/models/model_current_v1.joblib"
-REPORT_PATH = "data/processed/report_oop.csv"
+MODEL_NAME = "revenue"  # registre (fallback: src/ml/models/model_current_v1.joblib)
+REPORT_PATH = PATH_INFERENCE
 
-DATE_COL = "last_activity_date"
 ID_COL = "client_id"
 TARGET_COL = "ca_total"
 
@@ -31,32 +34,21 @@ def guard_columns(df: pd.DataFrame, required: list[str], where: str) -> None:
 
 @st.cache_data
 def load_report() -> pd.DataFrame:
-    df = pd.read_csv(REPORT_PATH)
-
-    # Guards minimal input
-    guard_columns(df, [DATE_COL], f"report ({REPORT_PATH})")
-
-    # Parse dates robust
-    df[DATE_COL] = pd.to_datetime(df[DATE_COL], errors="coerce")
-    ref_date = df[DATE_COL].max()
-    if pd.isna(ref_date):
-        raise ValueError(
-            f"Impossible de calculer ref_date: toutes les valeurs de {DATE_COL} sont NaT après parsing."
-        )
-
-    df["anciennete_jours"] = (ref_date - df[DATE_COL]).dt.days
-    return df
+    # Frame d'inférence: anciennete_jours calculée une fois au build (ref_date en colonne)
+    return load_inference_frame()
 
 
 @st.cache_resource
-def load_model():
-    return joblib.load(MODEL_PATH)
+def load_model(version):
+    # Clé de cache = version promue: rechargement seulement si current change
+    # (RF: forêt à tableaux plats en memmap, pages partagées entre sessions / process)
+    return load_serving(MODEL_NAME)[0]
 
 
 # --- Chargements ---
 try:
     report = load_report()
-    model = load_model()
+    model = load_model(current_version(MODEL_NAME))
 except FileNotFoundError as e:
     st.error(f"Fichier introuvable: {e}")
     st.stop()
@@ -70,7 +62,7 @@ st.caption("Sources")
 st.write(
     {
         "REPORT_PATH": REPORT_PATH,
-        "MODEL_PATH": MODEL_PATH,
+        "MODEL_PATH": str(resolve(MODEL_NAME)),
         "METRICS_PATH": METRICS_PATH,
         "shape_report": report.shape,
         "cols_report": report.columns.tolist(),
@@ -111,21 +103,25 @@ st.divider()
 st.header("Modèle — importance des features (RandomForest)")
 
 try:
-    preprocess = model.named_steps["preprocess"]
-    model_core = model.named_steps["model"]
-    feature_names = preprocess.get_feature_names_out()
+    # Importances précalculées au training (explanations.json dans le registre)
+    explanations = load_explanations(MODEL_NAME, current_version(MODEL_NAME))
 
-    if not hasattr(model_core, "feature_importances_"):
+    if explanations is None or explanations.get("kind") != "tree":
         st.info(
-            "Le modèle courant n'expose pas feature_importances_ (pas un RandomForest)."
+            "Pas d'importances précalculées pour le modèle courant (pas un RandomForest "
+            "ou entraîné avant l'export: relancer python -m src.ml.train_rf)."
         )
     else:
-        importances = model_core.feature_importances_
-        fi = pd.DataFrame(
-            {"feature": feature_names, "importance": importances}
-        ).sort_values("importance", ascending=False)
+        fi = pd.DataFrame(explanations["global"])
         st.dataframe(fi.head(15), use_container_width=True)
         st.bar_chart(fi.set_index("feature")["importance"].head(15))
+
+        perm = explanations.get("permutation")
+        if perm:
+            st.subheader(
+                f"Permutation importance (holdout, {perm['scoring']}, {perm['n_repeats']} répétitions)"
+            )
+            st.dataframe(pd.DataFrame(perm["features"]).head(15), use_container_width=True)
 except Exception as e:
     st.warning(f"Impossible d'afficher feature importance : {e}")
 
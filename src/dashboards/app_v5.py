@@ -1,17 +1,23 @@
 import streamlit as st
 import pandas as pd
-import joblib
 import matplotlib.pyplot as plt
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 
+from src.ml.build_ml_ready import PATH_INFERENCE, REF_DATE_COL, load_inference_frame
+from src.ml.permutation import load_permutation
+from src.ml.predict import read_scores
+from src.ml.explain import load_explanations
+from src.ml.forest_arrays import load_serving
+from src.ml.registry import current_version, resolve
+
 
 st.title(
     "Dashboard V5 — ML (client prediction, metrics, features, qualité des prédictions (régression))"
 )
 
 METRICS_PATH = "data/ml_ready/metrics_v1.csv"
-MODEL_PATH = "src/ml/models/model_current_v1.joblib"
-REPORT_PATH = "data/processed/report_oop.csv"
+MODEL_NAME = "revenue"  # registre (fallback: src/ml/models/model_current_v1.joblib)
+REPORT_PATH = PATH_INFERENCE
 
 FEATURE_COLS = [
     "nb_paiements",
@@ -22,40 +28,36 @@ FEATURE_COLS = [
     "ville",
 ]
 
-DATE_COL = "last_activity_date"
 TARGET_COL = "ca_total"
 ID_COL = "client_id"
 
 
 @st.cache_data
 def load_report():
-    df = pd.read_csv(REPORT_PATH)
-
-    # Trace minimale
-    # (dans Streamlit, on affiche plutôt que print)
-    return df
+    # Frame d'inférence: anciennete_jours calculée une fois au build (ref_date en colonne)
+    return load_inference_frame()
 
 
-@st.cache_resource
-def load_model():
-    return joblib.load(MODEL_PATH)
-
+@st.cache_data
+def load_scores(version):
+    # Scores batch (python -m src.ml.predict revenue), gardés s'ils viennent de la version promue
+    scores = read_scores(MODEL_NAME)
+    if scores is None or (scores["model_version"] != (version or "legacy")).any():
+        return None
+    return scores.set_index(ID_COL)["prediction"]
 
-def add_anciennete_jours(df: pd.DataFrame) -> pd.DataFrame:
-    if DATE_COL not in df.columns:
-        raise KeyError(f"Colonne manquante dans report: {DATE_COL}")
 
-    out = df.copy()
-    out[DATE_COL] = pd.to_datetime(out[DATE_COL], errors="coerce")
-    ref_date = out[DATE_COL].max()
+@st.cache_data
+def load_perm(version):
+    # Cache permutation (python -m src.ml.permutation revenue): clé = version + hash dataset
+    return load_permutation(MODEL_NAME, version)
 
-    if pd.isna(ref_date):
-        raise ValueError(
-            f"Impossible de calculer ref_date: toutes les valeurs de {DATE_COL} sont NaT après parsing."
-        )
 
-    out["anciennete_jours"] = (ref_date - out[DATE_COL]).dt.days
-    return out
+@st.cache_resource
+def load_model(version):
+    # Clé de cache = version promue: rechargement seulement si current change
+    # (RF: forêt à tableaux plats en memmap, pages partagées entre sessions / process)
+    return load_serving(MODEL_NAME)[0]
 
 
 def guard_columns(df: pd.DataFrame, required: list[str], where: str) -> None:
@@ -66,8 +68,8 @@ def guard_columns(df: pd.DataFrame, required: list[str], where: str) -> None:
 
 # --- Chargements ---
 try:
-    raw_report = load_report()
-    model = load_model()
+    report = load_report()
+    model = load_model(current_version(MODEL_NAME))
 except FileNotFoundError as e:
     st.error(f"Fichier introuvable: {e}")
     st.stop()
@@ -80,20 +82,14 @@ st.caption("Sources")
 st.write(
     {
         "REPORT_PATH": REPORT_PATH,
-        "MODEL_PATH": MODEL_PATH,
+        "MODEL_PATH": str(resolve(MODEL_NAME)),
         "METRICS_PATH": METRICS_PATH,
-        "shape_report_raw": raw_report.shape,
-        "cols_report_raw": raw_report.columns.tolist(),
+        "shape_report": report.shape,
+        "cols_report": report.columns.tolist(),
+        "ref_date": str(report[REF_DATE_COL].iloc[0].date()) if len(report) else None,
     }
 )
 
-# --- Enrichissement report ---
-try:
-    report = add_anciennete_jours(raw_report)
-except Exception as e:
-    st.error(f"Erreur calcul anciennete_jours: {e}")
-    st.stop()
-
 # Guards report minimum for KPI + predictions
 try:
     guard_columns(report, [ID_COL, TARGET_COL], "report (KPI)")
@@ -126,21 +122,40 @@ st.divider()
 st.header("Modèle — importance des features (RandomForest)")
 
 try:
-    preprocess = model.named_steps["preprocess"]
-    model_core = model.named_steps["model"]
-    feature_names = preprocess.get_feature_names_out()
+    # Importances précalculées au training (explanations.json dans le registre)
+    explanations = load_explanations(MODEL_NAME, current_version(MODEL_NAME))
 
-    if not hasattr(model_core, "feature_importances_"):
+    if explanations is None or explanations.get("kind") != "tree":
         st.info(
-            "Le modèle courant n'expose pas feature_importances_ (pas un RandomForest)."
+            "Pas d'importances impurity pour le modèle courant (pas un RandomForest "
+            "ou entraîné avant l'export: relancer python -m src.ml.train_rf)."
         )
     else:
-        importances = model_core.feature_importances_
-        fi = pd.DataFrame(
-            {"feature": feature_names, "importance": importances}
-        ).sort_values("importance", ascending=False)
+        fi = pd.DataFrame(explanations["global"])
         st.dataframe(fi.head(15), use_container_width=True)
         st.bar_chart(fi.set_index("feature")["importance"].head(15))
+
+        perm = explanations.get("permutation")
+        if perm:
+            st.subheader(
+                f"Permutation importance (holdout, {perm['scoring']}, {perm['n_repeats']} répétitions)"
+            )
+            st.dataframe(pd.DataFrame(perm["features"]).head(15), use_container_width=True)
+
+    # Tous modèles (LinearRegression inclus): permutation sur les colonnes brutes, lue en cache
+    st.subheader("Permutation importance — toutes features (cache)")
+    perm_all = load_perm(current_version(MODEL_NAME))
+    if perm_all is None:
+        st.info("Pas encore calculée: python -m src.ml.permutation revenue current")
+    else:
+        st.caption(
+            f"{perm_all['model']}@{perm_all['version']} | "
+            f"{perm_all['scoring']} (base {perm_all['baseline_score']:.3g}) | "
+            f"{perm_all['n_repeats']} répétitions | dataset {perm_all['data_hash'][:12]}"
+        )
+        pi = pd.DataFrame(perm_all["features"])
+        st.dataframe(pi, use_container_width=True)
+        st.bar_chart(pi.set_index("feature")["importance"])
 except Exception as e:
     st.warning(f"Impossible d'afficher feature importance : {e}")
 
@@ -172,9 +187,14 @@ st.bar_chart(ca_par_plan.set_index("plan")["ca_total"])
 st.divider()
 st.header("Modèle — qualité des prédictions (régression)")
 
-X_all = report[FEATURE_COLS]
 y_true = report[TARGET_COL]
-y_pred = model.predict(X_all)
+scores = load_scores(current_version(MODEL_NAME))
+if scores is not None and report[ID_COL].isin(scores.index).all():
+    y_pred = scores.reindex(report[ID_COL]).to_numpy()
+    st.caption("Prédictions: scores batch (data/scores/revenue_scores.parquet)")
+else:
+    y_pred = model.predict(report[FEATURE_COLS])
+    st.caption("Prédictions: modèle (pas de scores batch à jour)")
 
 mae = mean_absolute_error(y_true, y_pred)
 rmse = float(mean_squared_error(y_true, y_pred) ** 0.5)
@@ -207,8 +227,10 @@ else:
     if row.empty:
         st.error(f"client_id introuvable: {client_id}")
     else:
-        X_one = row.iloc[[0]][FEATURE_COLS]
-        pred_one = float(model.predict(X_one)[0])
+        if scores is not None and client_id in scores.index:
+            pred_one = float(scores.loc[client_id])
+        else:
+            pred_one = float(model.predict(row.iloc[[0]][FEATURE_COLS])[0])
         actual_one = float(row[TARGET_COL].iloc[0])
 
         st.write(
@@ -1,13 +1,17 @@
 import json
-import joblib
 import pandas as pd
 import streamlit as st
 
+from src.ml.drift import PSI_ALERT, PSI_WARN, drift_reports
+from src.ml.explain import load_contributions, load_explanations
+from src.ml.predict import read_scores
+from src.ml.forest_arrays import load_serving
+
 st.title("Dashboard V6 — ML (Churn 7–30j) — Décisionnel")
 
 DATA_PATH = "data/ml_ready/df_ml_churn_ready.csv"
 METRICS_PATH = "data/ml_ready/churn_metrics_v1.json"
-MODEL_PATH = "src/ml/models/churn_model_v1.joblib"
+MODEL_NAME = "churn"  # registre (fallback: src/ml/models/churn_model_v1.joblib)
 
 TARGET = "churn_7_30j"
 FEATURES_NUM = ["paid_count_before_T", "paid_sum_before_T", "days_since_last_paid"]
@@ -17,7 +21,7 @@ FEATURES_CAT = ["plan", "ville"]
 # Load
 # ==========
 df = pd.read_csv(DATA_PATH)
-model = joblib.load(MODEL_PATH)
+model, model_version = load_serving(MODEL_NAME)  # RF: forêt en memmap (forest/)
 
 metrics = None
 try:
@@ -36,6 +40,7 @@ st.caption(
 # Qualité du modèle
 # ==========
 st.subheader("Qualité du modèle (classification)")
+st.caption(f"Modèle: {MODEL_NAME}@{model_version or 'legacy'}")
 
 if metrics:
     st.write("**Confusion matrix** (format [[TN, FP],[FN, TP]]):")
@@ -54,28 +59,62 @@ if metrics:
 # ==========
 st.subheader("Feature importance (simple)")
 
-# Pour LogisticRegression: coefficients sur les features one-hot
-try:
-    pre = model.named_steps["pre"]
-    clf = model.named_steps["clf"]
-
-    # Récupérer les noms des features après preprocessing
-    ohe = pre.named_transformers_["cat"]
-    cat_feature_names = list(ohe.get_feature_names_out(FEATURES_CAT))
-    feature_names = FEATURES_NUM + cat_feature_names
-
-    coefs = clf.coef_[0]
-    imp = pd.DataFrame({"feature": feature_names, "weight": coefs}).sort_values(
-        "weight", ascending=False
+# Précalculé au training (explanations.json): coef + |contribution| moyenne sur la base
+explanations = load_explanations(MODEL_NAME, model_version)
+if explanations is not None and explanations.get("kind") == "linear":
+    imp = pd.DataFrame(explanations["global"]).rename(
+        columns={"coef": "weight", "importance": "mean_abs_contribution"}
     )
+    imp = imp.sort_values("weight", ascending=False)
 
     st.write("Poids positifs = augmentent le risque churn (classe 1).")
     st.dataframe(imp.head(15), use_container_width=True)
     st.write("Poids négatifs = diminuent le risque churn.")
     st.dataframe(imp.tail(15).sort_values("weight"), use_container_width=True)
+else:
+    st.info(
+        "Pas d'explications précalculées pour ce modèle "
+        "(relancer python -m src.ml.train_churn_model)."
+    )
 
-except Exception as e:
-    st.warning(f"Impossible d'afficher la feature importance: {e}")
+# ==========
+# Drift (histogrammes live vs référence du train)
+# ==========
+st.subheader("Drift des features (PSI / KS)")
+
+drift = drift_reports(MODEL_NAME, model_version)
+if not drift["sources"]:
+    st.info(
+        "Pas de données de drift pour cette version (référence écrite au training, "
+        "live alimenté par /predict et python -m src.ml.predict churn)."
+    )
+else:
+    st.caption(
+        f"Référence: {drift['reference_rows']} lignes | "
+        f"PSI ≥ {PSI_WARN} à surveiller, ≥ {PSI_ALERT} drift"
+    )
+    for source, rep in drift["sources"].items():
+        st.write(f"**{source}** — {rep['n_rows']} lignes — statut: {rep['status']}")
+        st.dataframe(
+            pd.DataFrame(rep["features"]).T.rename_axis("feature"),
+            use_container_width=True,
+        )
+
+# ==========
+# Scores batch (python -m src.ml.predict churn)
+# ==========
+st.subheader("Scores batch — clients les plus à risque")
+
+scores = read_scores(MODEL_NAME)
+if scores is not None and (scores["model_version"] == (model_version or "legacy")).all():
+    scores = scores.set_index("client_id")["prediction"]
+    st.dataframe(
+        scores.sort_values(ascending=False).head(20).rename("churn_probability"),
+        use_container_width=True,
+    )
+else:
+    scores = None
+    st.info("Pas de scores batch pour la version promue (python -m src.ml.predict churn).")
 
 # ==========
 # Prédiction client
@@ -85,15 +124,26 @@ st.subheader("Prédiction client spécifique")
 client_id = st.selectbox("Choisir un client_id", sorted(df["client_id"].unique()))
 row = df[df["client_id"] == client_id].iloc[0]
 
-X = pd.DataFrame([row[FEATURES_NUM + FEATURES_CAT].to_dict()])
-
-proba = float(model.predict_proba(X)[0][1])
-pred = int(model.predict(X)[0])
+if scores is not None and client_id in scores.index:
+    proba = float(scores.loc[client_id])
+else:
+    X = pd.DataFrame([row[FEATURES_NUM + FEATURES_CAT].to_dict()])
+    proba = float(model.predict_proba(X)[0][1])
+pred = int(proba > 0.5)
 
 st.write(f"**client_id**: {client_id}")
 st.write(f"**churn_probability**: {proba:.3f}")
 st.write(f"**churn_pred**: {pred}")
 
+contrib = load_contributions(MODEL_NAME, model_version, [client_id])
+if contrib is not None and not contrib.empty:
+    st.write("Contributions au score (log-odds, coef × valeur encodée):")
+    st.dataframe(
+        contrib.drop(columns=["client_id"])
+        .sort_values("contribution", key=abs, ascending=False),
+        use_container_width=True,
+    )
+
 st.caption(
     "Note: dataset très petit et déséquilibré — dashboard = validation architecture."
 )
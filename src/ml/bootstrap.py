@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+import numpy as np
+
+
+# =========================
+# Paramètres bootstrap
+# =========================
+N_BOOTSTRAP = int(os.getenv("N_BOOTSTRAP", "2000"))
+ALPHA = 0.05  # IC à 95 % (percentiles 2.5 / 97.5)
+RANDOM_STATE = 42
+N_WORKERS = int(os.getenv("BOOT_WORKERS", str(max(1, min(4, (os.cpu_count() or 1))))))
+MAX_BLOCK_CELLS = 20_000_000  # taille max d'une matrice d'indices (B_block x n), ~160 Mo int64
+MIN_ROWS_PER_WORKER = 50_000  # en dessous, le pool coûte plus qu'il ne rapporte
+
+
+# ---------- métriques vectorisées: une ligne de la matrice = un rééchantillon ----------
+
+
+def classification_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> dict[str, np.ndarray]:
+    """y_true / y_pred: (B, n) en 0/1 -> precision, recall par rééchantillon (zero_division=0)."""
+    tp = np.sum(y_true & y_pred, axis=1)
+    pred_pos = np.sum(y_pred, axis=1)
+    true_pos = np.sum(y_true, axis=1)
+    return {
+        "precision": np.divide(tp, pred_pos, out=np.zeros(len(tp)), where=pred_pos > 0),
+        "recall": np.divide(tp, true_pos, out=np.zeros(len(tp)), where=true_pos > 0),
+    }
+
+
+def regression_metrics(y_true: np.ndarray, y_pred: np.ndarray) -> dict[str, np.ndarray]:
+    err = y_true - y_pred
+    return {
+        "MAE": np.mean(np.abs(err), axis=1),
+        "RMSE": np.sqrt(np.mean(err * err, axis=1)),
+    }
+
+
+METRICS: dict[str, Callable[[np.ndarray, np.ndarray], dict[str, np.ndarray]]] = {
+    "classification": classification_metrics,
+    "regression": regression_metrics,
+}
+
+
+def _bootstrap_block(
+    args: tuple[np.ndarray, np.ndarray, str, int, np.random.SeedSequence],
+) -> dict[str, np.ndarray]:
+    """n_boot rééchantillons: matrice d'indices générée d'un coup, par sous-blocs bornés en mémoire."""
+    y_true, y_pred, kind, n_boot, seed = args
+    rng = np.random.default_rng(seed)
+    n = len(y_true)
+    step = max(1, MAX_BLOCK_CELLS // max(n, 1))
+    parts: list[dict[str, np.ndarray]] = []
+    for start in range(0, n_boot, step):
+        idx = rng.integers(0, n, size=(min(step, n_boot - start), n))
+        parts.append(METRICS[kind](y_true[idx], y_pred[idx]))
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+
+def bootstrap_ci(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    kind: str,
+    n_bootstrap: int = N_BOOTSTRAP,
+    alpha: float = ALPHA,
+    n_workers: int = N_WORKERS,
+    random_state: int = RANDOM_STATE,
+) -> dict[str, Any]:
+    """
+    IC percentile des métriques (kind: classification | regression).
+    Les rééchantillons sont répartis en blocs sur un pool de process; une
+    graine par bloc (SeedSequence): même résultat pour un n_workers donné.
+    """
+    if kind not in METRICS:
+        raise ValueError(f"kind inconnu: {kind} (attendu: {sorted(METRICS)})")
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    if kind == "classification":
+        y_true, y_pred = y_true.astype(bool), y_pred.astype(bool)
+    else:
+        y_true, y_pred = y_true.astype(float), y_pred.astype(float)
+
+    t0 = time.perf_counter()
+    # Petits jeux: un seul process (le coût de sérialisation domine)
+    n_workers = max(1, min(n_workers, len(y_true) // MIN_ROWS_PER_WORKER, n_bootstrap))
+    sizes = [len(a) for a in np.array_split(np.arange(n_bootstrap), n_workers)]
+    seeds = np.random.SeedSequence(random_state).spawn(n_workers)
+    tasks = [(y_true, y_pred, kind, b, s) for b, s in zip(sizes, seeds)]
+    if n_workers == 1:
+        blocks = [_bootstrap_block(tasks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            blocks = list(pool.map(_bootstrap_block, tasks))
+    samples = {k: np.concatenate([b[k] for b in blocks]) for k in blocks[0]}
+
+    point = METRICS[kind](y_true[None, :], y_pred[None, :])
+    lo, hi = 100 * alpha / 2, 100 * (1 - alpha / 2)
+    out: dict[str, Any] = {
+        "n_bootstrap": n_bootstrap,
+        "alpha": alpha,
+        "n_rows": int(len(y_true)),
+        "n_workers": n_workers,
+        "seconds": time.perf_counter() - t0,
+        "metrics": {},
+    }
+    for k, v in samples.items():
+        out["metrics"][k] = {
+            "point": float(point[k][0]),
+            "ci_low": float(np.percentile(v, lo)),
+            "ci_high": float(np.percentile(v, hi)),
+            "std": float(np.std(v)),
+        }
+    return out
+
+
+def flat_ci_columns(ci: dict[str, Any]) -> dict[str, float]:
+    """Colonnes plates pour metrics_v1.csv: <metric>_ci_low / <metric>_ci_high."""
+    cols: dict[str, float] = {}
+    for k, m in ci["metrics"].items():
+        cols[f"{k}_ci_low"] = m["ci_low"]
+        cols[f"{k}_ci_high"] = m["ci_high"]
+    cols["n_bootstrap"] = ci["n_bootstrap"]
+    return cols
+
+
+def main() -> None:
+    """
+    python -m src.ml.bootstrap
+    Parité vectorisé vs boucle sklearn (mêmes indices) + chronos.
+    """
+    from sklearn.metrics import mean_absolute_error, precision_score, recall_score
+
+    rng = np.random.default_rng(0)
+    n, B = 2_000, 500
+    yt = rng.integers(0, 2, n)
+    yp = np.where(rng.random(n) < 0.8, yt, 1 - yt)
+    idx = np.random.default_rng(1).integers(0, n, size=(B, n))
+
+    t0 = time.perf_counter()
+    loop_p = [precision_score(yt[i], yp[i], zero_division=0) for i in idx]
+    loop_r = [recall_score(yt[i], yp[i], zero_division=0) for i in idx]
+    t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    vec = classification_metrics(yt.astype(bool)[idx], yp.astype(bool)[idx])
+    t_vec = time.perf_counter() - t0
+    diff = max(np.max(np.abs(vec["precision"] - loop_p)), np.max(np.abs(vec["recall"] - loop_r)))
+
+    y = rng.normal(100, 20, n)
+    y_hat = y + rng.normal(0, 5, n)
+    loop_mae = [mean_absolute_error(y[i], y_hat[i]) for i in idx]
+    diff_mae = np.max(np.abs(regression_metrics(y[idx], y_hat[idx])["MAE"] - loop_mae))
+    print(f"classification: boucle sklearn {t_loop:.2f}s | vectorisé {t_vec:.3f}s | max diff {diff:.2g}")
+    print(f"regression MAE max diff {diff_mae:.2g}")
+    if max(diff, diff_mae) > 1e-12:
+        raise AssertionError("Bootstrap vectorisé incohérent avec sklearn")
+
+    big = bootstrap_ci(np.tile(yt, 100), np.tile(yp, 100), "classification", n_bootstrap=200)
+    print(f"n={big['n_rows']} B=200 workers={big['n_workers']}: {big['seconds']:.2f}s")
+    print(big["metrics"])
+    print("bootstrap parity OK")
+
+
+if __name__ == "__main__":
+    main()
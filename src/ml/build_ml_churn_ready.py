@@ -1,3 +1,7 @@
+import os
+import sys
+
+import numpy as np
 import pandas as pd
 
 # =========================
@@ -6,6 +10,7 @@ import pandas as pd
 REPORT_PATH = "data/processed/report_oop.csv"
 SUBS_PATH = "data/raw/subscriptions.csv"
 PATH_OUT = "data/ml_ready/df_ml_churn_ready.csv"
+PATH_SNAPSHOTS_OUT = "data/ml_ready/df_ml_churn_snapshots.csv"
 
 
 # =========================
@@ -15,86 +20,237 @@ T = pd.Timestamp("2025-11-01")
 BUFFER_DAYS = 7
 HORIZON_DAYS = 30
 
-# =========================
-# Load
-# =========================
-report = pd.read_csv(REPORT_PATH)
-subs = pd.read_csv(SUBS_PATH)
+NUM_COLS = [
+    "paid_count_before_T",
+    "paid_sum_before_T",
+    "days_since_last_paid",
+]
 
-# Parse dates
-subs["date_paiement"] = pd.to_datetime(subs["date_paiement"], errors="coerce")
+# Colonnes exportées dans df_ml_churn_ready.csv (contrat historique)
+EXPORT_COLS = [
+    "client_id",
+    "paid_count_before_T",
+    "paid_sum_before_T",
+    "last_paid_before_T",
+    "days_since_last_paid",
+    "churn_7_30j",
+    "plan",
+    "ville",
+]
 
-# =========================
-# Garde-fou couverture temporelle
-# =========================
-max_payment = subs["date_paiement"].max()
-required = T + pd.Timedelta(days=HORIZON_DAYS)
-if max_payment < required:
-    raise ValueError(
-        f"Couverture insuffisante: max(date_paiement)={max_payment.date()} < "
-        f"T+{HORIZON_DAYS}j={required.date()}"
+
+def load_inputs(
+    report_path: str = REPORT_PATH, subs_path: str = SUBS_PATH
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    report = pd.read_csv(report_path)
+    subs = pd.read_csv(subs_path)
+
+    # Parse dates
+    subs["date_paiement"] = pd.to_datetime(subs["date_paiement"], errors="coerce")
+    return report, subs
+
+
+def check_coverage(subs: pd.DataFrame, T: pd.Timestamp = T) -> pd.Timestamp:
+    """
+    Garde-fou couverture temporelle: le label a besoin de T+HORIZON_DAYS.
+    Retourne max(date_paiement).
+    """
+    max_payment = subs["date_paiement"].max()
+    required = T + pd.Timedelta(days=HORIZON_DAYS)
+    if max_payment < required:
+        raise ValueError(
+            f"Couverture insuffisante: max(date_paiement)={max_payment.date()} < "
+            f"T+{HORIZON_DAYS}j={required.date()}"
+        )
+    return max_payment
+
+
+def rolling_schedule(
+    start: str | pd.Timestamp, end: str | pd.Timestamp, freq: str = "7D"
+) -> list[pd.Timestamp]:
+    """
+    Dates de référence régulières entre start et end (bornes incluses si alignées).
+    Ex: rolling_schedule("2024-11-01", "2025-11-01", "7D") -> ~1 an de snapshots hebdo.
+    """
+    return list(pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq=freq))
+
+
+def _to_days(values) -> np.ndarray:
+    return np.asarray(values, dtype="datetime64[D]").astype(np.int64)
+
+
+def build_churn_snapshots(
+    report: pd.DataFrame,
+    subs: pd.DataFrame,
+    reference_dates: list[str | pd.Timestamp],
+    require_label: bool = True,
+) -> pd.DataFrame:
+    """
+    Dataset churn multi-snapshots: une ligne par (client_id, ref_date).
+
+    Une seule passe de tri sur subs, puis pour chaque couple (client, T):
+    - paid_count_before_T / paid_sum_before_T: searchsorted + sommes cumulées
+      sur les paiements (tous statuts) triés par (client, date)
+    - days_since_last_paid: dernier paiement strictement avant T
+    - churn_7_30j: aucun paiement 'paid' dans [T+7, T+30]
+    Aucun refiltrage de subs par T: le coût est O(n log n + n_clients * n_T).
+
+    require_label=False: pas de garde-fou couverture, churn_7_30j vaut <NA>
+    pour les T sans T+HORIZON_DAYS observé (features "online").
+    """
+    Ts = sorted({pd.Timestamp(t) for t in reference_dates})
+    if not Ts:
+        raise ValueError("reference_dates est vide")
+    if require_label:
+        check_coverage(subs, Ts[-1])
+
+    events = subs[subs["date_paiement"].notna()]
+    client_ids, codes = np.unique(events["client_id"].astype(str), return_inverse=True)
+    days = _to_days(events["date_paiement"].values)
+    montant = events["montant"].to_numpy()
+    if montant.dtype.kind == "f":
+        montant = np.nan_to_num(montant)
+    is_paid = (events["statut"] == "paid").to_numpy()
+
+    t_days = _to_days([t.to_datetime64() for t in Ts])
+
+    # Clé composite (client, jour) triable: code * stride + (jour - base)
+    base = min(days.min(), t_days.min())
+    stride = max(days.max(), t_days.max() + HORIZON_DAYS) - base + 2
+    keys = codes.astype(np.int64) * stride + (days - base)
+
+    order = np.argsort(keys, kind="stable")
+    keys_all = keys[order]
+    days_all = days[order]
+    csum = np.concatenate([[0], np.cumsum(montant[order])])
+    keys_paid = np.sort(keys[is_paid])
+
+    # Grille (client, T) vectorisée
+    n_clients, n_T = len(client_ids), len(Ts)
+    q_code = np.repeat(np.arange(n_clients, dtype=np.int64), n_T)
+    q_day = np.tile(t_days, n_clients)
+    q_base = q_code * stride
+
+    first = np.searchsorted(keys_all, q_base, side="left")
+    before = np.searchsorted(keys_all, q_base + (q_day - base), side="left")
+    count = before - first
+    has_hist = count > 0
+
+    last_day = np.where(has_hist, days_all[np.maximum(before - 1, 0)], 0)
+
+    lo = np.searchsorted(keys_paid, q_base + (q_day + BUFFER_DAYS - base), "left")
+    hi = np.searchsorted(keys_paid, q_base + (q_day + HORIZON_DAYS - base), "right")
+    labelable = q_day + HORIZON_DAYS <= days.max()
+
+    snap = pd.DataFrame(
+        {
+            "ref_date": np.array([t.to_datetime64() for t in Ts], "datetime64[ns]")[
+                np.tile(np.arange(n_T), n_clients)
+            ],
+            "client_id": client_ids[q_code],
+            "paid_count_before_T": count,
+            "paid_sum_before_T": csum[before] - csum[first],
+            "last_paid_before_T": last_day.astype("datetime64[D]").astype(
+                "datetime64[ns]"
+            ),
+            "days_since_last_paid": q_day - last_day,
+            "churn_7_30j": pd.array(
+                np.where(labelable, (hi == lo).astype(int), 0), dtype="Int64"
+            ),
+        }
     )
+    # Comme le groupby pré-T: seuls les clients avec historique avant T
+    snap = snap[has_hist]
+    snap.loc[~labelable[has_hist], "churn_7_30j"] = pd.NA
 
-# =========================
-# Features subscriptions-only (pré-T)
-# =========================
-subs_pre_T = subs[subs["date_paiement"] < T].copy()
+    # =========================
+    # Attributs stables (plan, ville)
+    # =========================
+    attrs = report[["client_id", "plan", "ville"]].drop_duplicates("client_id")
+    attrs = attrs.assign(client_id=attrs["client_id"].astype(str))
 
-agg = subs_pre_T.groupby("client_id", as_index=False).agg(
-    paid_count_before_T=("date_paiement", "count"),
-    paid_sum_before_T=("montant", "sum"),
-    last_paid_before_T=("date_paiement", "max"),
-)
+    df_ml = snap.merge(attrs, on="client_id", how="left")
 
-agg["days_since_last_paid"] = (T - agg["last_paid_before_T"]).dt.days
+    # =========================
+    # Sécurité types
+    # =========================
+    for c in NUM_COLS:
+        df_ml[c] = pd.to_numeric(df_ml[c], errors="coerce")
 
-# =========================
-# Label churn_7_30j (paiement-based)
-# Fenêtre: [T+7, T+30] (borne haute incluse)
-# =========================
-start = T + pd.Timedelta(days=BUFFER_DAYS)
-end = T + pd.Timedelta(days=HORIZON_DAYS)
+    # =========================
+    # Nettoyage final
+    # =========================
+    df_ml = df_ml.dropna(subset=[c for c in df_ml.columns if c != "churn_7_30j"])
+    if require_label:
+        df_ml["churn_7_30j"] = df_ml["churn_7_30j"].astype(int)
+    return df_ml.sort_values(["ref_date", "client_id"]).reset_index(drop=True)
 
-paid_7_30 = subs[
-    (subs["statut"] == "paid")
-    & (subs["date_paiement"] >= start)
-    & (subs["date_paiement"] <= end)
-]["client_id"].unique()
 
-agg["churn_7_30j"] = (~agg["client_id"].isin(paid_7_30)).astype(int)
+def build_ml_churn_ready(
+    report: pd.DataFrame, subs: pd.DataFrame, T: pd.Timestamp = T
+) -> pd.DataFrame:
+    """
+    Snapshot unique à T (contrat historique de df_ml_churn_ready.csv).
+    report: attributs stables (client_id, plan, ville)
+    subs  : paiements avec date_paiement déjà parsée (datetime64)
+    """
+    df_ml = build_churn_snapshots(report, subs, [T])
+    return df_ml.drop(columns=["ref_date"])
 
-# =========================
-# Attributs stables (plan, ville)
-# =========================
-attrs = report[["client_id", "plan", "ville"]].drop_duplicates("client_id")
 
-df_ml = agg.merge(attrs, on="client_id", how="left")
+def parse_reference_dates(args: list[str]) -> list[pd.Timestamp]:
+    """
+    CLI:
+    - (aucun argument)            -> [T] (snapshot unique historique)
+    - --schedule START END [FREQ] -> rolling_schedule(START, END, FREQ)
+    - DATE [DATE ...]             -> liste explicite de dates de référence
+    """
+    if not args:
+        return [T]
+    if args[0] == "--schedule":
+        if len(args) not in (3, 4):
+            raise ValueError("Usage: --schedule START END [FREQ]")
+        return rolling_schedule(*args[1:])
+    return [pd.Timestamp(a) for a in args]
 
-# =========================
-# Sécurité types
-# =========================
-num_cols = [
-    "paid_count_before_T",
-    "paid_sum_before_T",
-    "days_since_last_paid",
-]
-for c in num_cols:
-    df_ml[c] = pd.to_numeric(df_ml[c], errors="coerce")
 
-df_ml["churn_7_30j"] = df_ml["churn_7_30j"].astype(int)
+def main() -> None:
+    # Local dependency (feature_store importe ce module)
+    from src.ml.feature_store import get_store
 
-# =========================
-# Nettoyage final
-# =========================
-df_ml = df_ml.dropna().reset_index(drop=True)
+    reference_dates = parse_reference_dates(sys.argv[1:])
+
+    # Snapshots servis (et mis en cache) par le feature store
+    store = get_store()
+    df_ml = store.training_frame(reference_dates)
+
+    if reference_dates == [T]:
+        df_ml = df_ml[EXPORT_COLS]
+        path_out = PATH_OUT
+    else:
+        df_ml = df_ml[["ref_date"] + EXPORT_COLS]
+        path_out = PATH_SNAPSHOTS_OUT
+
+    # =========================
+    # Export
+    # =========================
+    out_dir = os.path.dirname(path_out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    df_ml.to_csv(path_out, index=False)
+
+    if len(reference_dates) == 1:
+        print(f"T (ref_date)       : {reference_dates[0].date()}")
+    else:
+        print(
+            f"T (ref_dates)      : {len(reference_dates)} snapshots "
+            f"{reference_dates[0].date()} -> {reference_dates[-1].date()}"
+        )
+    print(f"feature store      : {store.store_dir / store.source_fingerprint()}")
+    print(f"Export             : {path_out} | shape={df_ml.shape}")
+    print("Distribution churn_7_30j:")
+    print(df_ml["churn_7_30j"].value_counts())
 
-# =========================
-# Export
-# =========================
-df_ml.to_csv(PATH_OUT, index=False)
 
-print(f"T (ref_date)       : {T.date()}")
-print(f"max(date_paiement) : {max_payment.date()}")
-print(f"Export             : {PATH_OUT} | shape={df_ml.shape}")
-print("Distribution churn_7_30j:")
-print(df_ml["churn_7_30j"].value_counts())
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
+from __future__ import annotations
+
 import os
+from pathlib import Path
+from typing import Optional
+
 import pandas as pd
 
 
@@ -7,6 +12,8 @@ import pandas as pd
 # =========================
 PATH_SRC = "data/processed/report_oop.csv"
 PATH_OUT = "data/ml_ready/df_ml_ready.csv"
+# Frame d'inférence partagé (API batch, predict_client, dashboards): 1 ligne par client
+PATH_INFERENCE = "data/ml_ready/inference_features.parquet"
 
 
 # =========================
@@ -25,37 +32,46 @@ FEATURES_CAT = [
 
 DATE_COL = "last_activity_date"
 TARGET = "ca_total"
+ID_COL = "client_id"
+REF_DATE_COL = "ref_date"
 
+# Colonnes du frame d'inférence (features du contrat + id/target pour les dashboards)
+INFERENCE_COLS = (
+    [ID_COL] + FEATURES_NUM + ["anciennete_jours"] + FEATURES_CAT + [TARGET, REF_DATE_COL]
+)
 
-def main() -> None:
-    # --- Read ---
-    print("IN :", PATH_SRC)
-    df = pd.read_csv(PATH_SRC)
-    print("shape_in :", df.shape)
-    print("cols_in  :", df.columns.tolist())
-
-    # --- Guard: required columns ---
-    required = set(FEATURES_NUM + FEATURES_CAT + [DATE_COL, TARGET])
-    missing = sorted(required - set(df.columns))
-    if missing:
-        raise KeyError(f"Colonnes manquantes dans {PATH_SRC}: {missing}")
-
-    # --- Parse dates ---
-    df[DATE_COL] = pd.to_datetime(df[DATE_COL], errors="coerce")
 
-    # Date de référence (dataset figé)
-    date_ref = df[DATE_COL].max()
+def anciennete_jours(dates: pd.Series, where: str = PATH_SRC) -> tuple[pd.Series, pd.Timestamp]:
+    """(jours depuis la dernière activité, date de référence = max des dates)."""
+    dates = pd.to_datetime(dates, errors="coerce")  # no-op si déjà datetime64
+    date_ref = dates.max()
     if pd.isna(date_ref):
         raise ValueError(
-            f"Impossible de calculer date_ref: toutes les valeurs de {DATE_COL} sont NaT après parsing."
+            f"Impossible de calculer date_ref: toutes les valeurs de {DATE_COL} "
+            f"sont NaT après parsing ({where})."
         )
+    return (date_ref - dates).dt.days, date_ref
 
-    # Feature temporelle
-    df["anciennete_jours"] = (date_ref - df[DATE_COL]).dt.days
+
+def build_ml_ready(df: pd.DataFrame, where: str = PATH_SRC) -> pd.DataFrame:
+    """
+    Construit df_ml_ready depuis un report (CSV relu ou frame typé en mémoire).
+    `where` sert uniquement aux messages d'erreur.
+    """
+    # --- Guard: required columns ---
+    required = set(FEATURES_NUM + FEATURES_CAT + [DATE_COL, TARGET])
+    missing = sorted(required - set(df.columns))
+    if missing:
+        raise KeyError(f"Colonnes manquantes dans {where}: {missing}")
 
     # --- Build ML selection ---
     cols_out = FEATURES_NUM + FEATURES_CAT + ["anciennete_jours", TARGET]
-    df_ml = df[cols_out].copy()
+    df_ml = df[FEATURES_NUM + FEATURES_CAT].copy()
+
+    # Feature temporelle (date de référence = dataset figé)
+    df_ml["anciennete_jours"], _ = anciennete_jours(df[DATE_COL], where)
+    df_ml[TARGET] = df[TARGET]
+    df_ml = df_ml[cols_out]
 
     # --- Type safety (num + target + engineered num) ---
     for c in FEATURES_NUM + ["anciennete_jours", TARGET]:
@@ -68,6 +84,66 @@ def main() -> None:
             "df_ml est vide après dropna(). Vérifie les dates (last_activity_date) "
             "et les colonnes numériques/target (coercion en NaN)."
         )
+    return df_ml
+
+
+def build_inference_frame(df: pd.DataFrame, where: str = PATH_SRC) -> pd.DataFrame:
+    """
+    Frame prêt à scorer, calculé une fois par build: toutes les lignes du
+    report (pas de dropna), types fixés, ref_date enregistrée en colonne.
+    """
+    required = set([ID_COL, DATE_COL, TARGET] + FEATURES_NUM + FEATURES_CAT)
+    missing = sorted(required - set(df.columns))
+    if missing:
+        raise KeyError(f"Colonnes manquantes dans {where}: {missing}")
+
+    out = df[[ID_COL] + FEATURES_NUM + FEATURES_CAT + [TARGET]].copy()
+    out[ID_COL] = out[ID_COL].astype(str)
+    for c in FEATURES_NUM:
+        out[c] = pd.to_numeric(out[c], errors="coerce")
+    out[TARGET] = pd.to_numeric(out[TARGET], errors="coerce").astype("float64")
+    for c in FEATURES_CAT:
+        out[c] = out[c].astype(str)
+    # int64 (float64 si une date manque: NaN, comme avant dans les consommateurs)
+    out["anciennete_jours"], date_ref = anciennete_jours(df[DATE_COL], where)
+    out[REF_DATE_COL] = date_ref
+    return out[INFERENCE_COLS].reset_index(drop=True)
+
+
+def write_inference_frame(df: pd.DataFrame, path: str | Path = PATH_INFERENCE) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def load_inference_frame(
+    columns: Optional[list[str]] = None,
+    client_ids: Optional[list[str]] = None,
+    path: str | Path = PATH_INFERENCE,
+) -> pd.DataFrame:
+    """
+    Lecture parquet avec projection (seules les colonnes demandées sont
+    décodées) et filtre client_id optionnel poussé au lecteur.
+    """
+    if not Path(path).exists():
+        raise FileNotFoundError(
+            f"{path} absent: lancer python -m src.ml.build_ml_ready (ou src.pipeline.build_all)"
+        )
+    filters = [(ID_COL, "in", list(client_ids))] if client_ids is not None else None
+    return pd.read_parquet(path, columns=columns, filters=filters)
+
+
+def main() -> None:
+    # --- Read ---
+    print("IN :", PATH_SRC)
+    df = pd.read_csv(PATH_SRC)
+    print("shape_in :", df.shape)
+    print("cols_in  :", df.columns.tolist())
+
+    df_ml = build_ml_ready(df, where=PATH_SRC)
 
     # --- Ensure output dir exists ---
     out_dir = os.path.dirname(PATH_OUT)
@@ -82,6 +158,10 @@ def main() -> None:
 
     print(f"ML-ready exporté : {PATH_OUT} | shape={df_ml.shape}")
 
+    df_inf = build_inference_frame(df, where=PATH_SRC)
+    print("OUT:", write_inference_frame(df_inf), "| shape:", df_inf.shape)
+    print("ref_date:", df_inf[REF_DATE_COL].iloc[0].date())
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+from src.ml.build_ml_churn_ready import HORIZON_DAYS, T
+from src.ml.churn_search import (
+    N_WORKERS,
+    classification_scores,
+    fold_class_weight,
+    make_estimator,
+)
+from src.ml.sampling import budget_rows, stratified_sample
+
+
+# =========================
+# Paramètres CV (rolling origin)
+# =========================
+CV_FREQ = "7D"
+CV_N_SNAPSHOTS = 9  # snapshots hebdo se terminant à T
+CV_N_FOLDS = 4  # les N dernières dates sont des origines de test
+
+SCORE_KEYS = ["precision", "recall", "f1", "roc_auc", "average_precision"]
+
+
+def cv_reference_dates(
+    end: pd.Timestamp = T, periods: int = CV_N_SNAPSHOTS, freq: str = CV_FREQ
+) -> list[pd.Timestamp]:
+    return list(pd.date_range(end=end, periods=periods, freq=freq))
+
+
+def rolling_origin_folds(
+    ref_dates: list[pd.Timestamp], n_folds: int = CV_N_FOLDS
+) -> list[dict[str, Any]]:
+    """
+    Une origine = une date de test. Le train ne contient que les snapshots
+    dont le label est entièrement observé à l'origine
+    (ref_date + HORIZON_DAYS <= origine): pas de fuite du futur.
+    """
+    dates = sorted(pd.Timestamp(d) for d in ref_dates)
+    horizon = pd.Timedelta(days=HORIZON_DAYS)
+    folds = []
+    for origin in dates[-n_folds:]:
+        train_dates = [d for d in dates if d + horizon <= origin]
+        folds.append({"origin": origin, "train_dates": train_dates})
+    return folds
+
+
+# ---------- process pool ----------
+
+_worker_ctx: dict[str, Any] = {}
+
+
+def _init_worker(df: pd.DataFrame, ctx: dict[str, Any]) -> None:
+    _worker_ctx.clear()
+    _worker_ctx.update(ctx, df=df)
+
+
+def _run_fold(fold: dict[str, Any]) -> dict[str, Any]:
+    df = _worker_ctx["df"]
+    features, target = _worker_ctx["features"], _worker_ctx["target"]
+
+    train = df[df["ref_date"].isin(fold["train_dates"])]
+    test = df[df["ref_date"] == fold["origin"]]
+    out: dict[str, Any] = {
+        "origin": str(fold["origin"].date()),
+        "train_dates": [str(d.date()) for d in fold["train_dates"]],
+        "n_train": int(len(train)),
+        "n_test": int(len(test)),
+    }
+    if train.empty or test.empty:
+        return {**out, "skipped": "train ou test vide"}
+    if train[target].nunique() < 2:
+        return {**out, "skipped": "une seule classe dans le train"}
+
+    pre = clone(_worker_ctx["pre"])
+    X_train = pre.fit_transform(train[features])
+    y_train = train[target].astype(int).to_numpy()
+    spec, weights = _worker_ctx["spec"], None
+
+    # Même budget d'entraînement que le fit final (TRAIN_MAX_ROWS / TRAIN_MAX_MB)
+    sample = _worker_ctx.get("sample")
+    budget = None if sample is None else budget_rows(X_train, sample["max_rows"], sample["max_mb"])
+    if budget is not None and budget < len(y_train):
+        classes, counts = np.unique(y_train, return_counts=True)
+        idx, weights = stratified_sample(y_train, budget, sample["random_state"])
+        X_train, y_train = X_train[idx], y_train[idx]
+        spec, weights = fold_class_weight(
+            spec, y_train, weights, dict(zip(classes.tolist(), counts.tolist()))
+        )
+        out["n_train_sampled"] = int(len(idx))
+
+    clf = make_estimator(spec)
+    clf.fit(X_train, y_train, sample_weight=weights)
+
+    X_test = pre.transform(test[features])
+    y_test = test[target].astype(int).to_numpy()
+    proba = clf.predict_proba(X_test)[:, 1]
+    y_pred = clf.predict(X_test)
+    return {
+        **out,
+        "positive_rate_test": float(y_test.mean()),
+        **classification_scores(y_test, y_pred, proba),
+    }
+
+
+def aggregate_folds(folds: list[dict[str, Any]]) -> dict[str, Any]:
+    done = [f for f in folds if "skipped" not in f]
+    agg: dict[str, Any] = {"n_folds": len(folds), "n_folds_evaluated": len(done)}
+    for k in SCORE_KEYS:
+        vals = np.array([f[k] for f in done if k in f], dtype=float)
+        if len(vals):
+            agg[k] = {
+                "mean": float(vals.mean()),
+                "std": float(vals.std(ddof=1)) if len(vals) > 1 else 0.0,
+                "min": float(vals.min()),
+                "max": float(vals.max()),
+                "n": int(len(vals)),
+            }
+    return agg
+
+
+def run_rolling_cv(
+    df: pd.DataFrame,
+    *,
+    features: list[str],
+    target: str,
+    preprocessor: Any,
+    spec: Optional[dict[str, Any]] = None,
+    n_folds: int = CV_N_FOLDS,
+    n_workers: int = N_WORKERS,
+    sample: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    """
+    df: snapshots multi-dates (colonne ref_date), cf. FeatureStore.training_frame.
+    Chaque fold (preprocessor cloné + estimateur) tourne dans un process du pool.
+    sample: budget d'entraînement (sampling.sample_params()), appliqué au train
+    de chaque fold; le test du fold reste complet.
+    """
+    spec = spec or {"estimator": "logreg", "C": 1.0, "penalty": "l2"}
+    folds = rolling_origin_folds(df["ref_date"].unique().tolist(), n_folds)
+
+    cols = ["ref_date", target] + list(features)
+    ctx = {
+        "features": features,
+        "target": target,
+        "pre": preprocessor,
+        "spec": spec,
+        "sample": sample,
+    }
+    n_workers = max(1, min(n_workers, len(folds)))
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_worker, initargs=(df[cols], ctx)
+    ) as pool:
+        results = list(pool.map(_run_fold, folds))
+
+    return {
+        "spec": spec,
+        "sample": sample,
+        "horizon_days": HORIZON_DAYS,
+        "n_workers": n_workers,
+        "summary": aggregate_folds(results),
+        "folds": results,
+    }
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import dataclasses
+import itertools
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import (
+    average_precision_score,
+    f1_score,
+    precision_score,
+    recall_score,
+    roc_auc_score,
+)
+
+from src.ml.matrix_cache import EncodedSplit, load_entry
+
+
+# =========================
+# Grille de recherche
+# =========================
+# Config historique en premier: à score égal, c'est elle qui est retenue.
+SEARCH_C = [1.0, 0.01, 0.1, 10.0, 100.0]
+# sklearn >= 1.8: la pénalité s'exprime via l1_ratio (penalty est déprécié)
+PENALTY_L1_RATIO = {"l2": 0.0, "l1": 1.0, "elasticnet": 0.5}
+SEARCH_CLASS_WEIGHTS: list[Optional[str]] = [None, "balanced"]
+
+# Estimateurs additionnels (mode "search all")
+SEARCH_RF_N_ESTIMATORS = [100, 300]
+SEARCH_RF_MAX_DEPTH: list[Optional[int]] = [None, 3]
+
+N_WORKERS = os.cpu_count() or 1
+
+# Sélection sur la fin de la fenêtre de train (le holdout reste réservé au rapport final)
+VALIDATION_SIZE = 0.3
+
+
+def logreg_candidates() -> list[dict[str, Any]]:
+    return [
+        {"estimator": "logreg", "C": C, "penalty": pen, "class_weight": cw}
+        for C, pen, cw in itertools.product(
+            SEARCH_C, PENALTY_L1_RATIO, SEARCH_CLASS_WEIGHTS
+        )
+    ]
+
+
+def rf_candidates() -> list[dict[str, Any]]:
+    return [
+        {
+            "estimator": "rf",
+            "n_estimators": n,
+            "max_depth": d,
+            "class_weight": cw,
+        }
+        for n, d, cw in itertools.product(
+            SEARCH_RF_N_ESTIMATORS, SEARCH_RF_MAX_DEPTH, SEARCH_CLASS_WEIGHTS
+        )
+    ]
+
+
+def make_estimator(spec: dict[str, Any]):
+    """spec (dict JSON-able, picklable) -> estimateur sklearn non fitté."""
+    kind = spec.get("estimator", "logreg")
+    if kind == "logreg":
+        l1_ratio = PENALTY_L1_RATIO[spec.get("penalty", "l2")]
+        return LogisticRegression(
+            C=float(spec.get("C", 1.0)),
+            l1_ratio=l1_ratio,
+            solver="lbfgs" if l1_ratio == 0.0 else "saga",
+            class_weight=spec.get("class_weight"),
+            max_iter=1000 if l1_ratio == 0.0 else 5000,
+        )
+    if kind == "rf":
+        return RandomForestClassifier(
+            n_estimators=int(spec.get("n_estimators", 100)),
+            max_depth=spec.get("max_depth"),
+            class_weight=spec.get("class_weight"),
+            random_state=42,
+            n_jobs=1,
+        )
+    raise ValueError(f"Unknown estimator: {kind}")
+
+
+def full_class_counts(meta: dict[str, Any]) -> Optional[dict[int, int]]:
+    """Effectifs par classe du train complet si le train est échantillonné (sinon None)."""
+    sample = meta.get("sample")
+    if sample is None:
+        return None
+    return {int(c): int(v["n"]) for c, v in sample["per_class"].items()}
+
+
+def fold_class_weight(
+    spec: dict[str, Any],
+    y: np.ndarray,
+    sample_weight: Optional[np.ndarray],
+    full_counts: Optional[dict[int, int]],
+) -> tuple[dict[str, Any], Optional[np.ndarray]]:
+    """
+    Train échantillonné (poids d'inclusion n_c / k_c): class_weight="balanced"
+    calculé par sklearn sur l'échantillon se cumulerait avec ces poids. On le
+    replie dans sample_weight avec les effectifs du train complet
+    (n / (n_classes * n_c)) et l'estimateur est construit sans class_weight.
+    """
+    if full_counts is None or sample_weight is None or spec.get("class_weight") != "balanced":
+        return spec, sample_weight
+    n = sum(full_counts.values())
+    balanced = {c: n / (len(full_counts) * k) for c, k in full_counts.items()}
+    row_cw = np.array([balanced[int(c)] for c in np.asarray(y)], dtype=float)
+    return {**spec, "class_weight": None}, sample_weight * row_cw
+
+
+def classification_scores(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    proba=None,
+    sample_weight: Optional[np.ndarray] = None,
+) -> dict:
+    """sample_weight: poids d'inclusion (échantillon) -> métriques de la population complète."""
+    w = sample_weight
+    scores = {
+        "precision": float(precision_score(y_true, y_pred, zero_division=0, sample_weight=w)),
+        "recall": float(recall_score(y_true, y_pred, zero_division=0, sample_weight=w)),
+        "f1": float(f1_score(y_true, y_pred, zero_division=0, sample_weight=w)),
+    }
+    # AUC / AP seulement définies si les 2 classes sont présentes
+    if proba is not None and len(np.unique(y_true)) == 2:
+        scores["roc_auc"] = float(roc_auc_score(y_true, proba, sample_weight=w))
+        scores["average_precision"] = float(
+            average_precision_score(y_true, proba, sample_weight=w)
+        )
+    return scores
+
+
+def fit_and_score(
+    spec: dict[str, Any],
+    X_train,
+    y_train: np.ndarray,
+    X_test,
+    y_test: np.ndarray,
+    sample_weight: Optional[np.ndarray] = None,
+    full_counts: Optional[dict[int, int]] = None,
+    test_weight: Optional[np.ndarray] = None,
+) -> dict[str, Any]:
+    fit_spec, sample_weight = fold_class_weight(spec, y_train, sample_weight, full_counts)
+    clf = make_estimator(fit_spec)
+    t0 = time.perf_counter()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ConvergenceWarning)
+        clf.fit(X_train, y_train, sample_weight=sample_weight)
+    fit_seconds = time.perf_counter() - t0
+
+    y_pred = clf.predict(X_test)
+    proba = clf.predict_proba(X_test)[:, 1] if len(clf.classes_) == 2 else None
+    return {
+        "spec": spec,
+        **classification_scores(y_test, y_pred, proba, sample_weight=test_weight),
+        "fit_seconds": fit_seconds,
+        "converged": not any(
+            issubclass(w.category, ConvergenceWarning) for w in caught
+        ),
+    }
+
+
+def validation_split(enc: EncodedSplit, val_size: float = VALIDATION_SIZE) -> EncodedSplit:
+    """
+    Split de sélection taillé dans le train: les derniers val_size (ordre
+    temporel de temporal_split) en validation, le début en fit. Vues sur les
+    matrices (memmap / CSR): pas de copie. Même garde-fou que temporal_split:
+    une classe absente du fit y est ramenée (première ligne de la validation).
+    Train échantillonné: la validation garde ses poids d'inclusion
+    (test_weight), les métriques de sélection visent la population complète.
+    """
+    y = np.asarray(enc.y_train).astype(int)
+    n = len(y)
+    cut = n - max(1, int(round(n * val_size)))
+    fit_rows, val_rows = slice(0, cut), slice(cut, n)
+    missing = set(np.unique(y)) - set(np.unique(y[:cut]))
+    if missing:
+        moved = [cut + int(np.flatnonzero(y[cut:] == c)[0]) for c in sorted(missing)]
+        fit_rows = np.r_[np.arange(cut), moved]
+        val_rows = np.setdiff1d(np.arange(cut, n), moved)
+    w = enc.sample_weight
+    return dataclasses.replace(
+        enc,
+        X_train=enc.X_train[fit_rows],
+        X_test=enc.X_train[val_rows],
+        y_train=enc.y_train[fit_rows],
+        y_test=enc.y_train[val_rows],
+        sample_weight=None if w is None else w[fit_rows],
+        test_weight=None if w is None else w[val_rows],
+        meta={**enc.meta, "n_fit": len(y[fit_rows]), "n_validation": len(y[val_rows])},
+    )
+
+
+# ---------- process pool ----------
+
+_worker_split: Optional[EncodedSplit] = None
+
+
+def _init_worker(key: str, enc: Optional[EncodedSplit], val_size: Optional[float]) -> None:
+    # Entrée du cache: rechargée en memmap (pages partagées, pas de copie)
+    global _worker_split
+    _worker_split = load_entry(key) if enc is None else enc
+    if val_size:
+        _worker_split = validation_split(_worker_split, val_size)
+
+
+def _evaluate(spec: dict[str, Any]) -> dict[str, Any]:
+    enc = _worker_split
+    assert enc is not None
+    return fit_and_score(
+        spec,
+        enc.X_train,
+        enc.y_train.astype(int),
+        enc.X_test,
+        enc.y_test.astype(int),
+        sample_weight=enc.sample_weight,
+        full_counts=full_class_counts(enc.meta),
+        test_weight=enc.test_weight,
+    )
+
+
+def rank_key(result: dict[str, Any]) -> tuple:
+    return (-result["f1"], -result["recall"], -result["precision"])
+
+
+def run_search(
+    enc: EncodedSplit,
+    candidates: list[dict[str, Any]],
+    n_workers: int = N_WORKERS,
+    val_size: Optional[float] = VALIDATION_SIZE,
+) -> list[dict[str, Any]]:
+    """
+    Évalue chaque candidat (fit + score) dans un pool de process, sur la
+    design matrix déjà encodée: validation taillée dans le train
+    (validation_split), ou holdout si val_size=None. Retourne les résultats
+    triés (meilleur en premier; ordre de la grille en cas d'égalité).
+    """
+    n_workers = max(1, min(n_workers, len(candidates)))
+    # Entrée en cache: les workers la rouvrent eux-mêmes (rien à sérialiser)
+    init_args = (enc.key, None, val_size) if enc.key else ("", enc, val_size)
+
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_worker, initargs=init_args
+    ) as pool:
+        results = list(pool.map(_evaluate, candidates))
+
+    for i, r in enumerate(results):
+        r["rank_in_grid"] = i
+    return sorted(results, key=lambda r: (*rank_key(r), r["rank_in_grid"]))
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.ml.registry import artifact_path, current_version
+
+
+log = logging.getLogger("saas_drift")
+
+
+# =========================
+# Paramètres
+# =========================
+FEATURES_NUM = ["paid_count_before_T", "paid_sum_before_T", "days_since_last_paid"]
+FEATURES_CAT = ["plan", "ville"]
+
+N_BINS = 10  # bins numériques = quantiles du train (bornes uniques)
+OTHER = "__other__"  # modalité absente de la référence
+EPS = 1e-4  # lissage des proportions nulles (PSI)
+
+# Seuils PSI usuels: < 0.1 stable, 0.1-0.25 à surveiller, > 0.25 drift
+PSI_WARN = 0.10
+PSI_ALERT = 0.25
+
+REFERENCE_FILE = "drift_reference.json"  # à côté de model.joblib dans le registre
+LIVE_DIR = Path("data/drift")  # <name>/<version>/<source>.json (api, batch)
+
+
+def reference_path(name: str, version: str) -> Path:
+    return artifact_path(name, version).with_name(REFERENCE_FILE)
+
+
+def live_path(name: str, version: str, source: str) -> Path:
+    return LIVE_DIR / name / version / f"{source}.json"
+
+
+def _write_json_atomic(path: Path, payload: dict) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    tmp.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+# ---------- référence (train) ----------
+
+
+def build_reference(
+    df: pd.DataFrame | Iterable[pd.DataFrame], n_bins: int = N_BINS
+) -> dict[str, Any]:
+    """
+    Histogrammes de référence sur les données d'entraînement (DataFrame ou
+    blocs successifs: seules les colonnes de features sont conservées).
+    Numérique: bornes internes = quantiles (les bins extrêmes sont ouverts).
+    Catégoriel: une case par modalité vue + OTHER.
+    """
+    chunks = [df] if isinstance(df, pd.DataFrame) else df
+    num: dict[str, list[np.ndarray]] = {c: [] for c in FEATURES_NUM}
+    cat: dict[str, pd.Series] = {c: pd.Series(dtype="int64") for c in FEATURES_CAT}
+    n_rows = 0
+    for chunk in chunks:
+        n_rows += len(chunk)
+        for c in FEATURES_NUM:
+            num[c].append(pd.to_numeric(chunk[c], errors="coerce").dropna().to_numpy(dtype=float))
+        for c in FEATURES_CAT:
+            cat[c] = cat[c].add(chunk[c].astype(str).value_counts(), fill_value=0)
+
+    features: dict[str, Any] = {}
+    for c in FEATURES_NUM:
+        x = np.concatenate(num[c]) if num[c] else np.empty(0)
+        edges = np.unique(np.quantile(x, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(edges, x, side="right"), minlength=len(edges) + 1)
+        features[c] = {"kind": "num", "edges": edges.tolist(), "counts": counts.tolist()}
+    for c in FEATURES_CAT:
+        vc = cat[c].sort_index()
+        features[c] = {
+            "kind": "cat",
+            "categories": vc.index.tolist() + [OTHER],
+            "counts": vc.to_numpy().astype(int).tolist() + [0],
+        }
+    return {"n_rows": int(n_rows), "n_bins": n_bins, "features": features}
+
+
+def export_reference(
+    name: str, version: str, df: pd.DataFrame | Iterable[pd.DataFrame]
+) -> Path:
+    return _write_json_atomic(reference_path(name, version), build_reference(df))
+
+
+def load_reference(name: str, version: Optional[str]) -> Optional[dict]:
+    if version is None:
+        return None
+    path = reference_path(name, version)
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+
+# ---------- métriques O(bins) ----------
+
+
+def psi(ref_counts: np.ndarray, live_counts: np.ndarray, eps: float = EPS) -> float:
+    p = np.maximum(ref_counts / max(ref_counts.sum(), 1), eps)
+    q = np.maximum(live_counts / max(live_counts.sum(), 1), eps)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def ks_binned(ref_counts: np.ndarray, live_counts: np.ndarray) -> float:
+    """KS sur histogrammes: écart max des CDF aux bornes de bins (approximation binnée)."""
+    p = np.cumsum(ref_counts) / max(ref_counts.sum(), 1)
+    q = np.cumsum(live_counts) / max(live_counts.sum(), 1)
+    return float(np.max(np.abs(p - q)))
+
+
+def psi_status(value: float) -> str:
+    if value >= PSI_ALERT:
+        return "alert"
+    if value >= PSI_WARN:
+        return "warn"
+    return "ok"
+
+
+# ---------- histogrammes live (incrémentaux) ----------
+
+
+@dataclass
+class DriftMonitor:
+    """
+    Histogrammes live sur les bins de la référence, mis à jour ligne par
+    ligne (API) ou par chunk (batch): O(features x log bins) par ligne, pas
+    de données brutes conservées. report() en O(bins).
+    """
+
+    reference: dict
+    counts: dict[str, np.ndarray] = field(default_factory=dict)
+    n_rows: int = 0
+
+    def __post_init__(self) -> None:
+        feats = self.reference["features"]
+        self._edges = {c: np.asarray(f["edges"]) for c, f in feats.items() if f["kind"] == "num"}
+        self._cat_index = {
+            c: {v: i for i, v in enumerate(f["categories"])}
+            for c, f in feats.items()
+            if f["kind"] == "cat"
+        }
+        for c, f in feats.items():
+            self.counts.setdefault(c, np.zeros(len(f["counts"]), dtype=np.int64))
+            self.counts[c] = np.asarray(self.counts[c], dtype=np.int64)
+
+    def update_one(self, row: Mapping[str, Any]) -> None:
+        for c, edges in self._edges.items():
+            self.counts[c][int(np.searchsorted(edges, float(row[c]), side="right"))] += 1
+        for c, index in self._cat_index.items():
+            self.counts[c][index.get(str(row[c]), index[OTHER])] += 1
+        self.n_rows += 1
+
+    def update_frame(self, df: pd.DataFrame) -> None:
+        for c, edges in self._edges.items():
+            x = pd.to_numeric(df[c], errors="coerce").dropna().to_numpy(dtype=float)
+            self.counts[c] += np.bincount(
+                np.searchsorted(edges, x, side="right"), minlength=len(edges) + 1
+            )
+        for c, index in self._cat_index.items():
+            idx = df[c].astype(str).map(index).fillna(index[OTHER]).to_numpy(dtype=np.int64)
+            self.counts[c] += np.bincount(idx, minlength=len(index))
+        self.n_rows += int(len(df))
+
+    def report(self) -> dict[str, Any]:
+        features = {}
+        for c, f in self.reference["features"].items():
+            ref, live = np.asarray(f["counts"], dtype=float), self.counts[c].astype(float)
+            value = psi(ref, live) if self.n_rows else 0.0
+            out = {"psi": value, "status": psi_status(value) if self.n_rows else "no_data"}
+            if f["kind"] == "num":
+                out["ks"] = ks_binned(ref, live) if self.n_rows else 0.0
+            else:
+                out["other_share"] = float(live[-1] / self.n_rows) if self.n_rows else 0.0
+            features[c] = out
+        statuses = [f["status"] for f in features.values()]
+        overall = next((s for s in ("alert", "warn") if s in statuses), "ok")
+        return {
+            "n_rows": self.n_rows,
+            "status": overall if self.n_rows else "no_data",
+            "features": features,
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"n_rows": self.n_rows, "counts": {c: v.tolist() for c, v in self.counts.items()}}
+
+    def save(self, path: Path) -> Path:
+        return _write_json_atomic(path, self.to_dict())
+
+    @classmethod
+    def load(cls, reference: dict, path: Optional[Path] = None) -> "DriftMonitor":
+        """Reprend les compteurs persistés (si présents) sur la même référence."""
+        if path is not None and path.exists():
+            state = json.loads(path.read_text(encoding="utf-8"))
+            return cls(reference, counts=state["counts"], n_rows=int(state["n_rows"]))
+        return cls(reference)
+
+
+def open_monitor(name: str, version: Optional[str], source: str) -> Optional[DriftMonitor]:
+    """Moniteur de la version donnée (compteurs repris du disque); None sans référence."""
+    reference = load_reference(name, version)
+    if reference is None:
+        return None
+    return DriftMonitor.load(reference, live_path(name, version, source))
+
+
+def log_report(name: str, version: str, source: str, report: dict) -> None:
+    drifted = {c: round(f["psi"], 3) for c, f in report["features"].items() if f["status"] != "ok"}
+    level = logging.WARNING if report["status"] in ("warn", "alert") else logging.INFO
+    log.log(
+        level,
+        "Drift | %s@%s source=%s n=%s status=%s psi=%s",
+        name,
+        version,
+        source,
+        report["n_rows"],
+        report["status"],
+        drifted or "-",
+    )
+
+
+def drift_reports(name: str, version: Optional[str] = None) -> dict[str, Any]:
+    """Rapports par source (api, batch, ...) pour la version donnée (défaut: promue)."""
+    version = version or current_version(name)
+    reference = load_reference(name, version)
+    if reference is None:
+        return {"model_version": version, "sources": {}}
+    root = LIVE_DIR / name / str(version)
+    sources = sorted(p.stem for p in root.glob("*.json")) if root.exists() else []
+    return {
+        "model_version": version,
+        "reference_rows": reference["n_rows"],
+        "sources": {
+            s: DriftMonitor.load(reference, live_path(name, version, s)).report() for s in sources
+        },
+    }
+
+
+def main() -> None:
+    """
+    python -m src.ml.drift [churn]
+    Écrit la référence de la version promue si absente (données d'entraînement),
+    puis contrôle: dataset complet (PSI faible) vs dataset décalé (drift attendu).
+    """
+    from src.ml.train_churn_model import PATH_IN, temporal_split
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "churn"
+    version = current_version(name)
+    if version is None:
+        raise FileNotFoundError(f"Aucune version promue pour {name} dans le registre")
+
+    df = pd.read_csv(PATH_IN)
+    if load_reference(name, version) is None:
+        print("OUT reference:", export_reference(name, version, temporal_split(df)[0]))
+    reference = load_reference(name, version)
+
+    same = DriftMonitor(reference)
+    for row in df.to_dict("records"):
+        same.update_one(row)
+    frame = DriftMonitor(reference)
+    frame.update_frame(df)
+    if not all(np.array_equal(same.counts[c], frame.counts[c]) for c in same.counts):
+        raise AssertionError("update_one et update_frame divergent")
+
+    shifted = df.assign(
+        days_since_last_paid=df["days_since_last_paid"] + 60,
+        ville=np.where(np.arange(len(df)) % 2 == 0, "Nantes", df["ville"]),
+    )
+    drifted = DriftMonitor(reference)
+    drifted.update_frame(shifted)
+
+    for label, mon in (("dataset", frame), ("shifted", drifted)):
+        rep = mon.report()
+        print(label, rep["status"], {c: round(f["psi"], 3) for c, f in rep["features"].items()})
+    if drifted.report()["status"] != "alert":
+        raise AssertionError("Décalage non détecté")
+    print("drift check OK")
+
+
+if __name__ == "__main__":
+    main()
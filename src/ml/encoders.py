@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.preprocessing import OneHotEncoder
+
+
+DEFAULT_N_BUCKETS = 64
+
+# Choix de l'encodage catégoriel (entraînement): onehot (historique) | hashed
+CAT_ENCODING_ENV = "CAT_ENCODING"
+N_BUCKETS_ENV = "CAT_HASH_BUCKETS"
+CAT_ENCODINGS = ("onehot", "hashed")
+
+# Colonnes à forte cardinalité (hashées en mode "hashed"); les autres restent en one-hot
+HIGH_CARDINALITY_COLS = ("ville",)
+
+
+class HashedCategoricalEncoder(TransformerMixin, BaseEstimator):
+    """
+    Encodage catégoriel de largeur fixe: chaque valeur devient le token
+    "colonne=valeur", hashé (murmurhash3, cf. FeatureHasher) dans n_features
+    buckets. Sans état: fit ne mémorise que les noms de colonnes, la largeur
+    ne dépend ni du nombre de villes ni de l'historique vu.
+    """
+
+    def __init__(self, n_features: int = DEFAULT_N_BUCKETS, alternate_sign: bool = False):
+        self.n_features = n_features
+        self.alternate_sign = alternate_sign
+
+    def _columns(self, X) -> list[str]:
+        if isinstance(X, pd.DataFrame):
+            return [str(c) for c in X.columns]
+        return [f"x{i}" for i in range(np.asarray(X).shape[1])]
+
+    def _hasher(self) -> FeatureHasher:
+        return FeatureHasher(
+            n_features=self.n_features,
+            input_type="string",
+            alternate_sign=self.alternate_sign,
+        )
+
+    def fit(self, X, y=None):
+        self.feature_names_in_ = np.asarray(self._columns(X), dtype=object)
+        self.n_features_in_ = len(self.feature_names_in_)
+        return self
+
+    def tokens(self, X) -> list[list[str]]:
+        values = X.to_numpy() if isinstance(X, pd.DataFrame) else np.asarray(X)
+        cols = [str(c) for c in self.feature_names_in_]
+        return [
+            [f"{c}={v}" for c, v in zip(cols, row)] for row in values.astype(str)
+        ]
+
+    def transform(self, X):
+        return self._hasher().transform(self.tokens(X))
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray([f"hash_{i}" for i in range(self.n_features)], dtype=object)
+
+
+def cat_encoding() -> str:
+    encoding = (os.getenv(CAT_ENCODING_ENV) or "onehot").strip().lower()
+    if encoding not in CAT_ENCODINGS:
+        raise ValueError(f"{CAT_ENCODING_ENV}={encoding!r} invalide (attendu: {CAT_ENCODINGS})")
+    return encoding
+
+
+def n_buckets() -> int:
+    return int(os.getenv(N_BUCKETS_ENV) or DEFAULT_N_BUCKETS)
+
+
+def categorical_transformers(
+    cat_cols: list[str],
+    encoding: Optional[str] = None,
+    n_features: Optional[int] = None,
+) -> list[tuple[str, Any, list[str]]]:
+    """
+    Étapes catégorielles pour ColumnTransformer.
+    - onehot: OneHotEncoder(handle_unknown="ignore") sur toutes les colonnes
+    - hashed: one-hot sur les colonnes à faible cardinalité (plan),
+              HashedCategoricalEncoder sur HIGH_CARDINALITY_COLS (ville)
+    """
+    encoding = encoding or cat_encoding()
+    if encoding == "onehot":
+        return [("cat", OneHotEncoder(handle_unknown="ignore"), list(cat_cols))]
+
+    low = [c for c in cat_cols if c not in HIGH_CARDINALITY_COLS]
+    high = [c for c in cat_cols if c in HIGH_CARDINALITY_COLS]
+    steps: list[tuple[str, Any, list[str]]] = []
+    if low:
+        steps.append(("cat", OneHotEncoder(handle_unknown="ignore"), low))
+    if high:
+        steps.append(
+            ("cat_hash", HashedCategoricalEncoder(n_features or n_buckets()), high)
+        )
+    return steps
+
+
+def pipeline_cat_encoding(model: Any) -> str:
+    """Encodage catégoriel d'un Pipeline fitté (onehot | hashed), pour /health."""
+    steps = getattr(model, "named_steps", {})
+    for step in steps.values():
+        for _, trans, _ in getattr(step, "transformers_", []):
+            if isinstance(trans, HashedCategoricalEncoder):
+                return "hashed"
+    return "onehot"
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from src.ml.registry import artifact_path, current_version
+
+
+EXPLANATIONS_FILE = "explanations.json"  # importances globales (tous modèles)
+CONTRIBUTIONS_FILE = "contributions.parquet"  # contributions par client (modèles linéaires)
+
+N_REPEATS = 10  # permutation importance (RF)
+RANDOM_STATE = 42
+TOP_K = 3
+
+
+def explanations_path(name: str, version: str) -> Path:
+    return artifact_path(name, version).with_name(EXPLANATIONS_FILE)
+
+
+def contributions_path(name: str, version: str) -> Path:
+    return artifact_path(name, version).with_name(CONTRIBUTIONS_FILE)
+
+
+def _write_atomic(path: Path, write) -> Path:
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    write(tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def _ranked(names: np.ndarray, values: np.ndarray, **extra: np.ndarray) -> list[dict]:
+    order = np.argsort(-np.abs(values), kind="stable")
+    return [
+        {"feature": str(names[i]), "importance": float(values[i]), **{k: float(v[i]) for k, v in extra.items()}}
+        for i in order
+    ]
+
+
+# ---------- modèles linéaires: contributions = coef x valeur encodée ----------
+
+
+def linear_contributions(
+    pipe: Any, chunks: Iterable[tuple[pd.DataFrame, pd.Series]]
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Contributions de tous les clients en un produit creux X_enc @ diag(coef)
+    par bloc (X, ids) (one-hot / hash: X_enc déjà creux). Format long,
+    non-zéros seulement: client_id, feature, contribution.
+    decision = intercept + somme par client.
+    """
+    pre, clf = pipe.steps[0][1], pipe.steps[-1][1]
+    names = np.asarray(pre.get_feature_names_out(), dtype=object)
+    coef = np.ravel(clf.coef_)
+    intercept = float(np.ravel(clf.intercept_)[0])
+
+    parts = []
+    abs_sum = np.zeros(len(coef))
+    n_clients = 0
+    for X, ids in chunks:
+        C = sp.csr_matrix(pre.transform(X)) @ sp.diags(coef)
+        abs_sum += np.asarray(abs(C).sum(axis=0)).ravel()
+        n_clients += C.shape[0]
+        coo = C.tocoo()
+        keep = coo.data != 0
+        rows, cols = coo.row[keep], coo.col[keep]
+        parts.append(
+            pd.DataFrame(
+                {
+                    "client_id": np.asarray(ids.astype(str))[rows],
+                    "feature": names[cols],
+                    "contribution": coo.data[keep],
+                }
+            )
+        )
+
+    long = pd.concat(parts, ignore_index=True).sort_values(
+        ["client_id", "feature"], kind="stable", ignore_index=True
+    )
+    # Importance globale: |contribution| moyenne sur la base (zéros inclus)
+    mean_abs = abs_sum / max(n_clients, 1)
+    summary = {
+        "kind": "linear",
+        "intercept": intercept,
+        "n_clients": int(n_clients),
+        "global": _ranked(names, mean_abs, coef=coef),
+    }
+    return long, summary
+
+
+# ---------- arbres: importance impurity + permutation ----------
+
+
+def tree_importances(pipe: Any, X_test: Any, y_test: np.ndarray, scoring: str) -> dict:
+    """
+    feature_importances_ (impurity, gratuit) + permutation importance sur le
+    holdout déjà encodé (mêmes noms de features que l'impurity).
+    """
+    from sklearn.inspection import permutation_importance
+
+    pre, model = pipe.steps[0][1], pipe.steps[-1][1]
+    names = np.asarray(pre.get_feature_names_out(), dtype=object)
+    X_test = X_test.toarray() if sp.issparse(X_test) else np.asarray(X_test)
+    perm = permutation_importance(
+        model, X_test, y_test, scoring=scoring, n_repeats=N_REPEATS, random_state=RANDOM_STATE
+    )
+    return {
+        "kind": "tree",
+        "global": _ranked(names, model.feature_importances_),
+        "permutation": {
+            "scoring": scoring,
+            "n_repeats": N_REPEATS,
+            "n_rows": int(X_test.shape[0]),
+            "features": _ranked(names, perm.importances_mean, std=perm.importances_std),
+        },
+    }
+
+
+def export_explanations(
+    name: str,
+    version: str,
+    pipe: Any,
+    *,
+    X: Optional[pd.DataFrame] = None,
+    ids: Optional[pd.Series] = None,
+    chunks: Optional[Iterable[tuple[pd.DataFrame, pd.Series]]] = None,
+    X_test: Any = None,
+    y_test: Optional[np.ndarray] = None,
+    scoring: str = "neg_mean_absolute_error",
+) -> Optional[Path]:
+    """
+    Écrit explanations.json (+ contributions.parquet pour un modèle linéaire)
+    dans l'entrée du registre. Linéaire: X/ids = base client à expliquer, ou
+    chunks = blocs (X, ids) lus en streaming; arbres: X_test/y_test = holdout
+    encodé. None si le modèle n'est ni l'un ni l'autre.
+    """
+    model = pipe.steps[-1][1]
+    entry = artifact_path(name, version).parent
+    if chunks is None and X is not None and ids is not None:
+        chunks = [(X, ids)]
+    if hasattr(model, "coef_") and chunks is not None:
+        long, summary = linear_contributions(pipe, chunks)
+        _write_atomic(entry / CONTRIBUTIONS_FILE, lambda p: long.to_parquet(p, index=False))
+    elif hasattr(model, "feature_importances_") and X_test is not None:
+        summary = tree_importances(pipe, X_test, y_test, scoring)
+    else:
+        print(f"explain: {type(model).__name__} ignoré (ni coef_ ni feature_importances_)")
+        return None
+
+    summary = {"name": name, "version": version, "model": type(model).__name__, **summary}
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    return _write_atomic(entry / EXPLANATIONS_FILE, lambda p: p.write_text(text, encoding="utf-8"))
+
+
+# ---------- lecture (dashboards / agent) ----------
+
+
+def load_explanations(name: str, version: Optional[str]) -> Optional[dict]:
+    if version is None:
+        return None
+    path = explanations_path(name, version)
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+
+def load_contributions(
+    name: str, version: Optional[str], client_ids: Optional[list[str]] = None
+) -> Optional[pd.DataFrame]:
+    if version is None:
+        return None
+    path = contributions_path(name, version)
+    if not path.exists():
+        return None
+    filters = [("client_id", "in", list(client_ids))] if client_ids is not None else None
+    return pd.read_parquet(path, filters=filters)
+
+
+def explain_client(name: str, client_id: str, top_k: int = TOP_K) -> Optional[dict]:
+    """
+    Top contributions (en log-odds pour la régression logistique) d'un client
+    pour la version promue; None si pas d'artefact précalculé.
+    """
+    version = current_version(name)
+    meta = load_explanations(name, version)
+    contrib = load_contributions(name, version, [client_id])
+    if meta is None or contrib is None or contrib.empty:
+        return None
+    contrib = contrib.reindex(contrib["contribution"].abs().sort_values(ascending=False).index)
+    return {
+        "client_id": client_id,
+        "model_version": version,
+        "intercept": meta["intercept"],
+        "decision": meta["intercept"] + float(contrib["contribution"].sum()),
+        "top_increase": contrib[contrib["contribution"] > 0].head(top_k).to_dict("records"),
+        "top_decrease": contrib[contrib["contribution"] < 0].head(top_k).to_dict("records"),
+    }
+
+
+def main() -> None:
+    """
+    python -m src.ml.explain [churn] [client_id]
+    Affiche l'explication précalculée d'un client et vérifie que
+    intercept + somme des contributions == decision_function du modèle.
+    """
+    from src.ml.registry import load_current
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "churn"
+    client_id = sys.argv[2] if len(sys.argv) > 2 else "C002"
+    out = explain_client(name, client_id)
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+    if out is None:
+        return
+
+    pipe, _ = load_current(name)
+    df = pd.read_csv("data/ml_ready/df_ml_churn_ready.csv", dtype={"client_id": str})
+    X = df.loc[df["client_id"] == client_id, list(pipe.steps[0][1].feature_names_in_)]
+    ref = float(pipe.decision_function(X)[0])
+    print(f"decision_function: {ref:.12f} | artefact: {out['decision']:.12f}")
+    if abs(ref - out["decision"]) > 1e-9:
+        raise AssertionError("Contributions incohérentes avec le modèle")
+    print("parity OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+from typing import Any, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.ml.registry import artifact_path, list_versions, load_artifact
+
+
+ONNX_FILE = "model.onnx"  # à côté de model.joblib dans le registre
+ONNX_OPSET = 17
+
+# Parité sklearn (float64) vs onnxruntime (float32)
+PARITY_ATOL = 1e-4
+
+DATASETS = {
+    "churn": "data/ml_ready/df_ml_churn_ready.csv",
+    "revenue": "data/ml_ready/df_ml_ready.csv",
+}
+
+
+def onnx_path(name: str, version: str) -> Path:
+    return artifact_path(name, version).with_name(ONNX_FILE)
+
+
+def _input_columns(pipe: Any) -> tuple[list[str], list[str]]:
+    """(colonnes numériques, colonnes catégorielles) vues par le ColumnTransformer."""
+    pre = pipe.steps[0][1]
+    num: list[str] = []
+    cat: list[str] = []
+    for name, trans, cols in pre.transformers_:
+        if isinstance(trans, str) and trans == "drop":
+            continue
+        kind = type(trans).__name__
+        if kind == "OneHotEncoder":
+            cat += list(cols)
+        elif kind == "StandardScaler" or (
+            # "passthrough" une fois fitté: FunctionTransformer(func=None)
+            kind == "FunctionTransformer" and trans.func is None
+        ):
+            num += list(cols)
+        else:
+            raise ValueError(f"Transformer sans convertisseur ONNX: {name}={trans!r}")
+    return num, cat
+
+
+def export_pipeline(pipe: Any, path: str | Path) -> Path:
+    """Pipeline sklearn (ColumnTransformer inclus) -> fichier ONNX (1 entrée par colonne)."""
+    try:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType, StringTensorType
+    except ImportError as e:
+        raise RuntimeError(
+            "skl2onnx requis pour l'export ONNX (pip install skl2onnx)"
+        ) from e
+
+    num, cat = _input_columns(pipe)
+    initial_types = [(c, FloatTensorType([None, 1])) for c in num] + [
+        (c, StringTensorType([None, 1])) for c in cat
+    ]
+    options = None
+    if hasattr(pipe.steps[-1][1], "predict_proba"):
+        # Probabilités en tenseur (pas de liste de dicts)
+        options = {id(pipe.steps[-1][1]): {"zipmap": False}}
+
+    onx = convert_sklearn(
+        pipe, initial_types=initial_types, target_opset=ONNX_OPSET, options=options
+    )
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(onx.SerializeToString())
+    tmp.replace(path)
+    return path
+
+
+class OnnxModel:
+    """
+    Pipeline exporté servi par onnxruntime (InferenceSession, CPU).
+    predict / predict_proba sur DataFrame (comme sklearn) ou *_one sur un dict.
+    """
+
+    def __init__(self, path: str | Path):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError("onnxruntime requis pour MODEL_BACKEND=onnx") from e
+
+        self.path = Path(path)
+        self.session = ort.InferenceSession(
+            str(self.path), providers=["CPUExecutionProvider"]
+        )
+        self.inputs = {i.name: i.type for i in self.session.get_inputs()}
+        self.outputs = [o.name for o in self.session.get_outputs()]
+        self.is_classifier = "probabilities" in self.outputs
+
+    def _feed(self, columns: Mapping[str, Any]) -> dict[str, np.ndarray]:
+        feed = {}
+        for name, typ in self.inputs.items():
+            values = np.asarray(columns[name]).reshape(-1, 1)
+            feed[name] = (
+                values.astype(str).astype(object)
+                if typ == "tensor(string)"
+                else values.astype(np.float32)
+            )
+        return feed
+
+    def _run(self, columns: Mapping[str, Any]) -> list[np.ndarray]:
+        return self.session.run(None, self._feed(columns))
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        out = self._run({c: X[c].to_numpy() for c in self.inputs})
+        return out[0].ravel()
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        if not self.is_classifier:
+            raise AttributeError("predict_proba: modèle ONNX non classifieur")
+        return self._run({c: X[c].to_numpy() for c in self.inputs})[1]
+
+    def predict_one(self, row: Mapping[str, Any]) -> Any:
+        return self._run({c: [row[c]] for c in self.inputs})[0].ravel()[0].item()
+
+    def predict_proba_one(self, row: Mapping[str, Any]) -> float:
+        return float(self._run({c: [row[c]] for c in self.inputs})[1][0, 1])
+
+
+def load_onnx(name: str, version: Optional[str]) -> Optional[OnnxModel]:
+    """Modèle ONNX exporté pour cette version (None si absent / fallback legacy)."""
+    if version is None:
+        return None
+    path = onnx_path(name, version)
+    return OnnxModel(path) if path.exists() else None
+
+
+def parity_check(pipe: Any, model: OnnxModel, X: pd.DataFrame) -> dict:
+    out: dict[str, Any] = {"n_rows": int(len(X))}
+    if model.is_classifier:
+        out["max_abs_diff_proba"] = float(
+            np.max(np.abs(pipe.predict_proba(X)[:, 1] - model.predict_proba(X)[:, 1]))
+        )
+        out["predict_mismatches"] = int(np.sum(pipe.predict(X) != model.predict(X)))
+    else:
+        ref = pipe.predict(X)
+        out["max_abs_diff_predict"] = float(np.max(np.abs(ref - model.predict(X))))
+        out["max_rel_diff_predict"] = float(
+            np.max(np.abs(ref - model.predict(X)) / np.maximum(np.abs(ref), 1.0))
+        )
+    return out
+
+
+def parity_ok(report: dict) -> bool:
+    if report.get("predict_mismatches", 0):
+        return False
+    diff = report.get("max_abs_diff_proba", report.get("max_rel_diff_predict", 0.0))
+    return diff <= PARITY_ATOL
+
+
+def export_version(name: str, version: str, X: pd.DataFrame) -> Optional[dict]:
+    """
+    Export dans un fichier temporaire, contrôle de parité sur ce fichier, puis
+    os.replace vers model.onnx seulement si la parité passe. Sinon le
+    temporaire et un éventuel export précédent sont retirés (load_onnx ne
+    sert jamais un graphe divergent) et report["exported"] vaut False.
+    """
+    pipe = load_artifact(artifact_path(name, version), mmap=False)
+    path = onnx_path(name, version)
+    tmp = path.with_name(f".{path.name}.parity-{os.getpid()}")
+    try:
+        export_pipeline(pipe, tmp)
+    except ValueError as e:
+        print(f"{name}@{version}: export ignoré ({e})")
+        return None
+    try:
+        report = parity_check(pipe, OnnxModel(tmp), X[list(pipe.steps[0][1].feature_names_in_)])
+        report["exported"] = parity_ok(report)
+        if report["exported"]:
+            os.replace(tmp, path)
+        else:
+            path.unlink(missing_ok=True)
+    finally:
+        tmp.unlink(missing_ok=True)
+    if report["exported"]:
+        print(f"OUT onnx {name}@{version}: {path} | {report}")
+    else:
+        print(f"{name}@{version}: export refusé, parité sklearn KO ({report})")
+    return report
+
+
+def main() -> None:
+    """
+    python -m src.ml.export_onnx [churn] [revenue]
+    Exporte toutes les versions du registre (churn + revenue: LR et RF) en ONNX;
+    seuls les graphes à parité numérique avec sklearn sur le dataset sont écrits.
+    """
+    names = sys.argv[1:] or list(DATASETS)
+    failures = []
+    for name in names:
+        df = pd.read_csv(DATASETS[name])
+        unseen = df.head(3).assign(ville="__unseen__")
+        X = pd.concat([df, unseen], ignore_index=True)
+        for meta in list_versions(name):
+            report = export_version(name, meta["version"], X)
+            if report is not None and not report["exported"]:
+                failures.append((name, meta["version"], report))
+
+    if failures:
+        raise AssertionError(f"Parité ONNX/sklearn KO: {failures}")
+    print("parity OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+from __future__ import annotations
+
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Mapping, Optional, Sequence
+
+import numpy as np
+from scipy.special import expit
+from sklearn.utils import murmurhash3_32
+
+from src.ml.encoders import HashedCategoricalEncoder
+from src.ml.registry import artifact_path
+
+
+SCORER_FILE = "scorer.json"  # à côté de model.joblib dans le registre
+SCORER_VERSION = 1
+
+# Parité exigée à l'export (sinon scorer.json n'est pas écrit)
+PARITY_TOL = 1e-9
+PARITY_ROWS = 1_000
+UNSEEN = "__unseen__"
+
+
+@dataclass(frozen=True)
+class DenseEncoder:
+    """
+    Équivalent du ColumnTransformer fitté, sur des dicts/float arrays:
+    - num     : colonnes numériques aux positions num_index (centrées/réduites si mean/scale)
+    - onehot  : vocabulaire {colonne: {valeur: position}} (valeur inconnue -> 0 partout)
+    - hashed  : {colonne: (offset, n_features, alternate_sign)}, tokens "colonne=valeur"
+    """
+
+    n_features: int
+    num_cols: list[str]
+    num_index: list[int]
+    mean: Optional[list[float]] = None
+    scale: Optional[list[float]] = None
+    onehot: dict[str, dict[str, int]] = field(default_factory=dict)
+    hashed: dict[str, tuple[int, int, bool]] = field(default_factory=dict)
+
+    @classmethod
+    def from_column_transformer(cls, pre: Any) -> "DenseEncoder":
+        num_cols: list[str] = []
+        num_index: list[int] = []
+        mean: list[float] = []
+        scale: list[float] = []
+        scaled: Optional[bool] = None
+        onehot: dict[str, dict[str, int]] = {}
+        hashed: dict[str, tuple[int, int, bool]] = {}
+
+        for name, trans, cols in pre.transformers_:
+            if isinstance(trans, str) and trans == "drop":
+                continue
+            start = pre.output_indices_[name].start
+            cols = list(cols)
+            if _is_passthrough(trans) or type(trans).__name__ == "StandardScaler":
+                is_scaler = not _is_passthrough(trans)
+                if scaled is not None and scaled != is_scaler:
+                    raise ValueError("Mélange passthrough/StandardScaler non supporté")
+                scaled = is_scaler
+                num_cols += cols
+                num_index += list(range(start, start + len(cols)))
+                if is_scaler:
+                    m = trans.mean_ if trans.with_mean else np.zeros(len(cols))
+                    s = trans.scale_ if trans.with_std else np.ones(len(cols))
+                    mean += [float(v) for v in m]
+                    scale += [float(v) for v in s]
+            elif type(trans).__name__ == "OneHotEncoder":
+                if trans.drop is not None or trans.handle_unknown != "ignore":
+                    raise ValueError("OneHotEncoder supporté: drop=None, handle_unknown='ignore'")
+                pos = start
+                for col, cats in zip(cols, trans.categories_):
+                    onehot[col] = {str(c): pos + i for i, c in enumerate(cats)}
+                    pos += len(cats)
+            elif isinstance(trans, HashedCategoricalEncoder):
+                # Un seul hasher pour toutes les colonnes du bloc (même offset)
+                for col in cols:
+                    hashed[col] = (start, int(trans.n_features), bool(trans.alternate_sign))
+            else:
+                raise ValueError(f"Transformer non supporté: {name}={trans!r}")
+
+        return cls(
+            n_features=max(sl.stop for sl in pre.output_indices_.values()),
+            num_cols=num_cols,
+            num_index=num_index,
+            mean=mean if scaled else None,
+            scale=scale if scaled else None,
+            onehot=onehot,
+            hashed=hashed,
+        )
+
+    def encode_one(self, row: Mapping[str, Any]) -> np.ndarray:
+        x = np.zeros(self.n_features)
+        num = np.array([row[c] for c in self.num_cols], dtype=np.float64)
+        if self.mean is not None:
+            num = (num - self.mean) / self.scale
+        x[self.num_index] = num
+        for col, vocab in self.onehot.items():
+            j = vocab.get(str(row[col]))
+            if j is not None:
+                x[j] = 1.0
+        for col, (offset, n, alternate_sign) in self.hashed.items():
+            j, sign = _hash_index(f"{col}={row[col]}", n)
+            x[offset + j] += sign if alternate_sign else 1.0
+        return x
+
+    def encode(self, rows: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        return np.vstack([self.encode_one(r) for r in rows]) if rows else np.zeros((0, self.n_features))
+
+    def encode_frame(self, df: Any) -> np.ndarray:
+        """Version colonne (batch DataFrame): une passe par colonne, pas par ligne."""
+        n = len(df)
+        X = np.zeros((n, self.n_features))
+        num = df[self.num_cols].to_numpy(dtype=np.float64)
+        if self.mean is not None:
+            num = (num - self.mean) / self.scale
+        X[:, self.num_index] = num
+        rows = np.arange(n)
+        for col, vocab in self.onehot.items():
+            j = df[col].astype(str).map(vocab).to_numpy(dtype=np.float64)  # NaN si inconnue
+            known = ~np.isnan(j)
+            X[rows[known], j[known].astype(np.intp)] = 1.0
+        for col, (offset, n_buckets, alternate_sign) in self.hashed.items():
+            values = df[col].astype(str)
+            codes = {v: _hash_index(f"{col}={v}", n_buckets) for v in values.unique()}
+            idx = np.array([codes[v][0] for v in values], dtype=np.intp)
+            sign = np.array([codes[v][1] for v in values]) if alternate_sign else 1.0
+            np.add.at(X, (rows, offset + idx), sign)
+        return X
+
+    def to_dict(self) -> dict:
+        return {
+            "n_features": self.n_features,
+            "num_cols": self.num_cols,
+            "num_index": self.num_index,
+            "mean": self.mean,
+            "scale": self.scale,
+            "onehot": self.onehot,
+            "hashed": {c: list(v) for c, v in self.hashed.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "DenseEncoder":
+        return cls(
+            n_features=d["n_features"],
+            num_cols=d["num_cols"],
+            num_index=d["num_index"],
+            mean=d.get("mean"),
+            scale=d.get("scale"),
+            onehot=d.get("onehot", {}),
+            hashed={c: (int(v[0]), int(v[1]), bool(v[2])) for c, v in d.get("hashed", {}).items()},
+        )
+
+
+@dataclass(frozen=True)
+class LinearScorer:
+    """
+    Pipeline (pre + modèle linéaire) réduit à un produit scalaire.
+    kind="logistic": predict_proba = sigmoid(x·coef + intercept), predict = décision > 0
+    kind="linear"  : predict = x·coef + intercept
+    """
+
+    encoder: DenseEncoder
+    coef: np.ndarray
+    intercept: float
+    kind: str = "logistic"
+
+    @classmethod
+    def from_pipeline(cls, pipe: Any) -> "LinearScorer":
+        pre, model = pipe.steps[0][1], pipe.steps[-1][1]
+        name = type(model).__name__
+        if name == "LogisticRegression":
+            if len(model.classes_) != 2:
+                raise ValueError("LogisticRegression binaire uniquement")
+            kind = "logistic"
+        elif name in ("LinearRegression", "Ridge", "Lasso", "ElasticNet"):
+            kind = "linear"
+        else:
+            raise ValueError(f"Modèle non linéaire: {name}")
+        coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+        intercept = float(np.ravel(model.intercept_)[0])
+        return cls(DenseEncoder.from_column_transformer(pre), coef, intercept, kind)
+
+    def decision_one(self, row: Mapping[str, Any]) -> float:
+        return float(self.encoder.encode_one(row) @ self.coef + self.intercept)
+
+    def decision(self, rows: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        return self.encoder.encode(rows) @ self.coef + self.intercept
+
+    def predict_proba_one(self, row: Mapping[str, Any]) -> float:
+        return float(expit(self.decision_one(row)))
+
+    def predict_proba(self, rows: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        p1 = expit(self.decision(rows))
+        return np.column_stack([1.0 - p1, p1])
+
+    def predict_one(self, row: Mapping[str, Any]) -> Any:
+        z = self.decision_one(row)
+        return int(z > 0) if self.kind == "logistic" else z
+
+    def predict(self, rows: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        z = self.decision(rows)
+        return (z > 0).astype(int) if self.kind == "logistic" else z
+
+    def to_dict(self) -> dict:
+        return {
+            "scorer_version": SCORER_VERSION,
+            "kind": self.kind,
+            "encoder": self.encoder.to_dict(),
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LinearScorer":
+        if d.get("scorer_version") != SCORER_VERSION:
+            raise ValueError(f"scorer_version inattendue: {d.get('scorer_version')}")
+        return cls(
+            DenseEncoder.from_dict(d["encoder"]),
+            np.asarray(d["coef"], dtype=np.float64),
+            float(d["intercept"]),
+            d["kind"],
+        )
+
+    def save(self, path: str | Path) -> None:
+        Path(path).write_text(json.dumps(self.to_dict()), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "LinearScorer":
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def _is_passthrough(trans: Any) -> bool:
+    # Fitté, "passthrough" devient FunctionTransformer(func=None) dans transformers_
+    if isinstance(trans, str):
+        return trans == "passthrough"
+    return type(trans).__name__ == "FunctionTransformer" and trans.func is None
+
+
+def _hash_index(token: str, n_features: int) -> tuple[int, float]:
+    # Même indexation/signe que FeatureHasher (sklearn/feature_extraction/_hashing_fast.pyx)
+    h = murmurhash3_32(token, seed=0)
+    sign = 1.0 if h >= 0 else -1.0
+    if h == -(2**31):
+        return (2**31 - 1 - (n_features - 1)) % n_features, sign
+    return abs(h) % n_features, sign
+
+
+def scorer_path(name: str, version: str) -> Path:
+    return artifact_path(name, version).with_name(SCORER_FILE)
+
+
+def parity_rows(pipe: Any, X: Any, n_rows: int = PARITY_ROWS) -> list[dict]:
+    """Lignes de contrôle: échantillon de X + mêmes lignes avec modalités inconnues."""
+    import pandas as pd
+
+    pre = pipe.steps[0][1]
+    X = X[list(pre.feature_names_in_)]
+    if len(X) > n_rows:
+        X = X.sample(n=n_rows, random_state=42)
+    rows = X.to_dict(orient="records")
+    cats = [c for c in X.columns if not pd.api.types.is_numeric_dtype(X[c])]
+    return rows + [{**r, **{c: UNSEEN for c in cats}} for r in rows[:5]]
+
+
+def parity_diff(pipe: Any, scorer: "LinearScorer", rows: list[dict]) -> dict:
+    """Écart max sklearn vs scorer (proba + prédictions, ou prédiction)."""
+    import pandas as pd
+
+    X = pd.DataFrame(rows)
+    out: dict[str, Any] = {"n_rows": len(rows)}
+    if scorer.kind == "logistic":
+        ref = pipe.predict_proba(X)[:, 1]
+        got = scorer.predict_proba(rows)[:, 1]
+        out["max_abs_diff_proba"] = float(np.max(np.abs(ref - got)))
+        out["predict_mismatches"] = int(np.sum(pipe.predict(X) != scorer.predict(rows)))
+    else:
+        out["max_abs_diff_predict"] = float(np.max(np.abs(pipe.predict(X) - scorer.predict(rows))))
+    return out
+
+
+def parity_ok(report: dict, tol: float = PARITY_TOL) -> bool:
+    diff = report.get("max_abs_diff_proba", report.get("max_abs_diff_predict"))
+    return diff <= tol and not report.get("predict_mismatches", 0)
+
+
+def export_scorer(name: str, version: str, pipe: Any, X: Any) -> Optional[Path]:
+    """
+    Exporte scorer.json dans l'entrée du registre après contrôle de parité
+    avec le pipeline sur X (+ modalités inconnues). None si le modèle n'est
+    pas linéaire ou si la parité échoue (l'API reste alors sur sklearn).
+    """
+    try:
+        scorer = LinearScorer.from_pipeline(pipe)
+    except ValueError as e:
+        print(f"scorer: export ignoré ({e})")
+        return None
+    path = scorer_path(name, version)
+    report = parity_diff(pipe, scorer, parity_rows(pipe, X))
+    if not parity_ok(report):
+        # Pas de scorer divergent servi: un export précédent est retiré aussi
+        path.unlink(missing_ok=True)
+        print(f"scorer: export refusé, parité sklearn KO ({report})")
+        return None
+    scorer.save(path)
+    return path
+
+
+def load_scorer(name: str, version: Optional[str]) -> Optional[LinearScorer]:
+    """Scorer exporté pour cette version du registre (None si absent / fallback legacy)."""
+    if version is None:
+        return None
+    path = scorer_path(name, version)
+    return LinearScorer.load(path) if path.exists() else None
+
+
+def parity_check(pipe: Any, scorer: LinearScorer, rows: list[dict]) -> dict:
+    """Écart max sklearn vs scorer (proba/prédiction) + latence 1 ligne."""
+    import pandas as pd
+
+    out = parity_diff(pipe, scorer, rows)
+    one, one_df = rows[0], pd.DataFrame(rows[:1])
+    method = "predict_proba" if scorer.kind == "logistic" else "predict"
+    n = 500
+    t0 = time.perf_counter()
+    for _ in range(n):
+        getattr(pipe, method)(one_df)
+    out["sklearn_1_row_ms"] = (time.perf_counter() - t0) / n * 1000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        scorer.predict_proba_one(one) if scorer.kind == "logistic" else scorer.predict_one(one)
+    out["scorer_1_row_ms"] = (time.perf_counter() - t0) / n * 1000
+    return out
+
+
+def main() -> None:
+    """
+    python -m src.ml.fast_scorer [churn|revenue]
+    Exporte scorer.json pour la version promue et vérifie la parité avec sklearn
+    (lignes du dataset + villes/plans inconnus).
+    """
+    import pandas as pd
+
+    from src.ml.registry import load_current
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "churn"
+    data_path = {
+        "churn": "data/ml_ready/df_ml_churn_ready.csv",
+        "revenue": "data/ml_ready/df_ml_ready.csv",
+    }[name]
+
+    pipe, version = load_current(name, mmap=False)
+    if version is None:
+        raise FileNotFoundError(f"Aucune version promue pour {name} dans le registre")
+    df = pd.read_csv(data_path)
+    path = export_scorer(name, version, pipe, df)
+    if path is None:
+        return
+    scorer = LinearScorer.load(path)
+    print(f"OUT scorer: {path}")
+
+    # Jeu complet (pas d'échantillon) + latence
+    report = parity_check(pipe, scorer, parity_rows(pipe, df, n_rows=len(df)))
+    print(json.dumps(report, indent=2))
+    if not parity_ok(report):
+        raise AssertionError(f"Parité scorer/sklearn KO: {report}")
+    print("parity OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from src.ml.build_ml_churn_ready import (
+    REPORT_PATH,
+    SUBS_PATH,
+    T,
+    build_churn_snapshots,
+    check_coverage,
+    load_inputs,
+)
+from src.ml.usage_features import (
+    USAGE_PATH,
+    load_usage,
+    usage_feature_names,
+    usage_window_features,
+)
+
+
+# =========================
+# Paths
+# =========================
+STORE_DIR = Path("data/feature_store")
+
+# Incrémenter si la logique de calcul des features change (invalide le cache)
+FEATURES_VERSION = 2
+
+KEY_COLS = ["client_id", "ref_date"]
+TARGET = "churn_7_30j"
+
+
+def _as_of(value: Optional[str | pd.Timestamp]) -> pd.Timestamp:
+    return pd.Timestamp(value if value is not None else T).normalize()
+
+
+class FeatureStore:
+    """
+    Features client point-in-time, clé (client_id, ref_date).
+
+    - materialize(): calcule (une passe vectorisée pour toutes les dates
+      manquantes) puis met en cache un parquet par ref_date sur disque
+    - as_of_join(): jointure point-in-time pour l'entraînement
+    - get_online_features(): lookup unitaire pour le serving (agent/API)
+
+    Le cache est indexé par une empreinte des sources (chemin, taille, mtime)
+    + FEATURES_VERSION: toute modification des CSV invalide les snapshots.
+    """
+
+    def __init__(
+        self,
+        store_dir: Path = STORE_DIR,
+        report_path: str | Path = REPORT_PATH,
+        subs_path: str | Path = SUBS_PATH,
+        usage_path: str | Path = USAGE_PATH,
+    ) -> None:
+        self.store_dir = Path(store_dir)
+        self.report_path = Path(report_path)
+        self.subs_path = Path(subs_path)
+        self.usage_path = Path(usage_path)
+
+    # ---------- cache ----------
+
+    def source_fingerprint(self) -> str:
+        h = hashlib.sha1(f"v{FEATURES_VERSION}".encode())
+        for p in (self.report_path, self.subs_path, self.usage_path):
+            st = os.stat(p)
+            h.update(f"|{p.as_posix()}:{st.st_size}:{st.st_mtime_ns}".encode())
+        return h.hexdigest()[:12]
+
+    def _snapshot_path(self, fingerprint: str, as_of: pd.Timestamp) -> Path:
+        return self.store_dir / fingerprint / f"ref_date={as_of.date()}.parquet"
+
+    def _load_sources(self) -> tuple[pd.DataFrame, pd.DataFrame]:
+        return load_inputs(str(self.report_path), str(self.subs_path))
+
+    def _add_usage_features(
+        self, snapshots: pd.DataFrame, dates: list[pd.Timestamp]
+    ) -> pd.DataFrame:
+        usage = usage_window_features(load_usage(str(self.usage_path)), dates)
+        out = snapshots.merge(usage, on=KEY_COLS, how="left")
+        # Pas d'événement d'usage connu: volumes et tendances à 0
+        no_gap = ["days_since_last_session"] + [
+            c for c in usage_feature_names() if c.startswith("mean_session_gap")
+        ]
+        counts = [c for c in usage_feature_names() if c not in no_gap]
+        out[counts] = out[counts].fillna(0.0)
+        return out
+
+    # ---------- offline ----------
+
+    def materialize(self, as_of_dates: list[str | pd.Timestamp]) -> pd.DataFrame:
+        """
+        Snapshots pour toutes les dates demandées. Les dates absentes du cache
+        sont calculées ensemble (un seul parse des sources) puis écrites.
+        Le label vaut <NA> quand T+HORIZON n'est pas encore observé.
+        """
+        dates = sorted({_as_of(d) for d in as_of_dates})
+        fp = self.source_fingerprint()
+
+        frames: list[pd.DataFrame] = []
+        missing: list[pd.Timestamp] = []
+        for d in dates:
+            p = self._snapshot_path(fp, d)
+            if p.exists():
+                frames.append(pd.read_parquet(p))
+            else:
+                missing.append(d)
+
+        if missing:
+            report, subs = self._load_sources()
+            computed = build_churn_snapshots(
+                report, subs, missing, require_label=False
+            )
+            computed = self._add_usage_features(computed, missing)
+            for d in missing:
+                snap = computed[computed["ref_date"] == d].reset_index(drop=True)
+                p = self._snapshot_path(fp, d)
+                p.parent.mkdir(parents=True, exist_ok=True)
+                tmp = p.with_suffix(".parquet.tmp")
+                snap.to_parquet(tmp, index=False)
+                os.replace(tmp, p)
+                frames.append(snap)
+
+        out = pd.concat(frames, ignore_index=True)
+        return out.sort_values(KEY_COLS[::-1]).reset_index(drop=True)
+
+    def snapshot_path(self, as_of: Optional[str | pd.Timestamp] = None) -> Path:
+        """
+        Parquet du snapshot à as_of (défaut: T), matérialisé si absent: tous
+        les clients avec historique avant as_of, lisible en streaming (batch).
+        """
+        as_of = _as_of(as_of)
+        path = self._snapshot_path(self.source_fingerprint(), as_of)
+        if not path.exists():
+            self.materialize([as_of])
+        return path
+
+    def as_of_join(
+        self, entities: pd.DataFrame, as_of_col: str = "ref_date"
+    ) -> pd.DataFrame:
+        """
+        entities: au minimum client_id + as_of_col.
+        Retourne entities enrichi des features calculées à chaque date
+        (aucune information postérieure à la date de la ligne).
+        """
+        keys = entities[["client_id", as_of_col]].copy()
+        keys[as_of_col] = pd.to_datetime(keys[as_of_col]).dt.normalize()
+        feats = self.materialize(keys[as_of_col].unique().tolist())
+        feats = feats.rename(columns={"ref_date": as_of_col})
+
+        left = entities.copy()
+        left[as_of_col] = keys[as_of_col]
+        left["client_id"] = left["client_id"].astype(str)
+        extra = [
+            c
+            for c in feats.columns
+            if c in left.columns and c not in ("client_id", as_of_col)
+        ]
+        return left.merge(
+            feats.drop(columns=extra), on=["client_id", as_of_col], how="left"
+        )
+
+    def training_frame(
+        self, reference_dates: list[str | pd.Timestamp]
+    ) -> pd.DataFrame:
+        """Snapshots labellisés (contrat df_ml_churn_ready + ref_date)."""
+        dates = sorted({_as_of(d) for d in reference_dates})
+        df = self.materialize(dates)
+        if df[TARGET].isna().any():
+            _, subs = self._load_sources()
+            check_coverage(subs, dates[-1])
+        out = df.dropna(subset=[TARGET]).copy()
+        out[TARGET] = out[TARGET].astype(int)
+        return out.reset_index(drop=True)
+
+    # ---------- online ----------
+
+    def get_online_features(
+        self, client_id: str, as_of: Optional[str | pd.Timestamp] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Features d'un client à `as_of` (défaut: T d'entraînement).
+        None si le client n'a aucun historique de paiement avant as_of.
+        """
+        index = _online_index(self, self.source_fingerprint(), _as_of(as_of))
+        row = index.get((client_id or "").strip())
+        return dict(row) if row is not None else None
+
+
+@lru_cache(maxsize=8)
+def _online_index(
+    store: FeatureStore, fingerprint: str, as_of: pd.Timestamp
+) -> Dict[str, Dict[str, Any]]:
+    # fingerprint fait partie de la clé: un CSV modifié force un rechargement
+    snap = store.materialize([as_of])
+    return {r["client_id"]: r for r in snap.to_dict(orient="records")}
+
+
+_default_store: Optional[FeatureStore] = None
+
+
+def get_store() -> FeatureStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = FeatureStore()
+    return _default_store
+
+
+def get_online_features(
+    client_id: str, as_of: Optional[str | pd.Timestamp] = None
+) -> Optional[Dict[str, Any]]:
+    return get_store().get_online_features(client_id, as_of)
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.ml.fast_scorer import DenseEncoder
+from src.ml.registry import artifact_path, current_version, load_artifact, load_current
+
+
+FOREST_DIR = "forest"  # à côté de model.joblib dans le registre: un .npy par tableau
+FOREST_META = "forest.json"  # encodeur, profondeur, type de modèle
+FOREST_ARRAYS = ("roots", "feature", "threshold", "left", "right", "value")
+FOREST_VERSION = 2  # v2: .npy non compressés mappables (v1: forest.npz)
+
+LEAF = -1  # sklearn: children_left == children_right == -1 sur une feuille
+PARITY_TOL = 1e-9
+
+SUPPORTED = {"RandomForestRegressor": "regressor", "RandomForestClassifier": "classifier"}
+
+
+@dataclass(frozen=True)
+class FlatForest:
+    """
+    RandomForest (régression, ou classification binaire) réduit à des tableaux
+    plats: les noeuds de tous les arbres sont concaténés (ids globaux, roots =
+    premier noeud de chaque arbre). Une feuille boucle sur elle-même (seuil
+    +inf, left = right = elle-même), donc le parcours vectorisé est exactement
+    max_depth pas de take() numpy sur (n_trees x n_rows) noeuds, sans masque
+    ni branche Python. Comme sklearn, X est casté en float32 avant comparaison
+    aux seuils float64. Rechargés en memmap: pages partagées entre process.
+    """
+
+    encoder: DenseEncoder
+    roots: np.ndarray  # int64 (n_trees,)
+    feature: np.ndarray  # int64 (n_nodes,)
+    threshold: np.ndarray  # float64
+    left: np.ndarray  # int64
+    right: np.ndarray  # int64
+    value: np.ndarray  # float64 (n_nodes, k): moyenne des y (k=1) ou proportions par classe
+    max_depth: int
+    kind: str = "regressor"
+    classes: Optional[list] = None
+
+    @classmethod
+    def from_pipeline(cls, pipe: Any) -> "FlatForest":
+        pre, model = pipe.steps[0][1], pipe.steps[-1][1]
+        kind = SUPPORTED.get(type(model).__name__)
+        if kind is None:
+            raise ValueError(f"RandomForest attendu: {type(model).__name__}")
+        if model.n_outputs_ != 1:
+            raise ValueError("Une seule sortie supportée")
+        if kind == "classifier" and len(model.classes_) != 2:
+            raise ValueError("Classification binaire uniquement")
+
+        trees = [est.tree_ for est in model.estimators_]
+        counts = np.array([t.node_count for t in trees])
+        roots = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+
+        feature, threshold, left, right, value = [], [], [], [], []
+        for root, t in zip(roots, trees):
+            ids = root + np.arange(t.node_count)
+            is_leaf = t.children_left == LEAF
+            feature.append(np.where(is_leaf, 0, t.feature))
+            threshold.append(np.where(is_leaf, np.inf, t.threshold))
+            left.append(np.where(is_leaf, ids, root + t.children_left))
+            right.append(np.where(is_leaf, ids, root + t.children_right))
+            v = t.value[:, 0, :]
+            if kind == "classifier":
+                # Tree.predict_proba: proportions normalisées par noeud
+                v = v / np.where(v.sum(axis=1, keepdims=True) > 0, v.sum(axis=1, keepdims=True), 1)
+            value.append(v)
+
+        return cls(
+            encoder=DenseEncoder.from_column_transformer(pre),
+            roots=roots,
+            feature=np.concatenate(feature).astype(np.int64),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            left=np.concatenate(left).astype(np.int64),
+            right=np.concatenate(right).astype(np.int64),
+            value=np.concatenate(value).astype(np.float64),
+            max_depth=int(max(t.max_depth for t in trees)),
+            kind=kind,
+            classes=model.classes_.tolist() if kind == "classifier" else None,
+        )
+
+    @property
+    def n_trees(self) -> int:
+        return int(self.roots.shape[0])
+
+    def _mean_value(self, X: np.ndarray) -> np.ndarray:
+        """(n_rows, k): moyenne sur les arbres de la valeur de la feuille atteinte."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        # (n_trees, n_rows): noeud courant de chaque arbre pour chaque ligne
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        row_base = (np.arange(n_rows) * n_features)[None, :]
+        X_flat = X.ravel()
+
+        for _ in range(self.max_depth):
+            x = X_flat.take(row_base + self.feature.take(node))
+            go_left = x <= self.threshold.take(node)
+            node = np.where(go_left, self.left.take(node), self.right.take(node))
+
+        return self.value[node].mean(axis=0)
+
+    def predict_encoded(self, X: np.ndarray) -> np.ndarray:
+        out = self._mean_value(X)
+        if self.kind == "regressor":
+            return out[:, 0]
+        return np.asarray(self.classes).take(np.argmax(out, axis=1))
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        return self.predict_encoded(self.encoder.encode_frame(X))
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        if self.kind != "classifier":
+            raise AttributeError("predict_proba: forêt de régression")
+        return self._mean_value(self.encoder.encode_frame(X))
+
+    def predict_one(self, row: Mapping[str, Any]) -> Any:
+        out = self.predict_encoded(self.encoder.encode_one(row)[None, :])[0]
+        return out.item() if self.kind == "classifier" else float(out)
+
+    def predict_proba_one(self, row: Mapping[str, Any]) -> float:
+        if self.kind != "classifier":
+            raise AttributeError("predict_proba_one: forêt de régression")
+        return float(self._mean_value(self.encoder.encode_one(row)[None, :])[0, 1])
+
+    def save(self, path: str | Path) -> Path:
+        """Dossier de .npy non compressés (mappables) + forest.json, remplacé atomiquement."""
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for key in FOREST_ARRAYS:
+            np.save(tmp / f"{key}.npy", np.ascontiguousarray(getattr(self, key)))
+        meta = {
+            "forest_version": FOREST_VERSION,
+            "kind": self.kind,
+            "classes": self.classes,
+            "max_depth": self.max_depth,
+            "encoder": self.encoder.to_dict(),
+        }
+        (tmp / FOREST_META).write_text(json.dumps(meta), encoding="utf-8")
+        old = path.with_name(f".{path.name}.old-{os.getpid()}")
+        if path.exists():
+            os.replace(path, old)  # un dossier non vide ne peut pas être écrasé
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> "FlatForest":
+        path = Path(path)
+        meta = json.loads((path / FOREST_META).read_text(encoding="utf-8"))
+        if meta["forest_version"] != FOREST_VERSION:
+            raise ValueError(f"forest_version inattendue: {meta['forest_version']}")
+        # mmap_mode="r": les noeuds restent dans le page cache, partagés entre process
+        arrays = {
+            key: np.load(path / f"{key}.npy", mmap_mode="r" if mmap else None, allow_pickle=False)
+            for key in FOREST_ARRAYS
+        }
+        return cls(
+            encoder=DenseEncoder.from_dict(meta["encoder"]),
+            max_depth=int(meta["max_depth"]),
+            kind=meta["kind"],
+            classes=meta["classes"],
+            **arrays,
+        )
+
+
+def forest_path(name: str, version: str) -> Path:
+    return artifact_path(name, version).with_name(FOREST_DIR)
+
+
+def parity_diff(pipe: Any, forest: FlatForest, X: pd.DataFrame) -> dict:
+    X = X[list(pipe.steps[0][1].feature_names_in_)]
+    if forest.kind == "classifier":
+        diff = np.abs(pipe.predict_proba(X) - forest.predict_proba(X))
+    else:
+        diff = np.abs(pipe.predict(X) - forest.predict(X))
+    out = {"n_rows": int(len(X)), "max_abs_diff": float(diff.max()) if diff.size else 0.0}
+    if forest.kind == "classifier":
+        out["predict_mismatches"] = int(np.sum(pipe.predict(X) != forest.predict(X)))
+    return out
+
+
+def export_forest(
+    name: str, version: str, pipe: Any, X: Optional[pd.DataFrame] = None
+) -> Optional[Path]:
+    """
+    Exporte forest/ dans l'entrée du registre; None si ce n'est pas un RF, ou
+    si la parité avec sklearn sur X échoue (export précédent retiré aussi).
+    """
+    try:
+        forest = FlatForest.from_pipeline(pipe)
+    except ValueError as e:
+        print(f"forest: export ignoré ({e})")
+        return None
+    path = forest_path(name, version)
+    if X is not None:
+        report = parity_diff(pipe, forest, X)
+        if report.get("predict_mismatches", 0) or report["max_abs_diff"] > PARITY_TOL:
+            shutil.rmtree(path, ignore_errors=True)
+            print(f"forest: export refusé, parité sklearn KO ({report})")
+            return None
+    # Ancien format (v1): forest.npz, non mappable
+    path.with_name("forest.npz").unlink(missing_ok=True)
+    return forest.save(path)
+
+
+def load_forest(name: str, version: Optional[str]) -> Optional[FlatForest]:
+    if version is None:
+        return None
+    path = forest_path(name, version)
+    return FlatForest.load(path) if (path / FOREST_META).exists() else None
+
+
+def load_serving(name: str) -> tuple[Any, Optional[str]]:
+    """
+    (modèle, version) de la version promue pour les lecteurs (dashboards,
+    scripts): forêt à tableaux plats si exportée pour cette version, sinon
+    le pipeline sklearn (load_current).
+    """
+    version = current_version(name)
+    forest = load_forest(name, version)
+    if forest is not None:
+        return forest, version
+    return load_current(name)
+
+
+DATASETS = {
+    "churn": "data/ml_ready/df_ml_churn_ready.csv",
+    "revenue": "data/ml_ready/df_ml_ready.csv",
+}
+
+
+def main() -> None:
+    """
+    python -m src.ml.forest_arrays [revenue|churn]
+    Exporte forest/ pour la version promue (si RF), vérifie la parité avec
+    sklearn et compare tailles / temps de chargement / latence.
+    """
+    name = sys.argv[1] if len(sys.argv) > 1 else "revenue"
+    version = current_version(name)
+    if version is None:
+        raise FileNotFoundError(f"Aucune version promue pour {name} dans le registre")
+
+    joblib_path = artifact_path(name, version)
+    t0 = time.perf_counter()
+    pipe = load_artifact(joblib_path, mmap=False)
+    load_joblib_ms = (time.perf_counter() - t0) * 1000
+
+    df = pd.read_csv(DATASETS[name])
+    X = pd.concat([df, df.head(3).assign(ville="__unseen__")], ignore_index=True)
+    X = X[list(pipe.steps[0][1].feature_names_in_)]
+
+    path = export_forest(name, version, pipe, X=X)
+    if path is None:
+        return
+    t0 = time.perf_counter()
+    forest = FlatForest.load(path)
+    load_mmap_ms = (time.perf_counter() - t0) * 1000
+    if not all(isinstance(getattr(forest, k), np.memmap) for k in FOREST_ARRAYS):
+        raise AssertionError("Tableaux de la forêt non mappés")
+
+    def p50_ms(fn, n=50):
+        t = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            fn()
+            t.append(time.perf_counter() - t0)
+        return float(np.median(t) * 1000)
+
+    one = X.iloc[[0]]
+    row = one.iloc[0].to_dict()
+    batch = X.sample(n=1000, replace=True, random_state=42)
+    report = {
+        "kind": forest.kind,
+        "n_trees": forest.n_trees,
+        "max_depth": forest.max_depth,
+        **parity_diff(pipe, forest, X),
+        "size_joblib_bytes": joblib_path.stat().st_size,
+        "size_forest_bytes": sum(f.stat().st_size for f in path.iterdir()),
+        "load_joblib_ms": load_joblib_ms,
+        "load_mmap_ms": load_mmap_ms,
+        "sklearn_1_row_ms": p50_ms(lambda: pipe.predict(one)),
+        "forest_1_row_ms": p50_ms(lambda: forest.predict_one(row)),
+        "sklearn_1k_rows_ms": p50_ms(lambda: pipe.predict(batch), 10),
+        "forest_1k_rows_ms": p50_ms(lambda: forest.predict(batch), 10),
+    }
+    print(f"OUT forest: {path}")
+    print(json.dumps(report, indent=2))
+    if report.get("predict_mismatches", 0) or report["max_abs_diff"] > PARITY_TOL:
+        raise AssertionError(f"Parité forest/sklearn KO: {report}")
+    print("parity OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from scipy import sparse
+
+
+# =========================
+# Paths
+# =========================
+CACHE_DIR = Path("data/ml_ready/cache")
+
+# Incrémenter si le format du cache change
+CACHE_VERSION = 2  # v2: positions des lignes train/test dans le CSV
+
+# Position de la ligne dans le CSV source (posée avant le split, retirée après)
+ROW_COL = "__row__"
+CSV_CHUNK_ROWS = 100_000  # lecture en blocs du CSV source (iter_csv_rows)
+
+
+Split = Callable[[pd.DataFrame], tuple[pd.DataFrame, pd.DataFrame]]
+
+
+@dataclass(frozen=True)
+class EncodedSplit:
+    """
+    Matrices déjà encodées (preprocessor fitté sur le train uniquement).
+    X_* : np.ndarray (memmap en lecture sur cache hit) ou scipy CSR.
+    """
+
+    key: str
+    X_train: Any
+    X_test: Any
+    y_train: np.ndarray
+    y_test: np.ndarray
+    preprocessor: Any
+    meta: dict = field(default_factory=dict)
+    cache_hit: bool = False
+    sample_weight: Optional[np.ndarray] = None  # train échantillonné (src.ml.sampling)
+    test_weight: Optional[np.ndarray] = None  # validation taillée dans un train échantillonné
+    # Positions (0 = 1re ligne de données) des lignes train/test dans le CSV source
+    train_rows: Optional[np.ndarray] = None
+    test_rows: Optional[np.ndarray] = None
+
+
+def file_sha256(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def feature_contract(
+    num_features: list[str], cat_features: list[str], target: str
+) -> dict:
+    return {
+        "num_features": list(num_features),
+        "cat_features": list(cat_features),
+        "target": target,
+    }
+
+
+def cache_key(
+    data_hash: str,
+    contract: dict,
+    preprocessor: Any,
+    split_name: str,
+) -> str:
+    payload = {
+        "cache_version": CACHE_VERSION,
+        "sklearn": sklearn.__version__,
+        "data_hash": data_hash,
+        "contract": contract,
+        "preprocessor": repr(preprocessor),
+        "split": split_name,
+    }
+    blob = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def encode_split(
+    df: pd.DataFrame,
+    *,
+    num_features: list[str],
+    cat_features: list[str],
+    target: str,
+    make_preprocessor: Callable[[], Any],
+    split: Split,
+) -> EncodedSplit:
+    """Split + fit du preprocessor sur le train + encodage train/test (sans cache)."""
+    features = list(num_features) + list(cat_features)
+    train_df, test_df = split(df.assign(**{ROW_COL: np.arange(len(df))}))
+
+    pre = make_preprocessor()
+    X_train = pre.fit_transform(train_df[features])
+    X_test = pre.transform(test_df[features])
+
+    meta = {
+        "n_rows": int(len(df)),
+        "n_train": int(len(train_df)),
+        "n_test": int(len(test_df)),
+        "n_encoded_features": int(X_train.shape[1]),
+        "sparse": bool(sparse.issparse(X_train)),
+    }
+    return EncodedSplit(
+        key="",
+        X_train=X_train,
+        X_test=X_test,
+        y_train=train_df[target].to_numpy(),
+        y_test=test_df[target].to_numpy(),
+        preprocessor=pre,
+        meta=meta,
+        train_rows=train_df[ROW_COL].to_numpy(dtype=np.int64),
+        test_rows=test_df[ROW_COL].to_numpy(dtype=np.int64),
+    )
+
+
+def _save_matrix(path_base: Path, X: Any) -> None:
+    if sparse.issparse(X):
+        sparse.save_npz(path_base.with_suffix(".npz"), sparse.csr_matrix(X))
+    else:
+        np.save(path_base.with_suffix(".npy"), np.ascontiguousarray(X))
+
+
+def _load_matrix(path_base: Path) -> Any:
+    npz = path_base.with_suffix(".npz")
+    if npz.exists():
+        return sparse.load_npz(npz).tocsr()
+    return np.load(path_base.with_suffix(".npy"), mmap_mode="r")
+
+
+def load_entry(key: str, cache_dir: Path = CACHE_DIR) -> EncodedSplit:
+    """Recharge une entrée existante (X en memmap: pages partagées entre process)."""
+    entry = Path(cache_dir) / key
+    meta = json.loads((entry / "meta.json").read_text(encoding="utf-8"))
+    return EncodedSplit(
+        key=key,
+        X_train=_load_matrix(entry / "X_train"),
+        X_test=_load_matrix(entry / "X_test"),
+        y_train=np.load(entry / "y_train.npy", allow_pickle=False),
+        y_test=np.load(entry / "y_test.npy", allow_pickle=False),
+        preprocessor=joblib.load(entry / "preprocessor.joblib"),
+        meta=meta,
+        cache_hit=True,
+        train_rows=np.load(entry / "train_rows.npy", mmap_mode="r"),
+        test_rows=np.load(entry / "test_rows.npy", mmap_mode="r"),
+    )
+
+
+def load_encoded_split(
+    path_in: str | Path,
+    *,
+    num_features: list[str],
+    cat_features: list[str],
+    target: str,
+    make_preprocessor: Callable[[], Any],
+    split: Split,
+    split_name: str,
+    validate: Optional[Callable[[pd.DataFrame], None]] = None,
+    cache_dir: Path = CACHE_DIR,
+) -> EncodedSplit:
+    """
+    Design matrix encodée, mise en cache sur disque.
+
+    Clé = sha256(CSV) + contrat (NUM/CAT/target) + preprocessor + split.
+    - hit : aucun pd.read_csv, aucun fit/transform (X en .npy memmap ou CSR .npz)
+    - miss: read_csv + validate + encode_split, puis écriture atomique du cache
+    """
+    data_hash = file_sha256(path_in)
+    contract = feature_contract(num_features, cat_features, target)
+    key = cache_key(data_hash, contract, make_preprocessor(), split_name)
+    entry = Path(cache_dir) / key
+
+    if (entry / "meta.json").exists():
+        return load_entry(key, cache_dir)
+
+    df = pd.read_csv(path_in)
+    if validate is not None:
+        validate(df)
+
+    enc = encode_split(
+        df,
+        num_features=num_features,
+        cat_features=cat_features,
+        target=target,
+        make_preprocessor=make_preprocessor,
+        split=split,
+    )
+    meta = {
+        **enc.meta,
+        "key": key,
+        "data_hash": data_hash,
+        "source": str(path_in),
+        "split": split_name,
+        **contract,
+    }
+
+    # Écriture dans un dossier temporaire puis rename (pas d'entrée partielle)
+    tmp = Path(cache_dir) / f".{key}.tmp-{os.getpid()}"
+    tmp.mkdir(parents=True, exist_ok=True)
+    _save_matrix(tmp / "X_train", enc.X_train)
+    _save_matrix(tmp / "X_test", enc.X_test)
+    np.save(tmp / "y_train.npy", enc.y_train)
+    np.save(tmp / "y_test.npy", enc.y_test)
+    np.save(tmp / "train_rows.npy", enc.train_rows)
+    np.save(tmp / "test_rows.npy", enc.test_rows)
+    joblib.dump(enc.preprocessor, tmp / "preprocessor.joblib")
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    try:
+        os.replace(tmp, entry)
+    except OSError:
+        # Entrée écrite entre-temps par un autre process: on garde la sienne
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return EncodedSplit(
+        key=key,
+        X_train=enc.X_train,
+        X_test=enc.X_test,
+        y_train=enc.y_train,
+        y_test=enc.y_test,
+        preprocessor=enc.preprocessor,
+        meta=meta,
+        cache_hit=False,
+        train_rows=enc.train_rows,
+        test_rows=enc.test_rows,
+    )
+
+
+# ---------- relecture de lignes du CSV source ----------
+
+
+def read_csv_rows(
+    path_in: str | Path, rows: np.ndarray, usecols: Optional[list[str]] = None
+) -> pd.DataFrame:
+    """
+    Lignes aux positions rows (ordre du fichier) sans matérialiser le CSV:
+    les autres lignes sont sautées au parsing, lecture arrêtée après la dernière.
+    """
+    keep = {int(r) + 1 for r in rows}  # +1: ligne d'en-tête
+    return pd.read_csv(
+        path_in,
+        usecols=usecols,
+        skiprows=lambda i: i > 0 and i not in keep,
+        nrows=len(keep),
+    )
+
+
+def iter_csv_rows(
+    path_in: str | Path,
+    rows: Optional[np.ndarray] = None,
+    usecols: Optional[list[str]] = None,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """CSV lu par blocs (mémoire bornée par chunk_rows); rows: positions à garder (None: toutes)."""
+    mask = None
+    if rows is not None:
+        mask = np.zeros(int(np.max(rows, initial=-1)) + 1, dtype=bool)
+        mask[np.asarray(rows)] = True
+    for chunk in pd.read_csv(path_in, usecols=usecols, chunksize=chunk_rows):
+        if mask is None:
+            yield chunk
+            continue
+        pos = chunk.index.to_numpy()  # RangeIndex continu d'un bloc à l'autre
+        if pos[0] >= len(mask):
+            break  # plus aucune ligne demandée
+        keep = (pos < len(mask)) & mask[np.minimum(pos, len(mask) - 1)]
+        if keep.any():
+            yield chunk[keep]
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource  # Unix uniquement
+except ImportError:  # pragma: no cover
+    resource = None
+
+
+# =========================
+# Paramètres benchmark
+# =========================
+BATCH_ROWS = 1_000
+BENCH_ROWS = 10_000  # lignes lues pour le benchmark (pas de re-parse du CSV complet)
+N_REPEAT_SINGLE = 200
+N_REPEAT_BATCH = 30
+N_WARMUP = 3
+
+R = TypeVar("R")
+
+
+def _maxrss_mb(who: int) -> float:
+    rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss: Ko sous Linux, octets sous macOS
+    return rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def measure_fit(fit: Callable[[], R]) -> tuple[R, dict[str, Any]]:
+    """
+    Exécute fit() en mesurant sa durée (sans instrumentation: tracemalloc
+    ralentit le fit d'un ordre de grandeur) et la mémoire résidente (RSS):
+    allocations natives comprises (arbres sklearn, BLAS), et process enfants
+    terminés (pools des modes search / cv).
+    ru_maxrss est un maximum sur la vie du process: fit_peak_mem_mb = pic
+    atteint à la fin du fit, fit_rss_growth_mb = hausse de ce pic pendant le fit.
+    """
+    before = _maxrss_mb(resource.RUSAGE_SELF) if resource else None
+    t0 = time.perf_counter()
+    result = fit()
+    fit_seconds = time.perf_counter() - t0
+    if resource is None:
+        return result, {"fit_seconds": fit_seconds, "fit_peak_mem_mb": None}
+
+    after = _maxrss_mb(resource.RUSAGE_SELF)
+    return result, {
+        "fit_seconds": fit_seconds,
+        "fit_peak_mem_mb": after,
+        "fit_rss_growth_mb": after - before,
+        "fit_children_peak_mem_mb": _maxrss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def _timings_ms(fn: Callable[[], Any], n_repeat: int) -> np.ndarray:
+    for _ in range(N_WARMUP):
+        fn()
+    out = np.empty(n_repeat)
+    for i in range(n_repeat):
+        t0 = time.perf_counter()
+        fn()
+        out[i] = time.perf_counter() - t0
+    return out * 1000.0
+
+
+def latency_benchmark(
+    model: Any,
+    X: pd.DataFrame,
+    methods: tuple[str, ...] = ("predict",),
+    batch_rows: int = BATCH_ROWS,
+) -> dict[str, float]:
+    """
+    Latence p50/p99 (ms) du pipeline complet (preprocess inclus), sur 1 ligne
+    et sur un batch de batch_rows lignes (tirées avec remise dans X).
+    Clés: <method>_1_p50_ms, <method>_1_p99_ms, <method>_1k_p50_ms, ...
+    """
+    single = X.iloc[[0]]
+    batch = X.sample(n=batch_rows, replace=True, random_state=42)
+    batch_label = f"{batch_rows // 1000}k" if batch_rows % 1000 == 0 else str(batch_rows)
+
+    res: dict[str, float] = {}
+    for method in methods:
+        fn = getattr(model, method)
+        for label, data, n_repeat in (
+            ("1", single, N_REPEAT_SINGLE),
+            (batch_label, batch, N_REPEAT_BATCH),
+        ):
+            t = _timings_ms(lambda: fn(data), n_repeat)
+            res[f"{method}_{label}_p50_ms"] = float(np.percentile(t, 50))
+            res[f"{method}_{label}_p99_ms"] = float(np.percentile(t, 99))
+    return res
+
+
+def model_size_bytes(path: str | Path) -> int:
+    return int(os.path.getsize(path))
+
+
+def append_metrics_row(path: str | Path, row: dict[str, Any]) -> None:
+    """
+    Ajoute une ligne au CSV de métriques. Si les colonnes diffèrent de
+    l'en-tête existant (nouvelles colonnes perf), le fichier est réécrit
+    avec l'union des colonnes (anciennes lignes: valeurs vides).
+    """
+    path = Path(path)
+    new = pd.DataFrame([row])
+    if not path.exists():
+        new.to_csv(path, index=False)
+        return
+
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+    if header == new.columns.tolist():
+        new.to_csv(path, mode="a", header=False, index=False)
+        return
+
+    # Lignes existantes relues telles quelles (pas de re-formatage des floats)
+    old = pd.read_csv(path, dtype=str, keep_default_na=False)
+    cols = header + [c for c in new.columns if c not in header]
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    old = old.reindex(columns=cols, fill_value="")
+    pd.concat([old, new], ignore_index=True)[cols].to_csv(tmp, index=False)
+    os.replace(tmp, path)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import hashlib
+import importlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import get_scorer
+
+from src.ml.matrix_cache import file_sha256
+from src.ml.registry import artifact_path, current_version, list_versions, load_artifact
+
+
+# =========================
+# Paramètres
+# =========================
+N_REPEATS = 10
+RANDOM_STATE = 42
+N_WORKERS = int(os.getenv("PERM_WORKERS", str(max(1, min(4, (os.cpu_count() or 1))))))
+
+# Cache: registry/<name>/<version>/permutation/<sha(data_hash + split)[:16]>.json
+# (version = digest du modèle: clé modèle + clé dataset + clé split)
+PERM_DIR = "permutation"
+
+# Dataset d'évaluation par modèle (colonnes brutes: permutation au niveau du
+# pipeline, indépendante de l'encodage one-hot / hash). Permutation sur le
+# holdout du trainer (pas sur les lignes vues au fit): "split" = fonction de
+# split du module trainer, qui expose aussi SPLIT_NAME.
+DATASETS = {
+    "churn": {
+        "path": "data/ml_ready/df_ml_churn_ready.csv",
+        "target": "churn_7_30j",
+        "scoring": "accuracy",
+        "trainer": "src.ml.train_churn_model",
+        "split": "temporal_split",
+    },
+    "revenue": {
+        "path": "data/ml_ready/df_ml_ready.csv",
+        "target": "ca_total",
+        "scoring": "neg_mean_absolute_error",
+        "trainer": "src.ml.train_rf",
+        "split": "split",
+    },
+}
+
+
+def holdout_split(name: str) -> tuple[Any, str]:
+    """(fonction de split du trainer, SPLIT_NAME); import tardif des trainers."""
+    cfg = DATASETS[name]
+    trainer = importlib.import_module(cfg["trainer"])
+    return getattr(trainer, cfg["split"]), trainer.SPLIT_NAME
+
+
+def permutation_key(data_hash: str, split_name: str) -> str:
+    return hashlib.sha256(f"{data_hash}|{split_name}".encode("utf-8")).hexdigest()[:16]
+
+
+def permutation_path(name: str, version: str, data_hash: str, split_name: str) -> Path:
+    key = permutation_key(data_hash, split_name)
+    return artifact_path(name, version).parent / PERM_DIR / f"{key}.json"
+
+
+# ---------- process pool ----------
+
+_worker_ctx: dict[str, Any] = {}
+
+
+def _init_worker(model_path: str, X: pd.DataFrame, y: np.ndarray, scoring: str) -> None:
+    _worker_ctx.clear()
+    # mmap: les workers partagent les pages de l'artefact
+    _worker_ctx.update(model=load_artifact(model_path), X=X, y=y, scorer=get_scorer(scoring))
+
+
+def _permuted_score(task: tuple[str, np.random.SeedSequence]) -> float:
+    column, seed = task
+    X = _worker_ctx["X"].copy()
+    X[column] = np.random.default_rng(seed).permutation(X[column].to_numpy())
+    return float(_worker_ctx["scorer"](_worker_ctx["model"], X, _worker_ctx["y"]))
+
+
+def compute_permutation_importance(
+    model_path: str | Path,
+    X: pd.DataFrame,
+    y: np.ndarray,
+    scoring: str,
+    n_repeats: int = N_REPEATS,
+    n_workers: int = N_WORKERS,
+    random_state: int = RANDOM_STATE,
+) -> dict[str, Any]:
+    """
+    Importance = score de base - score après permutation d'une colonne.
+    Les n_features x n_repeats permutations sont réparties sur un pool de
+    process; graines dérivées (SeedSequence) par tâche: résultat identique
+    quel que soit le nombre de workers.
+    """
+    columns = list(X.columns)
+    seeds = np.random.SeedSequence(random_state).spawn(len(columns) * n_repeats)
+    tasks = [(c, seeds[i * n_repeats + r]) for i, c in enumerate(columns) for r in range(n_repeats)]
+
+    model = load_artifact(model_path)
+    baseline = float(get_scorer(scoring)(model, X, y))
+
+    n_workers = max(1, min(n_workers, len(tasks)))
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_init_worker,
+        initargs=(str(model_path), X, y, scoring),
+    ) as pool:
+        scores = np.fromiter(
+            pool.map(_permuted_score, tasks, chunksize=max(1, len(tasks) // (4 * n_workers))),
+            dtype=float,
+            count=len(tasks),
+        )
+
+    drops = baseline - scores.reshape(len(columns), n_repeats)
+    order = np.argsort(-drops.mean(axis=1), kind="stable")
+    return {
+        "scoring": scoring,
+        "baseline_score": baseline,
+        "n_repeats": n_repeats,
+        "n_rows": int(len(X)),
+        "n_workers": n_workers,
+        "features": [
+            {
+                "feature": columns[i],
+                "importance": float(drops[i].mean()),
+                "std": float(drops[i].std()),
+            }
+            for i in order
+        ],
+    }
+
+
+# ---------- cache ----------
+
+
+def load_permutation(
+    name: str, version: Optional[str], data_hash: Optional[str] = None
+) -> Optional[dict]:
+    """Résultat en cache (None si jamais calculé pour ce modèle + ce dataset + ce split)."""
+    if version is None:
+        return None
+    data_hash = data_hash or file_sha256(DATASETS[name]["path"])
+    _, split_name = holdout_split(name)
+    path = permutation_path(name, version, data_hash, split_name)
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+
+def permutation_importance_cached(
+    name: str,
+    version: str,
+    n_repeats: int = N_REPEATS,
+    n_workers: int = N_WORKERS,
+    force: bool = False,
+) -> dict[str, Any]:
+    cfg = DATASETS[name]
+    data_hash = file_sha256(cfg["path"])
+    split, split_name = holdout_split(name)
+    path = permutation_path(name, version, data_hash, split_name)
+    if not force and path.exists():
+        cached = json.loads(path.read_text(encoding="utf-8"))
+        if cached.get("n_repeats") == n_repeats:
+            return {**cached, "cache_hit": True}
+
+    model_path = artifact_path(name, version)
+    pipe = load_artifact(model_path)
+    features = list(pipe.steps[0][1].feature_names_in_)
+    _, test_df = split(pd.read_csv(cfg["path"]))
+    result = {
+        "name": name,
+        "version": version,
+        "model": type(pipe.steps[-1][1]).__name__,
+        "data_path": cfg["path"],
+        "data_hash": data_hash,
+        "split": split_name,
+        "subset": "holdout",
+        **compute_permutation_importance(
+            model_path,
+            test_df[features],
+            test_df[cfg["target"]].to_numpy(),
+            cfg["scoring"],
+            n_repeats=n_repeats,
+            n_workers=n_workers,
+        ),
+    }
+
+    path.parent.mkdir(exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    tmp.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+    return {**result, "cache_hit": False}
+
+
+def main() -> None:
+    """
+    python -m src.ml.permutation [revenue|churn] [version|current|all]
+    Calcule (ou relit) la permutation importance des versions du registre.
+    PERM_WORKERS=N pour la taille du pool, FORCE_RETRAIN=1 pour ignorer le cache.
+    """
+    from src.ml.registry import force_retrain
+
+    names = [sys.argv[1]] if len(sys.argv) > 1 else list(DATASETS)
+    which = sys.argv[2] if len(sys.argv) > 2 else "all"
+    for name in names:
+        if which == "all":
+            versions = [m["version"] for m in list_versions(name)]
+        elif which == "current":
+            versions = [v for v in [current_version(name)] if v]
+        else:
+            versions = [which]
+        for version in versions:
+            res = permutation_importance_cached(name, version, force=force_retrain())
+            top = ", ".join(f"{f['feature']}={f['importance']:.4g}" for f in res["features"][:3])
+            print(
+                f"{name}@{version} | cache {'hit' if res['cache_hit'] else 'miss'} | "
+                f"holdout {res['n_rows']} lignes | "
+                f"{res['scoring']} base={res['baseline_score']:.4g} | top: {top}"
+            )
+            print("OUT:", permutation_path(name, version, res["data_hash"], res["split"]))
+
+
+if __name__ == "__main__":
+    main()
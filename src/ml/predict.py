@@ -1,52 +1,288 @@
+from __future__ import annotations
+
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
 import pandas as pd
-import joblib
+
+from src.ml.build_ml_ready import PATH_INFERENCE
+from src.ml.drift import DriftMonitor, live_path, load_reference, log_report
+from src.ml.export_onnx import load_onnx
+from src.ml.forest_arrays import load_forest
+from src.ml.registry import current_version, load_artifact, resolve, resolve_version
 
 
 # =========================
 # Paths
 # =========================
-MODEL_PATH = "src/ml/models/model_current_v1.joblib"
-DATA_PATH = "data/ml_ready/df_ml_ready.csv"
+# auto: forêt à tableaux plats mappés si exportée (RF), sinon sklearn | sklearn | onnx | forest
+MODEL_BACKEND = (os.getenv("MODEL_BACKEND") or "auto").strip().lower()
+SCORES_DIR = Path("data/scores")  # <name>_scores.parquet: client_id, prediction, model_version
 
 
 # =========================
-# Contract (must match build_ml_ready.py output)
+# Paramètres batch
 # =========================
-TARGET = "ca_total"
-NUM_FEATURES = ["nb_paiements", "actions_total", "sessions_total", "anciennete_jours"]
-CAT_FEATURES = ["plan", "ville"]
-ALL_FEATURES = NUM_FEATURES + CAT_FEATURES
+CHUNK_ROWS = int(os.getenv("SCORE_CHUNK_ROWS", "50000"))
+N_WORKERS = int(os.getenv("SCORE_WORKERS", str(max(1, min(4, (os.cpu_count() or 1))))))
+MAX_IN_FLIGHT = 2  # chunks en attente par worker (borne la mémoire du lecteur)
 
+# Date d'observation du scoring churn (défaut: T d'entraînement)
+SCORE_AS_OF = os.getenv("SCORE_AS_OF") or None
 
-def main() -> None:
-    print("IN model:", MODEL_PATH)
-    print("IN data :", DATA_PATH)
 
-    df = pd.read_csv(DATA_PATH)
-    print("shape_in:", df.shape)
-    print("cols_in :", df.columns.tolist())
+# =========================
+# Contract (must match build_ml_ready.py / build_ml_churn_ready.py output)
+# =========================
+ID_COL = "client_id"
+
+# Une base client par modèle: source + features dans l'ordre du contrat.
+# revenue: prediction = ca_total prédit; churn: prediction = P(churn_7_30j = 1)
+# path=None: snapshot du feature store as-of SCORE_AS_OF (cf. source_path)
+SOURCES = {
+    "revenue": {
+        "path": PATH_INFERENCE,  # frame d'inférence (anciennete_jours déjà calculée)
+        "features": [
+            "nb_paiements",
+            "actions_total",
+            "sessions_total",
+            "anciennete_jours",
+            "plan",
+            "ville",
+        ],
+    },
+    "churn": {
+        # Tous les clients avec historique à la date, pas le seul jeu d'entraînement labellisé
+        "path": None,
+        "features": [
+            "paid_count_before_T",
+            "paid_sum_before_T",
+            "days_since_last_paid",
+            "plan",
+            "ville",
+        ],
+    },
+}
+
+
+def scores_path(name: str) -> Path:
+    return SCORES_DIR / f"{name}_scores.parquet"
+
 
-    # Guard: required feature columns
-    missing = sorted(set(ALL_FEATURES) - set(df.columns))
+def source_path(name: str) -> Path:
+    path = SOURCES[name]["path"]
+    if path is not None:
+        return Path(path)
+    from src.ml.feature_store import get_store
+
+    return get_store().snapshot_path(SCORE_AS_OF)
+
+
+def iter_feature_chunks(name: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Chunks (client_id + features du contrat) lus en streaming depuis la source."""
+    src = SOURCES[name]
+    usecols = [ID_COL] + src["features"]
+    path = source_path(name)
+    if not path.exists():
+        raise FileNotFoundError(f"{path} absent (python -m src.pipeline.build_all)")
+
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        # Projection: seules les colonnes du contrat sont décodées, batch par batch
+        pf = pq.ParquetFile(path)
+        missing = sorted(set(usecols) - set(pf.schema_arrow.names))
+        if missing:
+            raise KeyError(f"Colonnes features manquantes dans {path}: {missing}")
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=usecols):
+            yield batch.to_pandas()
+        return
+
+    header = pd.read_csv(path, nrows=0).columns
+    missing = sorted(set(usecols) - set(header))
     if missing:
-        raise KeyError(f"Colonnes features manquantes dans {DATA_PATH}: {missing}")
+        raise KeyError(f"Colonnes features manquantes dans {path}: {missing}")
+    for chunk in pd.read_csv(path, usecols=usecols, dtype={ID_COL: str}, chunksize=chunk_rows):
+        yield chunk[usecols]
+
+
+# ---------- process pool ----------
+
+_worker_ctx: dict[str, Any] = {}
+
 
-    # Build X strictly on contract
-    X = df[ALL_FEATURES].copy()
+def load_model(name: str, version: Optional[str], backend: str = MODEL_BACKEND) -> Any:
+    """Modèle de la version donnée (épinglée pour tout le batch) dans le backend choisi."""
+    if backend == "sklearn":
+        return load_artifact(resolve_version(name, version))
+    if backend == "auto":
+        # RF: noeuds en memmap (forest/), pages partagées entre les workers du pool
+        forest = load_forest(name, version)
+        return forest if forest is not None else load_artifact(resolve_version(name, version))
+    if backend == "onnx":
+        model = load_onnx(name, version)
+        hint = "python -m src.ml.export_onnx"
+    elif backend == "forest":
+        model = load_forest(name, version)
+        hint = "python -m src.ml.forest_arrays"
+    else:
+        raise ValueError(f"MODEL_BACKEND inconnu: {backend} (auto | sklearn | onnx | forest)")
+    if model is None:
+        raise FileNotFoundError(f"Pas d'export {backend} pour {name}@{version} ({hint})")
+    return model
 
-    model = joblib.load(MODEL_PATH)
 
-    pred = model.predict(X)
+def _init_worker(name: str, version: Optional[str], backend: str) -> None:
+    _worker_ctx.clear()
+    _worker_ctx.update(name=name, version=version or "legacy", model=load_model(name, version, backend))
 
-    print("Pred shape:", pred.shape)
-    print("First 5 predictions:", pred[:5])
 
-    # Optional sanity check if target exists (dev-only)
-    if TARGET in df.columns:
-        y = df[TARGET].values
-        print("First 5 actual:", y[:5])
+def _score_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    model = _worker_ctx["model"]
+    X = chunk.drop(columns=[ID_COL])
+    if _worker_ctx["name"] == "churn":
+        prediction = model.predict_proba(X)[:, 1]
     else:
-        print("Note: target non présente dans le dataset (mode prod OK).")
+        prediction = model.predict(X)
+    return pd.DataFrame(
+        {
+            ID_COL: chunk[ID_COL].to_numpy(),
+            "prediction": prediction.astype("float64"),
+            "model_version": _worker_ctx["version"],
+        }
+    )
+
+
+def score_all(
+    name: str,
+    out_path: Optional[Path] = None,
+    chunk_rows: int = CHUNK_ROWS,
+    n_workers: int = N_WORKERS,
+    backend: str = MODEL_BACKEND,
+) -> dict[str, Any]:
+    """
+    Score toute la base client: chunks CSV -> pool de process (modèle chargé
+    une fois par worker, version épinglée) -> un row group parquet par chunk,
+    écrits dans l'ordre. Fichier final remplacé atomiquement.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("pyarrow requis pour écrire les scores (pip install pyarrow)") from e
+
+    version = current_version(name)
+    out_path = Path(out_path or scores_path(name))
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.tmp-{os.getpid()}")
+
+    n_rows = n_chunks = 0
+    writer = None
+    # Drift: histogrammes du batch (population complète), repartis de zéro à chaque run
+    reference = load_reference(name, version)
+    drift = DriftMonitor(reference) if reference is not None else None
+    pending: deque[Future] = deque()
+
+    def drain_one() -> None:
+        nonlocal writer, n_rows, n_chunks
+        table = pa.Table.from_pandas(pending.popleft().result(), preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(tmp, table.schema)
+        writer.write_table(table)
+        n_rows += table.num_rows
+        n_chunks += 1
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers, initializer=_init_worker, initargs=(name, version, backend)
+        ) as pool:
+            # Soumission bornée: le CSV n'est jamais entièrement en mémoire
+            for chunk in iter_feature_chunks(name, chunk_rows):
+                pending.append(pool.submit(_score_chunk, chunk))
+                if drift is not None:
+                    drift.update_frame(chunk)
+                if len(pending) >= n_workers * MAX_IN_FLIGHT:
+                    drain_one()
+            while pending:
+                drain_one()
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    if writer is not None:
+        writer.close()
+
+    if writer is None:
+        raise ValueError(f"Aucune ligne à scorer dans {source_path(name)}")
+    os.replace(tmp, out_path)
+    if drift is not None:
+        drift.save(live_path(name, version, "batch"))
+        log_report(name, version, "batch", drift.report())
+    return {
+        "name": name,
+        "model_version": version or "legacy",
+        "backend": backend,
+        "n_rows": n_rows,
+        "n_chunks": n_chunks,
+        "n_workers": n_workers,
+        "path": str(out_path),
+        "drift": drift.report()["status"] if drift is not None else None,
+    }
+
+
+# ---------- lecture (agent / dashboards) ----------
+
+
+def read_scores(
+    name: str, client_ids: Optional[list[str]] = None, path: Optional[Path] = None
+) -> Optional[pd.DataFrame]:
+    """Table de scores (None si jamais calculée); filtre client_id poussé au lecteur parquet."""
+    path = Path(path or scores_path(name))
+    if not path.exists():
+        return None
+    filters = [(ID_COL, "in", list(client_ids))] if client_ids is not None else None
+    return pd.read_parquet(path, filters=filters)
+
+
+def client_score(name: str, client_id: str) -> Optional[dict[str, Any]]:
+    """
+    Score précalculé d'un client, seulement s'il vient de la version promue
+    (sinon None: l'appelant retombe sur le modèle).
+    """
+    scores = read_scores(name, [client_id])
+    if scores is None or scores.empty:
+        return None
+    row = scores.iloc[0].to_dict()
+    if row["model_version"] != (current_version(name) or "legacy"):
+        return None
+    return row
+
+
+def main() -> None:
+    """
+    python -m src.ml.predict [revenue|churn]
+    Batch nocturne: score tous les clients et écrit data/scores/<name>_scores.parquet.
+    """
+    name = sys.argv[1] if len(sys.argv) > 1 else "revenue"
+    if name not in SOURCES:
+        raise ValueError(f"Modèle inconnu: {name} (choix: {sorted(SOURCES)})")
+
+    print("IN model:", resolve(name))
+    print("IN data :", source_path(name))
+    print(f"backend: {MODEL_BACKEND} | chunk_rows={CHUNK_ROWS} | workers={N_WORKERS}")
+
+    report = score_all(name)
+    print("OUT scores:", report["path"])
+    print(report)
+
+    scores = read_scores(name)
+    print("shape_out:", scores.shape)
+    print(scores.head(5).to_string(index=False))
 
 
 if __name__ == "__main__":
@@ -1,13 +1,20 @@
+import os
 import sys
 import pandas as pd
-import joblib
+
+from src.ml.build_ml_ready import PATH_INFERENCE, REF_DATE_COL, load_inference_frame
+from src.ml.export_onnx import load_onnx
+from src.ml.forest_arrays import load_forest
+from src.ml.registry import load_current, resolve
 
 
 # =========================
 # Paths
 # =========================
-MODEL_PATH = "src/ml/models/model_current_v1.joblib"
-REPORT_PATH = "data/processed/report_oop.csv"
+MODEL_NAME = "revenue"  # registre (fallback: src/ml/models/model_current_v1.joblib)
+# auto: forêt à tableaux plats mappés si exportée (RF), sinon sklearn | sklearn | onnx | forest
+MODEL_BACKEND = (os.getenv("MODEL_BACKEND") or "auto").strip().lower()
+REPORT_PATH = PATH_INFERENCE  # frame d'inférence partagé (build_ml_ready / build_all)
 
 
 # =========================
@@ -24,26 +31,6 @@ FEATURE_COLS = [
 
 TARGET_COL = "ca_total"  # optional for "actual"
 ID_COL = "client_id"
-DATE_COL = "last_activity_date"
-
-
-def add_anciennete_jours(report_df: pd.DataFrame) -> pd.DataFrame:
-    df = report_df.copy()
-
-    # Guard: date column exists
-    if DATE_COL not in df.columns:
-        raise KeyError(f"Colonne manquante dans report: {DATE_COL}")
-
-    df[DATE_COL] = pd.to_datetime(df[DATE_COL], errors="coerce")
-    ref_date = df[DATE_COL].max()
-
-    if pd.isna(ref_date):
-        raise ValueError(
-            f"Impossible de calculer ref_date: toutes les valeurs de {DATE_COL} sont NaT après parsing."
-        )
-
-    df["anciennete_jours"] = (ref_date - df[DATE_COL]).dt.days
-    return df
 
 
 def build_features_for_client(report_df: pd.DataFrame, client_id: str) -> pd.DataFrame:
@@ -68,17 +55,37 @@ def build_features_for_client(report_df: pd.DataFrame, client_id: str) -> pd.Dat
 def main() -> None:
     client_id = sys.argv[1] if len(sys.argv) > 1 else "C008"
 
-    print("IN model :", MODEL_PATH)
+    print("IN model :", resolve(MODEL_NAME))
     print("IN report:", REPORT_PATH)
     print("client_id:", client_id)
 
-    report = pd.read_csv(REPORT_PATH)
+    # Projection + filtre: une seule ligne décodée, anciennete_jours déjà calculée
+    report = load_inference_frame(
+        [ID_COL] + FEATURE_COLS + [TARGET_COL, REF_DATE_COL], client_ids=[client_id]
+    )
     print("shape_report:", report.shape)
     print("cols_report :", report.columns.tolist())
-
-    report = add_anciennete_jours(report)
-
-    model = joblib.load(MODEL_PATH)
+    if not report.empty:
+        print("ref_date    :", report[REF_DATE_COL].iloc[0].date())
+
+    model, version = load_current(MODEL_NAME)
+    print("model version:", version or "legacy")
+    if MODEL_BACKEND == "onnx":
+        model = load_onnx(MODEL_NAME, version)
+        if model is None:
+            raise FileNotFoundError(
+                f"Pas de model.onnx pour {MODEL_NAME}@{version} (python -m src.ml.export_onnx)"
+            )
+        print("backend: onnxruntime")
+    elif MODEL_BACKEND in ("auto", "forest"):
+        forest = load_forest(MODEL_NAME, version)
+        if forest is None and MODEL_BACKEND == "forest":
+            raise FileNotFoundError(
+                f"Pas de forest/ pour {MODEL_NAME}@{version} (python -m src.ml.forest_arrays)"
+            )
+        if forest is not None:
+            model = forest
+            print("backend: forest (numpy, memmap)")
 
     X_one = build_features_for_client(report, client_id)
     print("X_one shape:", X_one.shape)
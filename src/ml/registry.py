@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+import joblib
+import numpy as np
+import sklearn
+
+
+# =========================
+# Paths
+# =========================
+REGISTRY_DIR = Path("src/ml/models/registry")
+
+# Artefacts historiques (fallback si le registre n'a pas encore de version promue)
+LEGACY_PATHS = {
+    "revenue": Path("src/ml/models/model_current_v1.joblib"),
+    "churn": Path("src/ml/models/churn_model_v1.joblib"),
+}
+
+# Layout:
+#   registry/<name>/<version>/model.joblib   (immuable, version = model_digest du modèle)
+#   registry/<name>/<version>/meta.json      (data hash, métriques, contrat)
+#   registry/<name>/current.json             (pointeur, remplacé atomiquement)
+ARTIFACT = "model.joblib"
+META = "meta.json"
+CURRENT = "current.json"
+
+# FORCE_RETRAIN=1: ignore les fingerprints déjà enregistrés
+FORCE_RETRAIN_ENV = "FORCE_RETRAIN"
+
+
+def _write_json_atomic(path: Path, payload: dict) -> None:
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    tmp.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _digest_update(h: Any, obj: Any, stack: tuple[int, ...] = ()) -> None:
+    """Parcours canonique de l'état du modèle (cf. model_digest)."""
+    if id(obj) in stack:
+        h.update(b"<cycle>")
+        return
+    stack = (*stack, id(obj))
+    if isinstance(obj, np.ndarray):
+        h.update(f"ndarray:{obj.dtype.str}:{obj.shape}".encode())
+        if obj.dtype.names:
+            # Structuré (noeuds d'arbres): champ par champ, octets de padding ignorés
+            for field in obj.dtype.names:
+                _digest_update(h, np.asarray(obj[field]), stack)
+        elif obj.dtype.hasobject:
+            _digest_update(h, obj.tolist(), stack)
+        else:
+            h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, np.generic):
+        _digest_update(h, np.asarray(obj), stack)
+    elif obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        h.update(f"{type(obj).__name__}:{obj!r}".encode())
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}:{len(obj)}".encode())
+        for item in obj:
+            _digest_update(h, item, stack)
+    elif isinstance(obj, dict):
+        h.update(f"dict:{len(obj)}".encode())
+        for key in sorted(obj, key=repr):
+            _digest_update(h, key, stack)
+            _digest_update(h, obj[key], stack)
+    elif isinstance(obj, (set, frozenset)):
+        _digest_update(h, sorted(obj, key=repr), stack)
+    elif isinstance(obj, type) or callable(obj) and hasattr(obj, "__qualname__"):
+        h.update(f"ref:{getattr(obj, '__module__', '')}.{obj.__qualname__}".encode())
+    else:
+        cls = type(obj)
+        h.update(f"obj:{cls.__module__}.{cls.__qualname__}".encode())
+        state = obj.__getstate__() if hasattr(obj, "__getstate__") else vars(obj)
+        _digest_update(h, state, stack)
+
+
+def model_digest(model: Any) -> str:
+    """
+    sha256 de l'état du modèle (tableaux fittés via np.ascontiguousarray,
+    paramètres, classes), indépendant du flux pickle: deux fits identiques
+    (memmap du cache ou tableaux en mémoire, preprocessor fitté ou rechargé)
+    donnent la même version.
+    """
+    h = hashlib.sha256()
+    _digest_update(h, model)
+    return h.hexdigest()
+
+
+def training_fingerprint(data_hash: str, contract: dict, params: dict) -> str:
+    """Empreinte d'un entraînement: données + contrat + hyperparamètres (+ sklearn)."""
+    payload = {
+        "sklearn": sklearn.__version__,
+        "data_hash": data_hash,
+        "contract": contract,
+        "params": params,
+    }
+    blob = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def force_retrain() -> bool:
+    return os.getenv(FORCE_RETRAIN_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+def with_model_size(metrics: dict, size_bytes: int) -> dict:
+    """Copie de metrics avec model_size_bytes renseigné (racine et/ou bloc perf)."""
+    metrics = dict(metrics)
+    if "model_size_bytes" in metrics:
+        metrics["model_size_bytes"] = size_bytes
+    if "model_size_bytes" in metrics.get("perf", {}):
+        metrics["perf"] = {**metrics["perf"], "model_size_bytes": size_bytes}
+    return metrics
+
+
+def register(
+    name: str,
+    model: Any,
+    *,
+    metrics: dict,
+    contract: dict,
+    data_hash: Optional[str] = None,
+    params: Optional[dict] = None,
+    fingerprint: Optional[str] = None,
+    promote: bool = True,
+    registry_dir: Path = REGISTRY_DIR,
+) -> str:
+    """
+    Sérialise model, l'enregistre sous registry/<name>/<version>/ et retourne
+    la version (model_digest). Un modèle identique n'est jamais réécrit.
+    """
+    root = Path(registry_dir) / name
+    root.mkdir(parents=True, exist_ok=True)
+
+    tmp = root / f".{ARTIFACT}.tmp-{os.getpid()}"
+    # Non compressé: les tableaux numpy restent mappables (cf. load_artifact)
+    joblib.dump(model, tmp, compress=0)
+    version = model_digest(model)[:16]
+    entry = root / version
+    size_bytes = tmp.stat().st_size
+    metrics = with_model_size(metrics, size_bytes)
+
+    if (entry / META).exists():
+        tmp.unlink()
+        # Même artefact obtenu par un autre entraînement: on rattache son empreinte
+        meta = _read_json(entry / META) or {}
+        if fingerprint and fingerprint not in meta.get("runs", {}):
+            meta["runs"] = {**meta.get("runs", {}), fingerprint: metrics}
+            _write_json_atomic(entry / META, meta)
+    else:
+        entry.mkdir(exist_ok=True)
+        os.replace(tmp, entry / ARTIFACT)
+        meta = {
+            "name": name,
+            "version": version,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "model": type(getattr(model, "steps", [(None, model)])[-1][1]).__name__,
+            "sklearn": sklearn.__version__,
+            "data_hash": data_hash,
+            "contract": contract,
+            "params": params or {},
+            "metrics": metrics,
+            # empreinte d'entraînement -> métriques de ce run (cf. find_by_fingerprint)
+            "runs": {fingerprint: metrics} if fingerprint else {},
+            "size_bytes": size_bytes,
+        }
+        _write_json_atomic(entry / META, meta)
+
+    if promote:
+        promote_version(name, version, registry_dir=registry_dir)
+    return version
+
+
+def promote_version(name: str, version: str, registry_dir: Path = REGISTRY_DIR) -> None:
+    """Bascule atomique du pointeur current (os.replace): lecteurs jamais à moitié."""
+    root = Path(registry_dir) / name
+    path = artifact_path(name, version, registry_dir)
+    if not path.exists():
+        raise FileNotFoundError(f"Version inconnue pour {name}: {version}")
+    _write_json_atomic(
+        root / CURRENT,
+        {
+            "version": version,
+            "path": str(path),
+            "promoted_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+    )
+
+
+def current_version(name: str, registry_dir: Path = REGISTRY_DIR) -> Optional[str]:
+    """Lecture du seul pointeur (quelques octets): sert à détecter un changement de modèle."""
+    pointer = _read_json(Path(registry_dir) / name / CURRENT)
+    return pointer["version"] if pointer else None
+
+
+def version_meta(name: str, version: str, registry_dir: Path = REGISTRY_DIR) -> Optional[dict]:
+    return _read_json(Path(registry_dir) / name / version / META)
+
+
+def list_versions(name: str, registry_dir: Path = REGISTRY_DIR) -> list[dict]:
+    root = Path(registry_dir) / name
+    if not root.exists():
+        return []
+    metas = [_read_json(p / META) for p in root.iterdir() if p.is_dir()]
+    return sorted((m for m in metas if m), key=lambda m: m["created_at"])
+
+
+def artifact_path(name: str, version: str, registry_dir: Path = REGISTRY_DIR) -> Path:
+    return Path(registry_dir) / name / version / ARTIFACT
+
+
+def find_by_fingerprint(
+    name: str, fingerprint: str, registry_dir: Path = REGISTRY_DIR
+) -> Optional[dict]:
+    """
+    Meta de la version la plus récente entraînée avec cette empreinte (sinon
+    None); "metrics" = celles du run correspondant.
+    """
+    for meta in reversed(list_versions(name, registry_dir)):
+        runs = meta.get("runs", {})
+        if fingerprint in runs:
+            return {**meta, "metrics": runs[fingerprint]}
+    return None
+
+
+def _artifact_path(name: str, version: Optional[str], registry_dir: Path) -> Path:
+    if version is not None:
+        return artifact_path(name, version, registry_dir)
+    legacy = LEGACY_PATHS.get(name)
+    if legacy is None or not legacy.exists():
+        raise FileNotFoundError(f"Aucun modèle courant pour {name} (registre: {registry_dir})")
+    return legacy
+
+
+def resolve_version(
+    name: str, version: Optional[str], registry_dir: Path = REGISTRY_DIR
+) -> Path:
+    """Chemin de l'artefact d'une version épinglée; version=None: artefact historique."""
+    return _artifact_path(name, version, registry_dir)
+
+
+def resolve(name: str, registry_dir: Path = REGISTRY_DIR) -> Path:
+    """Chemin de l'artefact courant; fallback sur l'artefact historique."""
+    return _artifact_path(name, current_version(name, registry_dir), registry_dir)
+
+
+def load_artifact(path: str | Path, mmap: bool = True) -> Any:
+    """
+    joblib.load en mmap_mode="r": les gros tableaux numpy (coef_, scaler,
+    matrices) pointent vers les pages du fichier, partagées entre les process
+    qui chargent le même artefact (API, dashboards, agent).
+    Limite: les arbres sklearn (Tree.__setstate__) recopient leurs noeuds en
+    mémoire privée. Pour un RF, les lecteurs servent donc forest/ (tableaux
+    plats en .npy mappés, cf. src.ml.forest_arrays.load_serving).
+    """
+    if mmap:
+        try:
+            return joblib.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            # FS sans mmap / artefact non mappable: lecture classique
+            pass
+    return joblib.load(path)
+
+
+def load_current(
+    name: str, registry_dir: Path = REGISTRY_DIR, mmap: bool = True
+) -> tuple[Any, Optional[str]]:
+    """(modèle, version); version=None si fallback sur l'artefact historique."""
+    version = current_version(name, registry_dir)
+    return load_artifact(_artifact_path(name, version, registry_dir), mmap=mmap), version
+
+
+def main() -> None:
+    """
+    python -m src.ml.registry
+    Deux fits identiques (tableaux en mémoire vs memmap + preprocessor
+    rechargé, comme un cache miss vs un cache hit de matrix_cache) doivent
+    donner la même version; un hyperparamètre différent, une autre version.
+    """
+    import tempfile
+
+    import pandas as pd
+    from sklearn.compose import ColumnTransformer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame(
+        {
+            "x": rng.normal(size=n),
+            "plan": rng.choice(["free", "basic", "pro"], size=n),
+        }
+    )
+    y = (df["x"] + (df["plan"] == "pro") > 0.5).astype(int).to_numpy()
+    pre = ColumnTransformer(
+        [("num", "passthrough", ["x"]), ("cat", OneHotEncoder(handle_unknown="ignore"), ["plan"])],
+        sparse_threshold=0.0,
+    ).fit(df)
+    X = pre.transform(df)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # "Cache hit": X relu en memmap, preprocessor rechargé depuis joblib
+        np.save(tmp / "X.npy", X)
+        joblib.dump(pre, tmp / "pre.joblib")
+        X_mm = np.load(tmp / "X.npy", mmap_mode="r")
+        pre_hit = joblib.load(tmp / "pre.joblib")
+
+        def fit(pre_, X_, C=1.0):
+            return Pipeline([("pre", pre_), ("clf", LogisticRegression(C=C).fit(X_, y))])
+
+        kw = dict(metrics={}, contract={}, promote=False, registry_dir=tmp / "registry")
+        miss = register("check", fit(pre, X), **kw)
+        hit = register("check", fit(pre_hit, X_mm), **kw)
+        other = register("check", fit(pre, X, C=0.1), **kw)
+        print(f"miss={miss} hit={hit} C=0.1 -> {other}")
+        if miss != hit:
+            raise AssertionError("Deux fits identiques enregistrés sous deux versions")
+        if other == miss:
+            raise AssertionError("Modèles différents enregistrés sous la même version")
+    print("registry version check OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+import time
+from typing import Any, Optional
+
+import numpy as np
+from scipy import sparse
+
+from src.ml.matrix_cache import EncodedSplit
+
+
+# =========================
+# Budget d'entraînement
+# =========================
+# 0 = désactivé. Les deux budgets peuvent être combinés (le plus strict gagne).
+MAX_ROWS = int(os.getenv("TRAIN_MAX_ROWS", "0"))
+MAX_MB = float(os.getenv("TRAIN_MAX_MB", "0"))  # taille de X_train échantillonné (Mo)
+RANDOM_STATE = 42
+
+
+def sample_params() -> Optional[dict[str, Any]]:
+    """Paramètres de l'échantillonnage (empreinte d'entraînement); None si désactivé."""
+    if MAX_ROWS <= 0 and MAX_MB <= 0:
+        return None
+    return {"max_rows": MAX_ROWS, "max_mb": MAX_MB, "random_state": RANDOM_STATE}
+
+
+def row_nbytes(X: Any) -> float:
+    """Octets moyens par ligne de la design matrix (dense ou CSR)."""
+    n = max(X.shape[0], 1)
+    if sparse.issparse(X):
+        return (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) / n
+    return float(X.dtype.itemsize * (X.shape[1] if X.ndim > 1 else 1))
+
+
+def budget_rows(X: Any, max_rows: int = MAX_ROWS, max_mb: float = MAX_MB) -> Optional[int]:
+    """Nombre de lignes autorisé par les budgets (None: pas de limite)."""
+    limits = []
+    if max_rows > 0:
+        limits.append(max_rows)
+    if max_mb > 0:
+        limits.append(int(max_mb * 1024**2 // max(row_nbytes(X), 1)))
+    return max(1, min(limits)) if limits else None
+
+
+def class_quotas(counts: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Répartition du budget entre classes: parts égales, plafonnées à la
+    taille de la classe, le reliquat redistribué aux classes restantes.
+    La classe minoritaire est donc gardée en entier tant que possible.
+    """
+    quotas = np.zeros(len(counts), dtype=np.int64)
+    remaining = max(budget, len(counts))  # au moins une ligne par classe
+    order = np.argsort(counts, kind="stable")
+    for i, c in enumerate(order):
+        quotas[c] = min(int(counts[c]), remaining // (len(order) - i))
+        remaining -= quotas[c]
+    return quotas
+
+
+def stratified_sample(
+    y: np.ndarray, budget: int, random_state: int = RANDOM_STATE
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (indices triés, poids) d'un échantillon stratifié par classe.
+    Poids = 1 / probabilité d'inclusion de la classe (n_c / k_c): la somme des
+    poids vaut n et la perte pondérée estime sans biais celle du jeu complet.
+    """
+    y = np.asarray(y)
+    classes, inverse, counts = np.unique(y, return_inverse=True, return_counts=True)
+    quotas = class_quotas(counts, budget)
+    rng = np.random.default_rng(random_state)
+
+    idx = np.concatenate(
+        [
+            rng.choice(np.flatnonzero(inverse == c), size=quotas[c], replace=False)
+            for c in range(len(classes))
+        ]
+    )
+    idx.sort()  # lecture séquentielle du memmap
+    weights = (counts / np.maximum(quotas, 1))[inverse[idx]]
+    return idx, weights
+
+
+def downsample_split(
+    enc: EncodedSplit,
+    max_rows: int = MAX_ROWS,
+    max_mb: float = MAX_MB,
+    random_state: int = RANDOM_STATE,
+) -> EncodedSplit:
+    """
+    Train réduit au budget (le holdout est inchangé). Sans budget, ou si le
+    train tient déjà dans le budget: split retourné tel quel.
+    """
+    budget = budget_rows(enc.X_train, max_rows, max_mb)
+    n = len(enc.y_train)
+    if budget is None or budget >= n:
+        return enc
+
+    t0 = time.perf_counter()
+    idx, weights = stratified_sample(enc.y_train.astype(int), budget, random_state)
+    X_train = enc.X_train[idx]
+    y_train = np.asarray(enc.y_train)[idx]
+    classes, counts = np.unique(enc.y_train.astype(int), return_counts=True)
+    _, kept = np.unique(y_train.astype(int), return_counts=True)
+
+    sample = {
+        "budget_rows": budget,
+        "max_rows": max_rows,
+        "max_mb": max_mb,
+        "n_train_full": n,
+        "n_train_sampled": int(len(idx)),
+        "per_class": {
+            str(c): {"n": int(k), "sampled": int(s), "weight": float(k / max(s, 1))}
+            for c, k, s in zip(classes, counts, kept)
+        },
+        "sample_mb": round(row_nbytes(enc.X_train) * len(idx) / 1024**2, 3),
+        "seconds": time.perf_counter() - t0,
+    }
+    # key="" : les workers de la recherche reçoivent l'échantillon, pas l'entrée du cache complète
+    return dataclasses.replace(
+        enc,
+        key="",
+        X_train=X_train,
+        y_train=y_train,
+        sample_weight=weights,
+        meta={**enc.meta, "sample": sample},
+    )
+
+
+def main() -> None:
+    """
+    python -m src.ml.sampling
+    Jeu synthétique déséquilibré: LogisticRegression sur le jeu complet vs sur
+    un échantillon stratifié (pondéré / non pondéré), évaluée sur le jeu complet;
+    precision mesurée sur l'échantillon avec / sans poids d'inclusion.
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import log_loss
+
+    rng = np.random.default_rng(0)
+    n, budget = 1_000_000, 50_000
+    X = rng.normal(size=(n, 5))
+    logit = -3.5 + X @ np.array([1.0, -0.5, 0.25, 0.0, 0.8])
+    y = (rng.random(n) < 1 / (1 + np.exp(-logit))).astype(int)
+
+    def fit(Xf, yf, w=None):
+        t0 = time.perf_counter()
+        clf = LogisticRegression(max_iter=1000).fit(Xf, yf, sample_weight=w)
+        return clf, time.perf_counter() - t0
+
+    full, t_full = fit(X, y)
+    idx, w = stratified_sample(y, budget)
+    weighted, t_w = fit(X[idx], y[idx], w)
+    unweighted, _ = fit(X[idx], y[idx])
+
+    print(f"n={n} positifs={y.mean():.3%} | échantillon {len(idx)} positifs={y[idx].mean():.1%}")
+    print(f"fit complet {t_full:.2f}s | fit échantillon {t_w:.2f}s")
+    for label, clf in (("complet", full), ("pondéré", weighted), ("non pondéré", unweighted)):
+        p = clf.predict_proba(X)[:, 1]
+        print(
+            f"{label:>12}: intercept={clf.intercept_[0]:+.3f} "
+            f"proba moyenne={p.mean():.4f} log_loss={log_loss(y, p):.4f}"
+        )
+
+    # Pondéré: calibration du jeu complet conservée (le non pondéré surestime)
+    gap = abs(weighted.predict_proba(X)[:, 1].mean() - y.mean())
+    if gap > 0.005 or abs(weighted.intercept_[0] - full.intercept_[0]) > 0.1:
+        raise AssertionError("Échantillon pondéré incohérent avec le fit complet")
+
+    # Métriques de sélection (churn_search) sur l'échantillon: pondérées, celles du jeu complet
+    from src.ml.churn_search import classification_scores
+
+    pred = (weighted.predict_proba(X)[:, 1] >= 0.2).astype(int)
+    ref = classification_scores(y, pred)
+    raw = classification_scores(y[idx], pred[idx])
+    rew = classification_scores(y[idx], pred[idx], sample_weight=w)
+    print(
+        f"precision complet={ref['precision']:.3f} | échantillon brut={raw['precision']:.3f} "
+        f"| pondéré={rew['precision']:.3f}"
+    )
+    if abs(rew["precision"] - ref["precision"]) > 0.03:
+        raise AssertionError("Precision pondérée de l'échantillon incohérente avec le jeu complet")
+    print("sampling check OK")
+
+
+if __name__ == "__main__":
+    main()
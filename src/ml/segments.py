@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from src.ml.churn_search import classification_scores
+from src.ml.encoders import categorical_transformers
+from src.ml.fast_scorer import LinearScorer
+from src.ml.matrix_cache import feature_contract
+from src.ml.registry import (
+    artifact_path,
+    current_version,
+    force_retrain,
+    load_artifact,
+    register,
+    training_fingerprint,
+    version_meta,
+)
+
+
+# =========================
+# Paramètres
+# =========================
+MODEL_NAME = "churn_segments"  # registre: src/ml/models/registry/churn_segments/
+SEGMENT_COL = os.getenv("SEGMENT_COL", "plan")  # un modèle par valeur de cette colonne
+GLOBAL = "__global__"  # modèle sur tout le train: segments inconnus / mono-classe
+N_WORKERS = int(os.getenv("SEG_WORKERS", str(max(1, min(4, (os.cpu_count() or 1))))))
+
+
+@dataclass
+class SegmentRouter:
+    """
+    Un modèle par segment, routé sur la valeur de `column` (fallback: modèle
+    global). Même interface que le pipeline pour le batch (predict_proba /
+    predict sur DataFrame) et que LinearScorer pour une ligne (*_one).
+    """
+
+    column: str
+    models: dict[str, Any]
+    fallback: Any
+    segments: dict[str, dict] = field(default_factory=dict)  # infos d'entraînement
+
+    def model_for(self, value: Any) -> Any:
+        return self.models.get(str(value), self.fallback)
+
+    def segment_for(self, value: Any) -> str:
+        return str(value) if str(value) in self.models else GLOBAL
+
+    @property
+    def classes_(self) -> np.ndarray:
+        return self.fallback.classes_
+
+    def _route(self, X: pd.DataFrame, method: str) -> np.ndarray:
+        # Un appel par segment présent dans le batch (pas par ligne)
+        keys = X[self.column].astype(str).to_numpy()
+        out: Optional[np.ndarray] = None
+        for key in np.unique(keys):
+            mask = keys == key
+            model = self.model_for(key)
+            cols = list(model.steps[0][1].feature_names_in_)
+            res = np.asarray(getattr(model, method)(X.loc[mask, cols]))
+            if out is None:
+                out = np.empty((len(X), *res.shape[1:]), dtype=res.dtype)
+            out[mask] = res
+        return out if out is not None else np.empty((0,))
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        return self._route(X, "predict_proba")
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        return self._route(X, "predict")
+
+    def predict_proba_one(self, row: Mapping[str, Any]) -> float:
+        return self.model_for(row[self.column]).predict_proba_one(row)
+
+    def predict_one(self, row: Mapping[str, Any]) -> Any:
+        return self.model_for(row[self.column]).predict_one(row)
+
+    def to_scorers(self) -> Optional["SegmentRouter"]:
+        """Même routage sur des LinearScorer (API); None si un modèle n'est pas linéaire."""
+        try:
+            return SegmentRouter(
+                self.column,
+                {k: LinearScorer.from_pipeline(m) for k, m in self.models.items()},
+                LinearScorer.from_pipeline(self.fallback),
+                self.segments,
+            )
+        except ValueError:
+            return None
+
+
+# ---------- entraînement par segment ----------
+
+
+def make_segment_pre(num_cols: list[str], cat_cols: list[str]) -> ColumnTransformer:
+    return ColumnTransformer(
+        transformers=[
+            ("num", "passthrough", num_cols),
+            *categorical_transformers(cat_cols),
+        ]
+    )
+
+
+def segment_params(segment: str, num_cols: list[str], cat_cols: list[str]) -> dict[str, Any]:
+    return {
+        "segment_col": SEGMENT_COL,
+        "segment": segment,
+        "preprocess": repr(make_segment_pre(num_cols, cat_cols)),
+        "estimator": LogisticRegression(max_iter=1000).get_params(),
+    }
+
+
+def frame_sha256(df: pd.DataFrame) -> str:
+    rows = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha256(rows.tobytes()).hexdigest()
+
+
+def _fit_segment(task: dict[str, Any]) -> dict[str, Any]:
+    """Worker: fit d'un segment (sous-frame du train transmise avec la tâche)."""
+    df, target = task["df"], task["target"]
+    y = df[target].astype(int).to_numpy()
+    if len(np.unique(y)) < 2:
+        return {"segment": task["segment"], "model": None, "status": "fallback: une seule classe"}
+    pipe = Pipeline(
+        steps=[
+            ("pre", make_segment_pre(task["num_cols"], task["cat_cols"])),
+            ("clf", LogisticRegression(max_iter=1000)),
+        ]
+    )
+    pipe.fit(df[task["num_cols"] + task["cat_cols"]], y)
+    return {"segment": task["segment"], "model": pipe, "status": "fitted"}
+
+
+def previous_models() -> tuple[Optional[SegmentRouter], dict[str, dict]]:
+    """Routeur promu + infos par segment (empreintes) pour réutiliser les segments inchangés."""
+    version = current_version(MODEL_NAME)
+    if version is None:
+        return None, {}
+    meta = version_meta(MODEL_NAME, version) or {}
+    router = load_artifact(artifact_path(MODEL_NAME, version), mmap=False)
+    return router, meta.get("params", {}).get("segments", {})
+
+
+def segment_frames(
+    train: pd.DataFrame, num_cols: list[str], cat_cols: list[str], target: str
+) -> dict[str, dict[str, Any]]:
+    """Train de chaque segment (+ global) et son empreinte, calculés sans fit."""
+    seg_cat = [c for c in cat_cols if c != SEGMENT_COL]  # constante dans un segment
+    contract = feature_contract(num_cols, cat_cols, target)
+    keys = train[SEGMENT_COL].astype(str)
+    frames = {}
+    for segment in [*sorted(keys.unique()), GLOBAL]:
+        cats = cat_cols if segment == GLOBAL else seg_cat
+        df = train if segment == GLOBAL else train[keys == segment]
+        df = df[num_cols + cats + [target]]
+        frames[segment] = {
+            "df": df,
+            "cat_cols": cats,
+            "fingerprint": training_fingerprint(
+                frame_sha256(df), contract, segment_params(segment, num_cols, cats)
+            ),
+        }
+    return frames
+
+
+def train_segments(
+    frames: dict[str, dict[str, Any]],
+    num_cols: list[str],
+    target: str,
+    n_workers: int = N_WORKERS,
+) -> tuple[SegmentRouter, dict[str, str]]:
+    """
+    Fit parallèle (un process par segment + le modèle global). Un segment dont
+    les données d'entraînement n'ont pas changé (empreinte identique au routeur
+    promu) n'est pas réentraîné: son modèle est repris tel quel.
+    Retourne (routeur, statut par segment: fitted | reused | fallback: ...).
+    """
+    prev, prev_info = (None, {}) if force_retrain() else previous_models()
+
+    tasks, info, status, fitted = [], {}, {}, {}
+    for segment, frame in frames.items():
+        info[segment] = {"fingerprint": frame["fingerprint"], "n_train": int(len(frame["df"]))}
+        old = prev_info.get(segment, {})
+        if prev is not None and old.get("fingerprint") == frame["fingerprint"]:
+            model = prev.fallback if segment == GLOBAL else prev.models.get(segment)
+            fitted[segment] = model
+            status[segment] = "reused" if model is not None else old.get("status", "reused")
+            continue
+        tasks.append(
+            {
+                "segment": segment,
+                "df": frame["df"],
+                "num_cols": num_cols,
+                "cat_cols": frame["cat_cols"],
+                "target": target,
+            }
+        )
+
+    if tasks:
+        n_workers = max(1, min(n_workers, len(tasks)))
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            for res in pool.map(_fit_segment, tasks):
+                fitted[res["segment"]], status[res["segment"]] = res["model"], res["status"]
+
+    fallback = fitted.pop(GLOBAL)
+    if fallback is None:
+        raise ValueError("Modèle global impossible: le train ne contient qu'une classe")
+    models = {k: m for k, m in fitted.items() if m is not None}
+    return SegmentRouter(SEGMENT_COL, models, fallback, info), status
+
+
+def main() -> None:
+    """
+    python -m src.ml.segments
+    Un modèle churn par SEGMENT_COL (défaut: plan), entraînés en parallèle
+    (SEG_WORKERS), regroupés dans un SegmentRouter enregistré sous
+    churn_segments. Évaluation sur le holdout temporel vs le modèle global.
+    FORCE_RETRAIN=1 pour réentraîner aussi les segments inchangés.
+    """
+    from src.ml.drift import export_reference
+    from src.ml.matrix_cache import file_sha256
+    from src.ml.perf import latency_benchmark
+    from src.ml.registry import FORCE_RETRAIN_ENV, find_by_fingerprint, promote_version
+    from src.ml.train_churn_model import (
+        CAT_COLS,
+        NUM_COLS,
+        PATH_IN,
+        SPLIT_NAME,
+        TARGET,
+        load_dataset,
+        temporal_split,
+        validate,
+    )
+
+    if SEGMENT_COL not in CAT_COLS:
+        raise ValueError(f"SEGMENT_COL inconnue: {SEGMENT_COL} (attendu: {CAT_COLS})")
+    df = load_dataset()
+    validate(df)
+    train, test = temporal_split(df)
+    features = NUM_COLS + CAT_COLS
+
+    # Empreinte globale = empreintes des segments: skip si rien n'a changé
+    frames = segment_frames(train, NUM_COLS, CAT_COLS, TARGET)
+    contract = feature_contract(NUM_COLS, CAT_COLS, TARGET)
+    data_hash = file_sha256(PATH_IN) if os.path.exists(PATH_IN) else frame_sha256(df)
+    fingerprint = training_fingerprint(
+        data_hash,
+        contract,
+        {
+            "segment_col": SEGMENT_COL,
+            "split": SPLIT_NAME,
+            "segments": {k: f["fingerprint"] for k, f in frames.items()},
+        },
+    )
+    prev = None if force_retrain() else find_by_fingerprint(MODEL_NAME, fingerprint)
+    if prev is not None:
+        promote_version(MODEL_NAME, prev["version"])
+        print(
+            f"skip fit: fingerprint {fingerprint} déjà entraîné -> {MODEL_NAME}@{prev['version']} "
+            f"({FORCE_RETRAIN_ENV}=1 pour forcer)"
+        )
+        return
+
+    router, status = train_segments(frames, NUM_COLS, TARGET)
+
+    X_test, y_test = test[features], test[TARGET].astype(int).to_numpy()
+    y_router = router.predict(X_test)
+    y_global = router.fallback.predict(X_test)
+    test_keys = X_test[SEGMENT_COL].astype(str).to_numpy()
+    per_segment = {}
+    for segment, seg in router.segments.items():
+        model = router.fallback if segment == GLOBAL else router.models.get(segment)
+        per_segment[segment] = {
+            **seg,
+            "status": status[segment],
+            "n_test": int(np.sum(test_keys == segment)) if segment != GLOBAL else int(len(test)),
+            "n_coef": int(model.steps[-1][1].coef_.size) if model is not None else None,
+            "size_bytes": len(pickle.dumps(model)) if model is not None else None,
+        }
+        print(f"  {segment:>10} | {status[segment]} | n_train={seg['n_train']}")
+
+    metrics = {
+        "segment_col": SEGMENT_COL,
+        "n_train": int(len(train)),
+        "n_test": int(len(test)),
+        "target": TARGET,
+        "routed": classification_scores(y_test, y_router),
+        "global": classification_scores(y_test, y_global),
+        "segments": per_segment,
+        "perf": {
+            "routed": latency_benchmark(router, X_test, methods=("predict_proba",)),
+            "global": latency_benchmark(router.fallback, X_test, methods=("predict_proba",)),
+        },
+    }
+
+    version = register(
+        MODEL_NAME,
+        router,
+        metrics=metrics,
+        contract=contract,
+        data_hash=data_hash,
+        params={
+            "segment_col": SEGMENT_COL,
+            "split": SPLIT_NAME,
+            "segments": {
+                k: {"fingerprint": v["fingerprint"], "status": status[k]}
+                for k, v in router.segments.items()
+            },
+        },
+        fingerprint=fingerprint,
+    )
+    print("OUT drift reference:", export_reference(MODEL_NAME, version, train))
+    print(f"Model saved   : {MODEL_NAME}@{version} ({artifact_path(MODEL_NAME, version)})")
+    print(json.dumps({k: metrics[k] for k in ("routed", "global")}, indent=2))
+
+
+if __name__ == "__main__":
+    # Import du module: le routeur est picklé sous src.ml.segments (pas __main__)
+    from src.ml import segments
+
+    segments.main()
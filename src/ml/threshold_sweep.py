@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+
+# =========================
+# Paths
+# =========================
+METRICS_DIR = Path("data/ml_ready")
+CURVE_OUT = METRICS_DIR / "churn_threshold_curve_v1.json"  # à côté de churn_metrics_v1.json
+
+# Seuil recommandé "rappel minimal" (en plus du max F1)
+TARGET_RECALL = 0.8
+
+# Seuil de décision du booléen churn (proba >= seuil), partagé API / agent.
+# Absent: seuil par défaut du modèle (LogisticRegression.predict: proba > 0.5).
+# "curve": seuil max F1 de la courbe, si elle a été calculée pour la version servie.
+CHURN_THRESHOLD = (os.getenv("CHURN_THRESHOLD") or "").strip().lower()
+DEFAULT_THRESHOLD = 0.5
+
+
+def threshold_curve(y_true: np.ndarray, proba: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Precision / recall / F1 / nombre d'actions pour tous les seuils distincts
+    (positif si proba >= seuil), en un tri + sommes cumulées: O(n log n)
+    au lieu d'un precision_score par seuil.
+    """
+    y_true = np.asarray(y_true, dtype=np.int64)
+    proba = np.asarray(proba, dtype=float)
+    order = np.argsort(-proba, kind="stable")
+    p, y = proba[order], y_true[order]
+
+    tp = np.cumsum(y)
+    fp = np.cumsum(1 - y)
+    # Dernière position de chaque probabilité distincte (ex-aequo = même décision)
+    last = np.r_[np.flatnonzero(np.diff(p)), len(p) - 1]
+    tp, fp = tp[last], fp[last]
+
+    n_pos = int(y.sum())
+    n_actions = tp + fp
+    precision = tp / n_actions
+    recall = tp / n_pos if n_pos else np.zeros_like(precision)
+    denom = precision + recall
+    f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(denom), where=denom > 0)
+    return {
+        "threshold": p[last],
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "n_actions": n_actions,
+        "tp": tp,
+        "fp": fp,
+    }
+
+
+def portfolio_actions(thresholds: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Clients à contacter sur tout le portefeuille pour chaque seuil (tri + searchsorted)."""
+    s = np.sort(np.asarray(scores, dtype=float))
+    return len(s) - np.searchsorted(s, thresholds, side="left")
+
+
+def recommended_thresholds(curve: dict[str, np.ndarray], target_recall: float = TARGET_RECALL) -> dict:
+    if not curve["tp"][-1]:
+        # Aucun positif dans le holdout: pas de seuil défendable
+        return {"max_f1": None, "max_f1_value": None, f"recall_{target_recall:g}": None}
+    best = int(np.argmax(curve["f1"]))
+    ok = np.flatnonzero(curve["recall"] >= target_recall)
+    # Rappel cible atteint au seuil le plus haut possible (moins d'actions)
+    at_recall = int(ok[0]) if len(ok) else None
+    return {
+        "max_f1": float(curve["threshold"][best]),
+        "max_f1_value": float(curve["f1"][best]),
+        f"recall_{target_recall:g}": (
+            float(curve["threshold"][at_recall]) if at_recall is not None else None
+        ),
+    }
+
+
+def build_curve_artifact(
+    y_true: np.ndarray,
+    proba: np.ndarray,
+    model_version: Optional[str],
+    portfolio_scores: Optional[np.ndarray] = None,
+) -> dict[str, Any]:
+    curve = threshold_curve(y_true, proba)
+    out: dict[str, Any] = {
+        "model_version": model_version,
+        "n_test": int(len(proba)),
+        "n_pos": int(np.sum(y_true)),
+        "rule": "churn si proba >= threshold",
+        "recommended": recommended_thresholds(curve),
+        "curve": {k: v.tolist() for k, v in curve.items()},
+    }
+    if portfolio_scores is not None:
+        out["n_portfolio"] = int(len(portfolio_scores))
+        out["curve"]["portfolio_actions"] = portfolio_actions(
+            curve["threshold"], portfolio_scores
+        ).tolist()
+    return out
+
+
+def write_curve(artifact: dict, path: Path = CURVE_OUT) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    tmp.write_text(json.dumps(artifact, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+def load_curve(path: Path = CURVE_OUT) -> Optional[dict]:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def resolve_threshold(version: Optional[str], spec: str = CHURN_THRESHOLD) -> Optional[float]:
+    """Seuil de décision pour une version (None: seuil par défaut du modèle)."""
+    if not spec:
+        return None
+    if spec != "curve":
+        return float(spec)
+    # Courbe calculée pour cette version uniquement (sinon seuil par défaut du modèle)
+    curve = load_curve()
+    if curve is None or curve.get("model_version") != version:
+        return None
+    return curve["recommended"].get("max_f1")
+
+
+def is_churn(proba: float, threshold: Optional[float]) -> bool:
+    """Décision churn: proba >= seuil résolu, sinon règle de predict (proba > 0.5)."""
+    if threshold is None:
+        return bool(proba > DEFAULT_THRESHOLD)
+    return bool(proba >= threshold)
+
+
+def main() -> None:
+    """
+    python -m src.ml.threshold_sweep
+    Recalcule la courbe pour la version promue (holdout du split temporel,
+    scores batch pour le portefeuille si présents) et vérifie la parité avec
+    sklearn.metrics.precision_recall_curve.
+    """
+    import pandas as pd
+    from sklearn.metrics import precision_recall_curve
+
+    from src.ml.predict import read_scores
+    from src.ml.registry import load_current
+    from src.ml.train_churn_model import MODEL_NAME, TARGET, load_dataset, temporal_split
+
+    pipe, version = load_current(MODEL_NAME)
+    _, test = temporal_split(load_dataset())
+    y = test[TARGET].astype(int).to_numpy()
+    proba = pipe.predict_proba(test[list(pipe.steps[0][1].feature_names_in_)])[:, 1]
+
+    scores = read_scores(MODEL_NAME)
+    portfolio = None
+    if scores is not None and (scores["model_version"] == (version or "legacy")).all():
+        portfolio = scores["prediction"].to_numpy()
+    artifact = build_curve_artifact(y, proba, version, portfolio)
+
+    if artifact["n_pos"]:
+        ref_p, ref_r, ref_t = precision_recall_curve(y, proba)
+        mine = pd.DataFrame(artifact["curve"]).set_index("threshold")
+        ref = pd.DataFrame({"precision": ref_p[:-1], "recall": ref_r[:-1]}, index=ref_t)
+        common = ref.index.intersection(mine.index)
+        diff = float(np.max(np.abs(mine.loc[common, ["precision", "recall"]] - ref.loc[common])))
+        print(f"parité precision_recall_curve: {len(common)} seuils, max diff={diff:.3g}")
+        if diff > 1e-12:
+            raise AssertionError("Courbe incohérente avec sklearn")
+
+    print("OUT:", write_curve(artifact))
+    summary = {k: artifact[k] for k in ("model_version", "n_test", "n_pos", "recommended")}
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 from pathlib import Path
 
-import joblib
 import numpy as np
 import pandas as pd
 from sklearn.compose import ColumnTransformer
@@ -8,15 +7,32 @@ from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import StandardScaler
+
+from src.ml.encoders import categorical_transformers
+from src.ml.matrix_cache import feature_contract, file_sha256, load_encoded_split
+from src.ml.perf import (
+    BENCH_ROWS,
+    append_metrics_row,
+    latency_benchmark,
+    measure_fit,
+    model_size_bytes,
+)
+from src.ml.registry import (
+    FORCE_RETRAIN_ENV,
+    artifact_path,
+    find_by_fingerprint,
+    force_retrain,
+    register,
+    training_fingerprint,
+)
 
 
 # =========================
 # Paths
 # =========================
 PATH_IN = "data/ml_ready/df_ml_ready.csv"
-MODELS_DIR = Path("src/ml/models")
-PATH_MODEL_BASELINE = MODELS_DIR / "model_baseline_v1.joblib"
+MODEL_NAME = "revenue"  # registre: src/ml/models/registry/revenue/
 
 METRICS_DIR = Path("data/ml_ready")
 PATH_METRICS = METRICS_DIR / "metrics_v1.csv"
@@ -31,13 +47,7 @@ CAT_FEATURES = ["plan", "ville"]
 ALL_FEATURES = NUM_FEATURES + CAT_FEATURES
 
 
-def main() -> None:
-    # --- Read ---
-    print("IN :", PATH_IN)
-    df = pd.read_csv(PATH_IN)
-    print("shape_in :", df.shape)
-    print("cols_in  :", df.columns.tolist())
-
+def validate(df: pd.DataFrame) -> None:
     # --- Guards ---
     required = set(ALL_FEATURES + [TARGET])
     missing = sorted(required - set(df.columns))
@@ -46,40 +56,97 @@ def main() -> None:
     if df.empty:
         raise ValueError(f"Dataset vide: {PATH_IN}")
 
-    # --- X / y (strict contract) ---
-    X = df[ALL_FEATURES].copy()
-    y = df[TARGET].copy()
-
-    # --- Split ---
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
-    print("X_train:", X_train.shape)
-    print("X_test :", X_test.shape)
-    print("y_train:", y_train.shape)
-    print("y_test :", y_test.shape)
 
-    # --- Preprocess ---
-    preprocess = ColumnTransformer(
+def make_preprocess() -> ColumnTransformer:
+    return ColumnTransformer(
         transformers=[
             ("num", StandardScaler(), NUM_FEATURES),
-            ("cat", OneHotEncoder(handle_unknown="ignore"), CAT_FEATURES),
+            *categorical_transformers(CAT_FEATURES),
         ],
         remainder="drop",
     )
 
-    # --- Model + pipeline ---
+
+def split(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
+    return train_df, test_df
+
+
+SPLIT_NAME = "train_test_split(test_size=0.2, random_state=42)"
+
+
+def fit_params(model) -> dict:
+    # Hyperparamètres + preprocess + split: tout ce qui change l'artefact à données égales
+    return {
+        "estimator": type(model).__name__,
+        **model.get_params(),
+        "preprocess": repr(make_preprocess()),
+        "split": SPLIT_NAME,
+    }
+
+
+def reuse_if_unchanged(fingerprint: str) -> bool:
+    """Empreinte déjà dans le registre: pas de fit, artefact et métriques réutilisés."""
+    prev = None if force_retrain() else find_by_fingerprint(MODEL_NAME, fingerprint)
+    if prev is None:
+        return False
+    # Baseline: jamais promue (current = RF)
+    print(
+        f"skip fit: fingerprint {fingerprint} déjà entraîné -> {MODEL_NAME}@{prev['version']} "
+        f"({FORCE_RETRAIN_ENV}=1 pour forcer)"
+    )
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    row = {
+        **prev["metrics"],
+        "model_size_bytes": prev["size_bytes"],
+        "model_version": prev["version"],
+    }
+    append_metrics_row(PATH_METRICS, row)
+    print("OUT metrics:", str(PATH_METRICS))
+    return True
+
+
+def main() -> None:
     model = LinearRegression()
+    contract = feature_contract(NUM_FEATURES, CAT_FEATURES, TARGET)
+    params = fit_params(model)
+
+    # --- Skip si données + contrat + hyperparamètres inchangés ---
+    print("IN :", PATH_IN)
+    data_hash = file_sha256(PATH_IN)
+    fingerprint = training_fingerprint(data_hash, contract, params)
+    if reuse_if_unchanged(fingerprint):
+        return
+
+    # --- Read + split + preprocess (cache binaire si dataset/contrat inchangés) ---
+    enc = load_encoded_split(
+        PATH_IN,
+        num_features=NUM_FEATURES,
+        cat_features=CAT_FEATURES,
+        target=TARGET,
+        make_preprocessor=make_preprocess,
+        split=split,
+        split_name=SPLIT_NAME,
+        validate=validate,
+    )
+    print(f"cache {'hit' if enc.cache_hit else 'miss'}: {enc.key}")
+    X_train, X_test, y_train, y_test = enc.X_train, enc.X_test, enc.y_train, enc.y_test
+    print("X_train:", X_train.shape)
+    print("X_test :", X_test.shape)
+    print("y_train:", y_train.shape)
+    print("y_test :", y_test.shape)
+
+    # --- Model + pipeline (preprocess déjà fitté sur le train) ---
+    _, fit_perf = measure_fit(lambda: model.fit(X_train, y_train))
+    y_pred = model.predict(X_test)
+
     pipeline = Pipeline(
         steps=[
-            ("preprocess", preprocess),
+            ("preprocess", enc.preprocessor),
             ("model", model),
         ]
     )
 
-    pipeline.fit(X_train, y_train)
-    y_pred = pipeline.predict(X_test)
-
     # --- Eval ---
     mae = mean_absolute_error(y_test, y_pred)
     rmse = float(np.sqrt(mean_squared_error(y_test, y_pred)))
@@ -88,28 +155,46 @@ def main() -> None:
     print(f"RMSE : {rmse:.2f}")
 
     # --- Ensure output dirs ---
-    MODELS_DIR.mkdir(parents=True, exist_ok=True)
     METRICS_DIR.mkdir(parents=True, exist_ok=True)
 
-    # --- Save model ---
-    joblib.dump(pipeline, PATH_MODEL_BASELINE)
-    print("OUT model_baseline:", str(PATH_MODEL_BASELINE))
-
-    # --- Append metrics (same file as other models) ---
-    row = pd.DataFrame(
-        [
-            {
-                "model": "LinearRegression",
-                "target": TARGET,
-                "MAE": float(mae),
-                "RMSE": float(rmse),
-                "n_rows": int(df.shape[0]),
-                "n_features": int(len(ALL_FEATURES)),
-            }
-        ]
+    # --- Métriques + perf (latence du pipeline servi, preprocess inclus) ---
+    X_bench = pd.read_csv(PATH_IN, usecols=ALL_FEATURES, nrows=BENCH_ROWS)[ALL_FEATURES]
+    metrics = {
+        "model": "LinearRegression",
+        "target": TARGET,
+        "MAE": float(mae),
+        "RMSE": float(rmse),
+        "n_rows": int(enc.meta["n_rows"]),
+        "n_features": int(len(ALL_FEATURES)),
+        **fit_perf,
+        "model_size_bytes": None,  # renseigné par register() (taille du joblib écrit)
+        **latency_benchmark(pipeline, X_bench, methods=("predict",)),
+    }
+
+    # --- Registre: artefact immuable (hash du contenu), non promu (current = RF) ---
+    version = register(
+        MODEL_NAME,
+        pipeline,
+        metrics=metrics,
+        contract=contract,
+        data_hash=data_hash,
+        params=params,
+        fingerprint=fingerprint,
+        promote=False,
     )
-    write_header = not PATH_METRICS.exists()
-    row.to_csv(PATH_METRICS, mode="a", header=write_header, index=False)
+    row = {
+        **metrics,
+        "model_size_bytes": model_size_bytes(artifact_path(MODEL_NAME, version)),
+        "model_version": version,
+    }
+    print(f"OUT model {MODEL_NAME}@{version}:", str(artifact_path(MODEL_NAME, version)))
+    print(
+        f"fit={row['fit_seconds']:.3f}s | size={row['model_size_bytes']}B | "
+        f"predict p50 1={row['predict_1_p50_ms']:.2f}ms 1k={row['predict_1k_p50_ms']:.2f}ms"
+    )
+
+    # --- Append metrics (same file as other models; en-tête étendu si besoin) ---
+    append_metrics_row(PATH_METRICS, row)
     print("OUT metrics:", str(PATH_METRICS))
 
 
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 import os
+import sys
 import json
-import joblib
+from typing import Any
+
+import numpy as np
 import pandas as pd
 
-from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.linear_model import LogisticRegression
@@ -16,9 +18,48 @@ from sklearn.metrics import (
     classification_report,
 )
 
+from src.ml.bootstrap import bootstrap_ci
+from src.ml.churn_cv import cv_reference_dates, run_rolling_cv
+from src.ml.churn_search import (
+    N_WORKERS,
+    VALIDATION_SIZE,
+    fold_class_weight,
+    full_class_counts,
+    logreg_candidates,
+    make_estimator,
+    rf_candidates,
+    run_search,
+)
+from src.ml.encoders import categorical_transformers, pipeline_cat_encoding
+from src.ml.drift import export_reference
+from src.ml.explain import export_explanations
+from src.ml.fast_scorer import export_scorer
+from src.ml.forest_arrays import export_forest
+from src.ml.matrix_cache import (
+    EncodedSplit,
+    encode_split,
+    feature_contract,
+    file_sha256,
+    iter_csv_rows,
+    load_encoded_split,
+    read_csv_rows,
+)
+from src.ml.perf import BENCH_ROWS, latency_benchmark, measure_fit, model_size_bytes
+from src.ml.registry import (
+    FORCE_RETRAIN_ENV,
+    artifact_path,
+    find_by_fingerprint,
+    force_retrain,
+    promote_version,
+    register,
+    training_fingerprint,
+)
+from src.ml.sampling import downsample_split, sample_params
+from src.ml.threshold_sweep import build_curve_artifact, write_curve
+
 
 PATH_IN = "data/ml_ready/df_ml_churn_ready.csv"
-MODEL_OUT = "src/ml/models/churn_model_v1.joblib"
+MODEL_NAME = "churn"  # registre: src/ml/models/registry/churn/
 METRICS_OUT = "data/ml_ready/churn_metrics_v1.json"
 
 TARGET = "churn_7_30j"
@@ -58,45 +99,274 @@ def temporal_split(
     return train, test
 
 
-def main() -> None:
-    df = pd.read_csv(PATH_IN)
+def load_dataset() -> pd.DataFrame:
+    if os.path.exists(PATH_IN):
+        return pd.read_csv(PATH_IN)
+
+    # Pas d'export CSV: même snapshot servi par le feature store (as-of T)
+    from src.ml.build_ml_churn_ready import T
+    from src.ml.feature_store import get_store
+
+    print(f"{PATH_IN} absent -> feature store (T={T.date()})")
+    return get_store().training_frame([T])
+
+
+def raw_inputs(enc: EncodedSplit, n_holdout: int = BENCH_ROWS) -> dict[str, Any]:
+    """
+    Lignes brutes (non encodées) pour l'après-fit, sans relire tout le CSV:
+    - holdout: au plus n_holdout lignes du test (positions enc.test_rows)
+    - train / all: fabriques de blocs (référence drift / contributions par client)
+    Sans CSV: snapshot du feature store (une seule date, déjà en mémoire).
+    """
+    if os.path.exists(PATH_IN) and enc.test_rows is not None:
+        return {
+            "holdout": read_csv_rows(PATH_IN, np.sort(enc.test_rows)[:n_holdout]),
+            "train": lambda: iter_csv_rows(PATH_IN, rows=enc.train_rows),
+            "all": lambda: iter_csv_rows(PATH_IN),
+        }
+    df_all = load_dataset()
+    train_raw, test_raw = temporal_split(df_all)
+    return {
+        "holdout": test_raw.head(n_holdout),
+        "train": lambda: [train_raw],
+        "all": lambda: [df_all],
+    }
 
+
+def validate(df: pd.DataFrame) -> None:
     # Sécurité minimale
     expected = set(NUM_COLS + CAT_COLS + [TARGET])
     missing = expected - set(df.columns)
     if missing:
         raise ValueError(f"Colonnes manquantes dans {PATH_IN}: {sorted(missing)}")
-    # Garde-fou dataset : si une seule classe, métriques et apprentissage churn non fiables
-    if df[TARGET].nunique() < 2:
+
+
+def make_pre() -> ColumnTransformer:
+    return ColumnTransformer(
+        transformers=[
+            ("num", "passthrough", NUM_COLS),
+            *categorical_transformers(CAT_COLS),
+        ]
+    )
+
+
+SPLIT_NAME = "temporal_split(test_size=0.3)"
+
+
+def load_encoded() -> EncodedSplit:
+    """
+    Split temporel (pas de random) + encodage.
+    Cache binaire (matrix_cache) quand le CSV existe, sinon encodage direct
+    du snapshot servi par le feature store.
+    """
+    kwargs = dict(
+        num_features=NUM_COLS,
+        cat_features=CAT_COLS,
+        target=TARGET,
+        make_preprocessor=make_pre,
+        split=lambda df: temporal_split(df, test_size=0.3),
+    )
+    if os.path.exists(PATH_IN):
+        return load_encoded_split(
+            PATH_IN,
+            split_name=SPLIT_NAME,
+            validate=validate,
+            **kwargs,
+        )
+    df = load_dataset()
+    validate(df)
+    return encode_split(df, **kwargs)
+
+
+def search_candidates(args: list[str]) -> list[dict[str, Any]]:
+    candidates = logreg_candidates()
+    if "all" in args:
+        candidates += rf_candidates()
+    return candidates
+
+
+def fit_classifier(enc: EncodedSplit, mode: str, args: list[str]) -> tuple[Any, dict]:
+    """
+    Retourne (clf fitté sur enc.X_train, infos additionnelles pour les métriques).
+    - fit    : LogisticRegression(max_iter=1000) (config historique)
+    - cv     : fit + CV rolling-origin sur plusieurs dates de référence
+    - search : grille évaluée en parallèle sur une validation taillée dans le
+               train, puis refit du meilleur candidat sur tout le train
+    """
+    y_train = enc.y_train.astype(int)
+
+    if mode in ("fit", "cv"):
+        clf = LogisticRegression(max_iter=1000)
+        clf.fit(enc.X_train, y_train, sample_weight=enc.sample_weight)
+        if mode == "fit":
+            return clf, {}
+        return clf, {"rolling_cv": rolling_cv()}
+
+    if mode == "search":
+        candidates = search_candidates(args)
+        n_workers = min(N_WORKERS, len(candidates))
+        print(f"Search: {len(candidates)} candidats | workers={n_workers}")
+
+        results = run_search(enc, candidates, n_workers=n_workers)
+        best = results[0]
         print(
-            "⚠️ Dataset churn: une seule classe présente. Modèle/metrics non fiables sur ce dataset."
+            f"Best (validation): {best['spec']} | f1={best['f1']:.3f} "
+            f"precision={best['precision']:.3f} recall={best['recall']:.3f}"
+        )
+
+        # Échantillon: class_weight="balanced" replié dans les poids (pas de double pondération)
+        spec, weights = fold_class_weight(
+            best["spec"], y_train, enc.sample_weight, full_class_counts(enc.meta)
         )
+        clf = make_estimator(spec)
+        clf.fit(enc.X_train, y_train, sample_weight=weights)
+        return clf, {
+            "search": {
+                # Holdout non utilisé pour choisir: precision / recall du rapport non biaisés
+                "selection": (
+                    f"f1, puis recall, puis precision (validation: derniers "
+                    f"{VALIDATION_SIZE:.0%} du train temporel"
+                    + (", pondérée par les poids d'inclusion)" if "sample" in enc.meta else ")")
+                ),
+                "validation_size": VALIDATION_SIZE,
+                "n_candidates": len(candidates),
+                "n_workers": n_workers,
+                "best": best,
+                "candidates": results,
+            }
+        }
 
-    # Split temporel (pas de random)
-    train_df, test_df = temporal_split(df, test_size=0.3)
+    raise ValueError(f"Unknown mode: {mode} (attendu: fit | cv | search [all])")
 
-    X_train = train_df[NUM_COLS + CAT_COLS]
-    y_train = train_df[TARGET].astype(int)
 
-    X_test = test_df[NUM_COLS + CAT_COLS]
-    y_test = test_df[TARGET].astype(int)
+def rolling_cv() -> dict:
+    """
+    CV rolling-origin: snapshots hebdo servis par le feature store, un fold
+    par date d'origine, folds évalués en parallèle puis agrégés.
+    """
+    from src.ml.feature_store import get_store
 
-    # Pipeline
-    pre = ColumnTransformer(
-        transformers=[
-            ("num", "passthrough", NUM_COLS),
-            ("cat", OneHotEncoder(handle_unknown="ignore"), CAT_COLS),
-        ]
+    ref_dates = cv_reference_dates()
+    df = get_store().training_frame(ref_dates)
+    print(
+        f"Rolling CV: {len(ref_dates)} snapshots "
+        f"{ref_dates[0].date()} -> {ref_dates[-1].date()} | rows={len(df)}"
+    )
+    cv = run_rolling_cv(
+        df,
+        features=NUM_COLS + CAT_COLS,
+        target=TARGET,
+        preprocessor=make_pre(),
+        sample=sample_params(),
+    )
+    for f in cv["folds"]:
+        status = f.get("skipped") or (
+            f"precision={f['precision']:.3f} recall={f['recall']:.3f}"
+        )
+        sampled = f" (sample {f['n_train_sampled']})" if "n_train_sampled" in f else ""
+        print(
+            f"  fold {f['origin']} | n_train={f['n_train']}{sampled} "
+            f"n_test={f['n_test']} | {status}"
+        )
+    return cv
+
+
+def training_inputs(mode: str, args: list[str]) -> tuple[str, dict]:
+    """(data_hash, params) de l'empreinte d'entraînement, calculés sans fit."""
+    from src.ml.feature_store import get_store
+
+    if os.path.exists(PATH_IN):
+        data_hash = file_sha256(PATH_IN)
+    else:
+        data_hash = f"feature_store:{get_store().source_fingerprint()}"
+
+    params: dict[str, Any] = {
+        "mode": mode,
+        "args": args,
+        "preprocess": repr(make_pre()),
+        "split": SPLIT_NAME,
+    }
+    if mode == "search":
+        params["candidates"] = search_candidates(args)
+        params["validation_size"] = VALIDATION_SIZE
+    else:
+        params["estimator"] = LogisticRegression(max_iter=1000).get_params()
+    if sample_params() is not None:
+        # Budget d'entraînement (TRAIN_MAX_ROWS / TRAIN_MAX_MB): autre échantillon, autre modèle
+        params["sample"] = sample_params()
+    if mode == "cv":
+        # La CV lit les snapshots du feature store: ses sources comptent aussi
+        params["cv_sources"] = get_store().source_fingerprint()
+        params["cv_reference_dates"] = [str(d.date()) for d in cv_reference_dates()]
+    return data_hash, params
+
+
+def reuse_if_unchanged(fingerprint: str) -> bool:
+    """Empreinte déjà dans le registre: re-promotion + métriques réutilisées, pas de fit."""
+    prev = None if force_retrain() else find_by_fingerprint(MODEL_NAME, fingerprint)
+    if prev is None:
+        return False
+    promote_version(MODEL_NAME, prev["version"])
+    metrics = {**prev["metrics"], "model_version": prev["version"]}
+    metrics["perf"]["model_size_bytes"] = prev["size_bytes"]
+    with open(METRICS_OUT, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2, ensure_ascii=False)
+    print(
+        f"skip fit: fingerprint {fingerprint} déjà entraîné -> {MODEL_NAME}@{prev['version']} "
+        f"({FORCE_RETRAIN_ENV}=1 pour forcer)"
     )
+    print(f"Metrics saved : {METRICS_OUT}")
+    return True
+
+
+def main() -> None:
+    """
+    python -m src.ml.train_churn_model             -> fit (config historique)
+    python -m src.ml.train_churn_model cv          -> fit + CV rolling-origin
+    python -m src.ml.train_churn_model search      -> recherche LogisticRegression
+    python -m src.ml.train_churn_model search all  -> + RandomForestClassifier
+    """
+    args = sys.argv[1:]
+    mode = args[0] if args else "fit"
+    if mode not in ("fit", "cv", "search"):
+        raise ValueError(f"Unknown mode: {mode} (attendu: fit | cv | search [all])")
+
+    # Skip si données + contrat + hyperparamètres déjà entraînés
+    contract = feature_contract(NUM_COLS, CAT_COLS, TARGET)
+    data_hash, params = training_inputs(mode, args[1:])
+    fingerprint = training_fingerprint(data_hash, contract, params)
+    if reuse_if_unchanged(fingerprint):
+        return
+
+    enc = load_encoded()
+    print(f"cache {'hit' if enc.cache_hit else 'miss'}: {enc.key or '-'}")
+    # Train stratifié + pondéré si budget; le holdout reste complet
+    enc = downsample_split(enc)
+    if "sample" in enc.meta:
+        sample = enc.meta["sample"]
+        print(
+            f"sample: {sample['n_train_sampled']}/{sample['n_train_full']} lignes "
+            f"({sample['sample_mb']} Mo) | "
+            + " ".join(f"{c}: {v['sampled']}/{v['n']} w={v['weight']:.3g}" for c, v in sample["per_class"].items())
+        )
 
-    clf = LogisticRegression(max_iter=1000)
+    X_train, X_test = enc.X_train, enc.X_test
+    y_train = enc.y_train.astype(int)
+    y_test = enc.y_test.astype(int)
 
-    pipe = Pipeline(steps=[("pre", pre), ("clf", clf)])
+    # Garde-fou dataset : si une seule classe, métriques et apprentissage churn non fiables
+    if len(set(y_train) | set(y_test)) < 2:
+        print(
+            "⚠️ Dataset churn: une seule classe présente. Modèle/metrics non fiables sur ce dataset."
+        )
+
+    # Pipeline (pre déjà fitté sur le train)
+    (clf, extra), fit_perf = measure_fit(lambda: fit_classifier(enc, mode, args[1:]))
 
-    pipe.fit(X_train, y_train)
+    pipe = Pipeline(steps=[("pre", enc.preprocessor), ("clf", clf)])
 
     # Évaluation
-    y_pred = pipe.predict(X_test)
+    y_pred = clf.predict(X_test)
 
     cm = confusion_matrix(y_test, y_pred).tolist()
     precision = precision_score(y_test, y_pred, zero_division=0)
@@ -105,23 +375,73 @@ def main() -> None:
     report_txt = classification_report(y_test, y_pred, zero_division=0)
 
     metrics = {
-        "n_rows": int(len(df)),
-        "n_train": int(len(train_df)),
-        "n_test": int(len(test_df)),
+        "n_rows": int(enc.meta["n_rows"]),
+        "n_train": int(enc.meta["n_train"]),
+        "n_test": int(enc.meta["n_test"]),
         "target": TARGET,
+        "cat_encoding": pipeline_cat_encoding(pipe),
         "confusion_matrix": cm,
         "precision": float(precision),
         "recall": float(recall),
         "classification_report": report_txt,
+        "mode": mode,
+        **({"sample": enc.meta["sample"]} if "sample" in enc.meta else {}),
+        **extra,
     }
+    # IC bootstrap (percentile) de precision / recall sur le holdout
+    metrics["bootstrap_ci"] = bootstrap_ci(y_test, y_pred, "classification")
 
-    os.makedirs(os.path.dirname(MODEL_OUT), exist_ok=True)
-    joblib.dump(pipe, MODEL_OUT)
+    # Lignes brutes relues sans matérialiser le CSV: tranche bornée du holdout
+    # (latence + parité scorer), blocs pour la référence drift et les explications
+    features = NUM_COLS + CAT_COLS
+    raw = raw_inputs(enc)
+    test_raw = raw["holdout"]
+    metrics["perf"] = {
+        **fit_perf,
+        "model_size_bytes": None,  # renseigné par register() (taille du joblib écrit)
+        **latency_benchmark(pipe, test_raw[features], methods=("predict", "predict_proba")),
+    }
+
+    # Registre: artefact immuable (hash du contenu) + promotion atomique de current
+    version = register(
+        MODEL_NAME,
+        pipe,
+        metrics=metrics,
+        contract=contract,
+        data_hash=data_hash,
+        params={**params, "fitted": {"estimator": type(clf).__name__, **clf.get_params()}},
+        fingerprint=fingerprint,
+    )
+    metrics["model_version"] = version
+    # Scorer numpy (API): exporté seulement pour un modèle linéaire, à parité avec sklearn
+    export_scorer(MODEL_NAME, version, pipe, X=test_raw)
+    # RF: tableaux plats mappables (API / batch / dashboards), à parité avec sklearn
+    export_forest(MODEL_NAME, version, pipe, X=test_raw)
+    # Explications précalculées: contributions par client (LR) / importances (RF)
+    print(
+        "OUT explanations:",
+        export_explanations(
+            MODEL_NAME,
+            version,
+            pipe,
+            chunks=((df[features], df["client_id"]) for df in raw["all"]()),
+            X_test=X_test,
+            y_test=y_test,
+            scoring="accuracy",
+        ),
+    )
+    # Histogrammes de référence (drift): données d'entraînement du split
+    print("OUT drift reference:", export_reference(MODEL_NAME, version, raw["train"]()))
+    metrics["perf"]["model_size_bytes"] = model_size_bytes(artifact_path(MODEL_NAME, version))
 
     with open(METRICS_OUT, "w", encoding="utf-8") as f:
         json.dump(metrics, f, indent=2, ensure_ascii=False)
 
-    print(f"Model saved   : {MODEL_OUT}")
+    # Courbe precision/recall/actions sur tous les seuils (1 tri + cumsum)
+    curve = build_curve_artifact(y_test, clf.predict_proba(X_test)[:, 1], version)
+    print("OUT threshold curve:", write_curve(curve), "| recommended:", curve["recommended"])
+
+    print(f"Model saved   : {MODEL_NAME}@{version} ({artifact_path(MODEL_NAME, version)})")
     print(f"Metrics saved : {METRICS_OUT}")
     print("Confusion matrix:", cm)
     print(f"Precision: {precision:.3f} | Recall: {recall:.3f}")
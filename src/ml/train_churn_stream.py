@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer
+
+from src.ml.build_ml_churn_ready import HORIZON_DAYS, PATH_SNAPSHOTS_OUT
+from src.ml.encoders import HashedCategoricalEncoder
+from src.ml.matrix_cache import feature_contract, file_sha256
+from src.ml.registry import (
+    FORCE_RETRAIN_ENV,
+    artifact_path,
+    find_by_fingerprint,
+    force_retrain,
+    promote_version,
+    register,
+    training_fingerprint,
+)
+
+
+# =========================
+# Paths
+# =========================
+PATH_IN = PATH_SNAPSHOTS_OUT  # snapshots (client, T) multi-dates
+MODEL_NAME = "churn_stream"  # registre: src/ml/models/registry/churn_stream/
+METRICS_OUT = "data/ml_ready/churn_stream_metrics_v1.json"
+
+
+# =========================
+# Contract (must match build_ml_churn_ready snapshots)
+# =========================
+TARGET = "churn_7_30j"
+DATE_COL = "ref_date"
+NUM_COLS = ["paid_count_before_T", "paid_sum_before_T", "days_since_last_paid"]
+CAT_COLS = ["plan", "ville"]
+
+USECOLS = [DATE_COL, TARGET] + NUM_COLS + CAT_COLS
+DTYPES = {
+    TARGET: "Int8",
+    "paid_count_before_T": "float64",
+    "paid_sum_before_T": "float64",
+    "days_since_last_paid": "float64",
+    "plan": "string",
+    "ville": "string",
+}
+
+
+# =========================
+# Paramètres streaming
+# =========================
+BATCH_ROWS = 50_000
+N_EPOCHS = 5
+N_HASH_BUCKETS = 64
+THRESHOLD = 0.5
+SPLIT_NAME = "holdout=last ref_date, train: ref_date + HORIZON_DAYS <= holdout"
+
+
+def make_clf() -> SGDClassifier:
+    return SGDClassifier(loss="log_loss", alpha=1e-4, random_state=42)
+
+
+def log1p_clip(X):
+    return np.log1p(np.clip(np.asarray(X, dtype=np.float64), 0, None))
+
+
+def make_pre() -> ColumnTransformer:
+    """Préprocessing sans état: largeur fixe quelle que soit la taille de l'historique."""
+    return ColumnTransformer(
+        transformers=[
+            (
+                "num",
+                FunctionTransformer(log1p_clip, feature_names_out="one-to-one"),
+                NUM_COLS,
+            ),
+            ("cat", HashedCategoricalEncoder(n_features=N_HASH_BUCKETS), CAT_COLS),
+        ],
+        sparse_threshold=1.0,
+    )
+
+
+def iter_batches(path: str = PATH_IN, batch_rows: int = BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """Lecture par blocs (mémoire bornée par batch_rows, pas par la taille du fichier)."""
+    for chunk in pd.read_csv(
+        path,
+        usecols=USECOLS,
+        dtype=DTYPES,
+        parse_dates=[DATE_COL],
+        chunksize=batch_rows,
+    ):
+        chunk = chunk.dropna(subset=[TARGET] + NUM_COLS + CAT_COLS)
+        yield chunk.astype({TARGET: "int8"})
+
+
+def scan_dates(path: str = PATH_IN) -> list[pd.Timestamp]:
+    """Passe légère (colonne ref_date uniquement) pour choisir le holdout."""
+    dates: set[pd.Timestamp] = set()
+    for chunk in pd.read_csv(
+        path, usecols=[DATE_COL], parse_dates=[DATE_COL], chunksize=BATCH_ROWS
+    ):
+        dates.update(chunk[DATE_COL].unique())
+    return sorted(pd.Timestamp(d) for d in dates)
+
+
+def split_masks(batch: pd.DataFrame, holdout: pd.Timestamp) -> tuple[pd.Series, pd.Series]:
+    """
+    test : snapshot à la date holdout
+    train: snapshots dont le label est observé avant holdout (T + HORIZON <= holdout)
+    """
+    d = batch[DATE_COL]
+    return d + pd.Timedelta(days=HORIZON_DAYS) <= holdout, d == holdout
+
+
+def fit_params() -> dict:
+    # Hyperparamètres + découpage en batchs (ordre des partial_fit) + split
+    return {
+        "estimator": "SGDClassifier",
+        **make_clf().get_params(),
+        # repr sans adresse mémoire (FunctionTransformer(log1p_clip)): stable entre runs
+        "preprocess": re.sub(r" at 0x[0-9a-f]+", "", repr(make_pre())),
+        "n_epochs": N_EPOCHS,
+        "batch_rows": BATCH_ROWS,
+        "n_hash_buckets": N_HASH_BUCKETS,
+        "threshold": THRESHOLD,
+        "split": SPLIT_NAME,
+        "horizon_days": HORIZON_DAYS,
+    }
+
+
+def write_metrics(metrics: dict) -> None:
+    os.makedirs(os.path.dirname(METRICS_OUT), exist_ok=True)
+    with open(METRICS_OUT, "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2, ensure_ascii=False)
+
+
+def reuse_if_unchanged(fingerprint: str) -> bool:
+    """Empreinte déjà dans le registre: pas de passe sur les snapshots, métriques réutilisées."""
+    prev = None if force_retrain() else find_by_fingerprint(MODEL_NAME, fingerprint)
+    if prev is None:
+        return False
+    promote_version(MODEL_NAME, prev["version"])
+    write_metrics({**prev["metrics"], "model_version": prev["version"]})
+    print(
+        f"skip fit: fingerprint {fingerprint} déjà entraîné -> {MODEL_NAME}@{prev['version']} "
+        f"({FORCE_RETRAIN_ENV}=1 pour forcer)"
+    )
+    print(f"Metrics saved : {METRICS_OUT}")
+    return True
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else PATH_IN
+    print("IN :", path)
+
+    # Skip si snapshots + contrat + hyperparamètres déjà entraînés
+    contract = feature_contract(NUM_COLS, CAT_COLS, TARGET)
+    data_hash = file_sha256(path)
+    params = fit_params()
+    fingerprint = training_fingerprint(data_hash, contract, params)
+    if reuse_if_unchanged(fingerprint):
+        return
+
+    dates = scan_dates(path)
+    if len(dates) < 2:
+        raise ValueError(f"Au moins 2 dates de référence requises dans {path}")
+    holdout = dates[-1]
+    print(f"ref_dates: {len(dates)} ({dates[0].date()} -> {holdout.date()}) | holdout={holdout.date()}")
+
+    pre = make_pre()
+    clf = make_clf()
+    classes = np.array([0, 1])
+
+    n_train = 0
+    for epoch in range(N_EPOCHS):
+        for batch in iter_batches(path):
+            train_mask, _ = split_masks(batch, holdout)
+            train = batch[train_mask]
+            if train.empty:
+                continue
+            if not hasattr(pre, "transformers_"):
+                pre.fit(train)  # sans état: fixe seulement les colonnes
+            X = sparse.csr_matrix(pre.transform(train))
+            clf.partial_fit(X, train[TARGET].to_numpy(), classes=classes)
+            if epoch == 0:
+                n_train += len(train)
+        print(f"epoch {epoch + 1}/{N_EPOCHS} done")
+
+    if n_train == 0:
+        raise ValueError("Aucune ligne d'entraînement (ref_date + horizon <= holdout)")
+
+    # Évaluation streaming: compteurs seulement (mémoire constante)
+    tp = fp = fn = tn = 0
+    log_loss_sum = 0.0
+    n_test = 0
+    for batch in iter_batches(path):
+        _, test_mask = split_masks(batch, holdout)
+        test = batch[test_mask]
+        if test.empty:
+            continue
+        proba = clf.predict_proba(pre.transform(test))[:, 1]
+        y = test[TARGET].to_numpy()
+        pred = proba >= THRESHOLD
+        tp += int(np.sum(pred & (y == 1)))
+        fp += int(np.sum(pred & (y == 0)))
+        fn += int(np.sum(~pred & (y == 1)))
+        tn += int(np.sum(~pred & (y == 0)))
+        p = np.clip(proba, 1e-15, 1 - 1e-15)
+        log_loss_sum += float(-np.sum(y * np.log(p) + (1 - y) * np.log(1 - p)))
+        n_test += len(test)
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+
+    metrics = {
+        "n_train": n_train,
+        "n_test": n_test,
+        "holdout_ref_date": str(holdout.date()),
+        "target": TARGET,
+        "estimator": "SGDClassifier(log_loss)",
+        "n_epochs": N_EPOCHS,
+        "batch_rows": BATCH_ROWS,
+        "n_hash_buckets": N_HASH_BUCKETS,
+        "confusion_matrix": [[tn, fp], [fn, tp]],
+        "precision": float(precision),
+        "recall": float(recall),
+        "log_loss": log_loss_sum / n_test if n_test else None,
+    }
+
+    pipe = Pipeline(steps=[("pre", pre), ("clf", clf)])
+    # Registre: artefact immuable (hash du contenu) + promotion atomique de current
+    version = register(
+        MODEL_NAME,
+        pipe,
+        metrics=metrics,
+        contract=contract,
+        data_hash=data_hash,
+        params=params,
+        fingerprint=fingerprint,
+    )
+    write_metrics({**metrics, "model_version": version})
+
+    print(f"Model saved   : {MODEL_NAME}@{version} ({artifact_path(MODEL_NAME, version)})")
+    print(f"Metrics saved : {METRICS_OUT}")
+    print("Confusion matrix:", metrics["confusion_matrix"])
+    print(f"Precision: {precision:.3f} | Recall: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
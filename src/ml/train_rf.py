@@ -1,6 +1,5 @@
 from pathlib import Path
 
-import joblib
 import numpy as np
 import pandas as pd
 from sklearn.compose import ColumnTransformer
@@ -8,16 +7,36 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import StandardScaler
+
+from src.ml.bootstrap import bootstrap_ci, flat_ci_columns
+from src.ml.encoders import categorical_transformers
+from src.ml.explain import export_explanations
+from src.ml.forest_arrays import export_forest
+from src.ml.matrix_cache import feature_contract, file_sha256, load_encoded_split
+from src.ml.perf import (
+    BENCH_ROWS,
+    append_metrics_row,
+    latency_benchmark,
+    measure_fit,
+    model_size_bytes,
+)
+from src.ml.registry import (
+    FORCE_RETRAIN_ENV,
+    artifact_path,
+    find_by_fingerprint,
+    force_retrain,
+    promote_version,
+    register,
+    training_fingerprint,
+)
 
 
 # =========================
 # Paths
 # =========================
 PATH_IN = "data/ml_ready/df_ml_ready.csv"
-MODELS_DIR = Path("src/ml/models")
-PATH_MODEL_RF = MODELS_DIR / "model_rf_v1.joblib"
-PATH_MODEL_CURRENT = MODELS_DIR / "model_current_v1.joblib"
+MODEL_NAME = "revenue"  # registre: src/ml/models/registry/revenue/
 
 METRICS_DIR = Path("data/ml_ready")
 PATH_METRICS = METRICS_DIR / "metrics_v1.csv"
@@ -32,13 +51,7 @@ CAT_FEATURES = ["plan", "ville"]
 ALL_FEATURES = NUM_FEATURES + CAT_FEATURES
 
 
-def main() -> None:
-    # --- Read ---
-    print("IN :", PATH_IN)
-    df = pd.read_csv(PATH_IN)
-    print("shape_in :", df.shape)
-    print("cols_in  :", df.columns.tolist())
-
+def validate(df: pd.DataFrame) -> None:
     # --- Guards ---
     required = set(ALL_FEATURES + [TARGET])
     missing = sorted(required - set(df.columns))
@@ -47,73 +60,156 @@ def main() -> None:
     if df.empty:
         raise ValueError(f"Dataset vide: {PATH_IN}")
 
-    # --- Split X/y (strict contract) ---
-    X = df[ALL_FEATURES].copy()
-    y = df[TARGET].copy()
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
+def make_preprocess() -> ColumnTransformer:
+    return ColumnTransformer(
+        transformers=[
+            ("num", StandardScaler(), NUM_FEATURES),
+            *categorical_transformers(CAT_FEATURES),
+        ],
+        remainder="drop",
+    )
+
+
+def split(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
+    return train_df, test_df
+
+
+SPLIT_NAME = "train_test_split(test_size=0.2, random_state=42)"
+
+
+def fit_params(model) -> dict:
+    # Hyperparamètres + preprocess + split: tout ce qui change l'artefact à données égales
+    return {
+        "estimator": type(model).__name__,
+        **model.get_params(),
+        "preprocess": repr(make_preprocess()),
+        "split": SPLIT_NAME,
+    }
+
+
+def reuse_if_unchanged(fingerprint: str) -> bool:
+    """Empreinte déjà dans le registre: pas de fit, artefact et métriques réutilisés."""
+    prev = None if force_retrain() else find_by_fingerprint(MODEL_NAME, fingerprint)
+    if prev is None:
+        return False
+    promote_version(MODEL_NAME, prev["version"])
+    print(
+        f"skip fit: fingerprint {fingerprint} déjà entraîné -> {MODEL_NAME}@{prev['version']} "
+        f"({FORCE_RETRAIN_ENV}=1 pour forcer)"
     )
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    row = {
+        **prev["metrics"],
+        "model_size_bytes": prev["size_bytes"],
+        "model_version": prev["version"],
+    }
+    append_metrics_row(PATH_METRICS, row)
+    print("OUT metrics:", str(PATH_METRICS))
+    return True
 
+
+def main() -> None:
+    model = RandomForestRegressor(random_state=42)
+    contract = feature_contract(NUM_FEATURES, CAT_FEATURES, TARGET)
+    params = fit_params(model)
+
+    # --- Skip si données + contrat + hyperparamètres inchangés ---
+    print("IN :", PATH_IN)
+    data_hash = file_sha256(PATH_IN)
+    fingerprint = training_fingerprint(data_hash, contract, params)
+    if reuse_if_unchanged(fingerprint):
+        return
+
+    # --- Read + split + preprocess (cache binaire si dataset/contrat inchangés) ---
+    enc = load_encoded_split(
+        PATH_IN,
+        num_features=NUM_FEATURES,
+        cat_features=CAT_FEATURES,
+        target=TARGET,
+        make_preprocessor=make_preprocess,
+        split=split,
+        split_name=SPLIT_NAME,
+        validate=validate,
+    )
+    print(f"cache {'hit' if enc.cache_hit else 'miss'}: {enc.key}")
+    X_train, X_test, y_train, y_test = enc.X_train, enc.X_test, enc.y_train, enc.y_test
     print("X_train:", X_train.shape)
     print("X_test :", X_test.shape)
     print("y_train:", y_train.shape)
     print("y_test :", y_test.shape)
 
-    # --- Preprocess ---
-    preprocess = ColumnTransformer(
-        transformers=[
-            ("num", StandardScaler(), NUM_FEATURES),
-            ("cat", OneHotEncoder(handle_unknown="ignore"), CAT_FEATURES),
-        ],
-        remainder="drop",
-    )
+    # --- Model + pipeline (preprocess déjà fitté sur le train) ---
+    _, fit_perf = measure_fit(lambda: model.fit(X_train, y_train))
+    y_pred = model.predict(X_test)
 
-    # --- Model + pipeline ---
-    model = RandomForestRegressor(random_state=42)
     pipeline = Pipeline(
         steps=[
-            ("preprocess", preprocess),
+            ("preprocess", enc.preprocessor),
             ("model", model),
         ]
     )
 
-    pipeline.fit(X_train, y_train)
-    y_pred = pipeline.predict(X_test)
-
     # --- Eval ---
     mae = mean_absolute_error(y_test, y_pred)
     rmse = float(np.sqrt(mean_squared_error(y_test, y_pred)))
 
-    print(f"MAE  : {mae:.2f}")
-    print(f"RMSE : {rmse:.2f}")
+    # IC bootstrap (percentile, vectorisé) de MAE / RMSE sur le holdout
+    ci = flat_ci_columns(bootstrap_ci(y_test, y_pred, "regression"))
+
+    print(f"MAE  : {mae:.2f} [{ci['MAE_ci_low']:.2f}, {ci['MAE_ci_high']:.2f}]")
+    print(f"RMSE : {rmse:.2f} [{ci['RMSE_ci_low']:.2f}, {ci['RMSE_ci_high']:.2f}]")
 
-    # --- Outputs ---
-    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    # --- Ensure output dirs ---
     METRICS_DIR.mkdir(parents=True, exist_ok=True)
 
-    joblib.dump(pipeline, PATH_MODEL_RF)
-    joblib.dump(pipeline, PATH_MODEL_CURRENT)
-
-    print("OUT model_rf      :", str(PATH_MODEL_RF))
-    print("OUT model_current :", str(PATH_MODEL_CURRENT))
-
-    row = pd.DataFrame(
-        [
-            {
-                "model": "RandomForestRegressor",
-                "target": TARGET,
-                "MAE": float(mae),
-                "RMSE": float(rmse),
-                "n_rows": int(df.shape[0]),
-                "n_features": int(len(ALL_FEATURES)),
-            }
-        ]
+    # --- Métriques + perf (latence du pipeline servi, preprocess inclus) ---
+    X_bench = pd.read_csv(PATH_IN, usecols=ALL_FEATURES, nrows=BENCH_ROWS)[ALL_FEATURES]
+    metrics = {
+        "model": "RandomForestRegressor",
+        "target": TARGET,
+        "MAE": float(mae),
+        "RMSE": float(rmse),
+        **ci,
+        "n_rows": int(enc.meta["n_rows"]),
+        "n_features": int(len(ALL_FEATURES)),
+        **fit_perf,
+        "model_size_bytes": None,  # renseigné par register() (taille du joblib écrit)
+        **latency_benchmark(pipeline, X_bench, methods=("predict",)),
+    }
+
+    # --- Registre: artefact immuable (hash du contenu), promotion atomique de current ---
+    version = register(
+        MODEL_NAME,
+        pipeline,
+        metrics=metrics,
+        contract=contract,
+        data_hash=data_hash,
+        params=params,
+        fingerprint=fingerprint,
+        promote=True,
+    )
+    # Moteur d'inférence à tableaux plats (forest/ à côté du joblib, .npy mappables)
+    print("OUT forest:", export_forest(MODEL_NAME, version, pipeline, X=X_bench))
+    # Importances globales + permutation (holdout) précalculées pour les dashboards
+    print(
+        "OUT explanations:",
+        export_explanations(MODEL_NAME, version, pipeline, X_test=X_test, y_test=y_test),
+    )
+    row = {
+        **metrics,
+        "model_size_bytes": model_size_bytes(artifact_path(MODEL_NAME, version)),
+        "model_version": version,
+    }
+    print(f"OUT model {MODEL_NAME}@{version}:", str(artifact_path(MODEL_NAME, version)))
+    print(
+        f"fit={row['fit_seconds']:.3f}s | size={row['model_size_bytes']}B | "
+        f"predict p50 1={row['predict_1_p50_ms']:.2f}ms 1k={row['predict_1k_p50_ms']:.2f}ms"
     )
 
-    write_header = not PATH_METRICS.exists()
-    row.to_csv(PATH_METRICS, mode="a", header=write_header, index=False)
-
+    # --- Append metrics (same file as other models; en-tête étendu si besoin) ---
+    append_metrics_row(PATH_METRICS, row)
     print("OUT metrics:", str(PATH_METRICS))
 
 
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# Paths
+# =========================
+USAGE_PATH = "data/raw/usage.csv"
+PATH_OUT = "data/ml_ready/df_usage_windows.csv"
+
+
+# =========================
+# Paramètres
+# =========================
+WINDOWS = (7, 14, 30)
+TREND_WINDOW = 30
+VALUE_COLS = ["actions", "sessions"]
+
+
+def load_usage(path: str = USAGE_PATH) -> pd.DataFrame:
+    usage = pd.read_csv(path)
+    usage["client_id"] = usage["client_id"].astype(str).str.strip()
+    for c in VALUE_COLS:
+        usage[c] = pd.to_numeric(usage[c], errors="coerce")
+    usage["timestamp"] = pd.to_datetime(usage["timestamp"], errors="coerce")
+    usage = usage.dropna(subset=["client_id", "timestamp", *VALUE_COLS])
+    return usage[(usage["actions"] >= 0) & (usage["sessions"] >= 0)]
+
+
+def usage_feature_names(windows: tuple[int, ...] = WINDOWS) -> list[str]:
+    names = [f"{c}_{w}d" for w in windows for c in VALUE_COLS]
+    names += [f"{c}_trend_{TREND_WINDOW}d" for c in VALUE_COLS]
+    names += ["days_since_last_session", f"mean_session_gap_{TREND_WINDOW}d"]
+    return names
+
+
+def _to_days(values) -> np.ndarray:
+    return np.asarray(values, dtype="datetime64[D]").astype(np.int64)
+
+
+def usage_window_features(
+    usage: pd.DataFrame,
+    reference_dates: list[str | pd.Timestamp],
+    windows: tuple[int, ...] = WINDOWS,
+) -> pd.DataFrame:
+    """
+    Features d'usage glissantes pour chaque (client_id, ref_date), calculées
+    sur les événements strictement avant T (fenêtre [T-w, T)):
+    - actions_{w}d / sessions_{w}d
+    - *_trend_30d: pente OLS de la série journalière (jours sans événement = 0)
+    - days_since_last_session, mean_session_gap_30d (écart moyen en jours entre
+      événements avec sessions > 0 dans la fenêtre; NaN si < 2 événements)
+
+    Tout est vectorisé sur la grille (client, T): un tri des événements par
+    clé composite (client, jour), des sommes préfixées et np.searchsorted.
+    Pas de rolling pandas par client.
+    """
+    Ts = sorted({pd.Timestamp(t).normalize() for t in reference_dates})
+    if not Ts:
+        raise ValueError("reference_dates est vide")
+
+    client_ids, codes = np.unique(usage["client_id"].astype(str), return_inverse=True)
+    days = _to_days(usage["timestamp"].values)
+    t_days = _to_days([t.to_datetime64() for t in Ts])
+
+    w_max = max(max(windows), TREND_WINDOW)
+    base = min(days.min(), t_days.min() - w_max)
+    stride = max(days.max(), t_days.max()) - base + 2
+    keys = codes.astype(np.int64) * stride + (days - base)
+
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    days_sorted = days[order]
+
+    # Sommes préfixées (x et jour * x pour la pente)
+    def prefix(a: np.ndarray) -> np.ndarray:
+        return np.concatenate([[0.0], np.cumsum(a, dtype=np.float64)])
+
+    values = {c: usage[c].to_numpy(dtype=np.float64)[order] for c in VALUE_COLS}
+    csum = {c: prefix(v) for c, v in values.items()}
+    csum_dx = {c: prefix(v * days_sorted) for c, v in values.items()}
+
+    # Événements "session" (sessions > 0) pour les écarts
+    has_session = values["sessions"] > 0
+    s_keys = keys[has_session]
+    s_days = np.append(days_sorted[has_session], 0)  # sentinelle (index sûr)
+
+    # Grille (client, T)
+    n_clients, n_T = len(client_ids), len(Ts)
+    q_code = np.repeat(np.arange(n_clients, dtype=np.int64), n_T)
+    q_day = np.tile(t_days, n_clients)
+    q_base = q_code * stride
+    end = np.searchsorted(keys, q_base + (q_day - base), side="left")
+
+    out: dict[str, np.ndarray] = {
+        "ref_date": np.array([t.to_datetime64() for t in Ts], "datetime64[ns]")[
+            np.tile(np.arange(n_T), n_clients)
+        ],
+        "client_id": client_ids[q_code],
+    }
+
+    for w in windows:
+        start = np.searchsorted(keys, q_base + (q_day - w - base), side="left")
+        for c in VALUE_COLS:
+            out[f"{c}_{w}d"] = csum[c][end] - csum[c][start]
+
+    # Pente OLS sur la grille journalière t = 0..W-1 (jours T-W..T-1)
+    W = TREND_WINDOW
+    start = np.searchsorted(keys, q_base + (q_day - W - base), side="left")
+    sum_t = W * (W - 1) / 2.0
+    sum_t2 = (W - 1) * W * (2 * W - 1) / 6.0
+    denom = W * sum_t2 - sum_t**2
+    for c in VALUE_COLS:
+        sx = csum[c][end] - csum[c][start]
+        sdx = csum_dx[c][end] - csum_dx[c][start]
+        stx = sdx - (q_day - W) * sx
+        out[f"{c}_trend_{W}d"] = (W * stx - sum_t * sx) / denom
+
+    # Écarts entre sessions
+    s_end = np.searchsorted(s_keys, q_base + (q_day - base), side="left")
+    s_first = np.searchsorted(s_keys, q_base, side="left")
+    s_start = np.searchsorted(s_keys, q_base + (q_day - W - base), side="left")
+
+    has_last = s_end > s_first
+    last_day = s_days[np.maximum(s_end - 1, 0)]
+    out["days_since_last_session"] = np.where(has_last, q_day - last_day, np.nan)
+
+    k = s_end - s_start
+    first_day = s_days[s_start]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[f"mean_session_gap_{W}d"] = np.where(
+            k >= 2, (last_day - first_day) / (k - 1), np.nan
+        )
+
+    df = pd.DataFrame(out)
+    return df.sort_values(["ref_date", "client_id"]).reset_index(drop=True)
+
+
+def main() -> None:
+    """
+    python -m src.ml.usage_features [DATE ...]
+    Sans argument: T = lendemain du dernier événement observé.
+    """
+    usage = load_usage()
+    if len(sys.argv) > 1:
+        dates = [pd.Timestamp(a) for a in sys.argv[1:]]
+    else:
+        dates = [usage["timestamp"].max().normalize() + pd.Timedelta(days=1)]
+
+    df = usage_window_features(usage, dates)
+    df.to_csv(PATH_OUT, index=False)
+
+    print("IN :", USAGE_PATH, "| rows:", len(usage))
+    print("T  :", [str(d.date()) for d in dates])
+    print(f"OUT: {PATH_OUT} | shape={df.shape}")
+    print(df.head(5))
+
+
+if __name__ == "__main__":
+    main()
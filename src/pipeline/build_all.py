@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from src.pipeline.pandas_v31_porjet1 import clean, enrich_and_aggregate, load_raw
+from src.pipeline.pipeline_oop import setup_logging
+from src.ml.build_ml_ready import build_inference_frame, build_ml_ready, write_inference_frame
+from src.ml.build_ml_churn_ready import T, build_ml_churn_ready
+
+
+# -----------------------------
+# Logging (simple)
+# -----------------------------
+log = logging.getLogger("saas_build_all")
+
+
+# -----------------------------
+# Config
+# -----------------------------
+@dataclass(frozen=True)
+class BuildConfig:
+    raw_dir: Path = Path("data/raw")
+
+    report_csv: Path = Path("data/processed/report_oop.csv")
+    kpi_csv: Path = Path("data/processed/kpi_by_client.csv")
+    ml_ready_v1_csv: Path = Path("data/ml_ready/df_ml_ready_v1.csv")
+    ml_ready_csv: Path = Path("data/ml_ready/df_ml_ready.csv")
+    churn_ready_csv: Path = Path("data/ml_ready/df_ml_churn_ready.csv")
+    inference_parquet: Path = Path("data/ml_ready/inference_features.parquet")
+
+    churn_ref_date: pd.Timestamp = T
+
+
+# -----------------------------
+# Report (équivalent pandas de pipeline_oop)
+# -----------------------------
+REPORT_COLS = [
+    "client_id",
+    "plan",
+    "ville",
+    "ca_total",
+    "nb_paiements",
+    "actions_total",
+    "sessions_total",
+    "last_payment_date",
+    "last_activity_date",
+]
+
+
+def build_report_frame(
+    clients: pd.DataFrame, subs: pd.DataFrame, usage: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Même contrat que report_oop.csv (group_aggregate + sort_report):
+    - union des client_id (clients, paiements 'paid', usage)
+    - ca_total / nb_paiements sur statut == 'paid' uniquement
+    - tri: ca_total DESC, actions_total DESC, client_id ASC
+    """
+    subs_paid = subs[subs["statut"] == "paid"]
+
+    kpi_subs = subs_paid.groupby("client_id").agg(
+        ca_total=("montant", "sum"),
+        nb_paiements=("montant", "count"),
+        last_payment_date=("date_paiement", "max"),
+    )
+    kpi_usage = usage.groupby("client_id").agg(
+        actions_total=("actions", "sum"),
+        sessions_total=("sessions", "sum"),
+        last_activity_date=("timestamp", "max"),
+    )
+    attrs = clients.set_index("client_id")[["plan", "ville"]]
+
+    report = attrs.join(kpi_subs, how="outer").join(kpi_usage, how="outer")
+    report.index.name = "client_id"
+    report = report.reset_index()
+
+    report["ca_total"] = report["ca_total"].fillna(0.0).astype(float).round(2)
+    for c in ["nb_paiements", "actions_total", "sessions_total"]:
+        report[c] = report[c].fillna(0).astype(int)
+
+    report = report.sort_values(
+        ["ca_total", "actions_total", "client_id"], ascending=[False, False, True]
+    ).reset_index(drop=True)
+    return report[REPORT_COLS]
+
+
+def _write_csv(df: pd.DataFrame, out: Path) -> Path:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(out, index=False)
+    log.info("Build | wrote CSV: %s | shape=%s", out, df.shape)
+    return out
+
+
+# -----------------------------
+# Orchestrator
+# -----------------------------
+def run_build(cfg: BuildConfig) -> dict[str, Path]:
+    """
+    Build complet en une seule passe de parsing:
+    raw CSV -> frames typés (clean) -> report_oop, kpi_by_client,
+    df_ml_ready_v1, df_ml_ready, df_ml_churn_ready.
+    """
+    setup_logging()
+
+    log.info("Build | start (single parse of %s)", cfg.raw_dir)
+    clients, subs, usage = clean(*load_raw(cfg.raw_dir))
+    log.info(
+        "Build | parsed: clients=%s subs=%s usage=%s",
+        len(clients),
+        len(subs),
+        len(usage),
+    )
+
+    report = build_report_frame(clients, subs, usage)
+    kpi_report, df_ml_ready_v1 = enrich_and_aggregate(clients, subs, usage)
+    df_ml_ready = build_ml_ready(report, where="report (in-memory)")
+    df_churn = build_ml_churn_ready(report, subs, cfg.churn_ref_date)
+    df_inference = build_inference_frame(report, where="report (in-memory)")
+
+    outputs = {
+        "report_oop": _write_csv(report, cfg.report_csv),
+        "kpi_by_client": _write_csv(kpi_report, cfg.kpi_csv),
+        "df_ml_ready_v1": _write_csv(df_ml_ready_v1, cfg.ml_ready_v1_csv),
+        "df_ml_ready": _write_csv(df_ml_ready, cfg.ml_ready_csv),
+        "df_ml_churn_ready": _write_csv(df_churn, cfg.churn_ready_csv),
+        "inference_features": write_inference_frame(df_inference, cfg.inference_parquet),
+    }
+    log.info(
+        "Build | wrote parquet: %s | shape=%s | ref_date=%s",
+        cfg.inference_parquet,
+        df_inference.shape,
+        df_inference["ref_date"].iloc[0].date(),
+    )
+
+    log.info("Build | done")
+    return outputs
+
+
+if __name__ == "__main__":
+    run_build(BuildConfig())